@@ -0,0 +1,78 @@
+"""
+Load test of the three ways a handler can make a 50 ms database call: blocking the event loop as the
+handlers used to, offloading it to the bounded blocking executor, or awaiting an async driver. Each mode
+serves 200 requests at 50 concurrent clients while a probe measures the latency of a route that does no
+I/O at all, which is what every other request sees while the slow ones run.
+
+Runs the ASGI app in process through httpx, no database or server needed:
+
+  python benchmarks/api_concurrency.py
+"""
+import asyncio
+import statistics
+import time
+from fastapi import FastAPI
+import httpx
+from openoperator.utils import run_blocking
+
+REQUESTS = 200
+CONCURRENCY = 50
+QUERY_TIME = 0.05
+
+app = FastAPI()
+
+@app.get("/blocking")
+async def blocking():
+  time.sleep(QUERY_TIME)
+  return {}
+
+@app.get("/offloaded")
+async def offloaded():
+  await run_blocking(time.sleep, QUERY_TIME)
+  return {}
+
+@app.get("/async")
+async def native():
+  await asyncio.sleep(QUERY_TIME)
+  return {}
+
+@app.get("/ping")
+async def ping():
+  return {}
+
+async def load(client: httpx.AsyncClient, path: str) -> tuple[float, list[float]]:
+  queue = asyncio.Queue()
+  for _ in range(REQUESTS):
+    queue.put_nowait(path)
+  done = asyncio.Event()
+
+  async def worker():
+    while not queue.empty():
+      await client.get(queue.get_nowait())
+
+  async def probe(latencies: list[float]):
+    while not done.is_set():
+      start = time.perf_counter()
+      await asyncio.sleep(0.01) # Counted, a blocked loop delays the probe before it can even send
+      await client.get("/ping")
+      latencies.append(time.perf_counter() - start - 0.01)
+
+  latencies = []
+  probing = asyncio.create_task(probe(latencies))
+  start = time.perf_counter()
+  await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+  elapsed = time.perf_counter() - start
+  done.set()
+  await probing
+  return elapsed, latencies
+
+async def main():
+  transport = httpx.ASGITransport(app=app)
+  async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+    print(f"{'mode':>10} {'req/s':>8} {'ping p50 ms':>12} {'ping max ms':>12}")
+    for path in ["/blocking", "/offloaded", "/async"]:
+      elapsed, latencies = await load(client, path)
+      print(f"{path[1:]:>10} {REQUESTS / elapsed:>8.0f} {statistics.median(latencies) * 1000:>12.1f} {max(latencies) * 1000:>12.1f}")
+
+if __name__ == "__main__":
+  asyncio.run(main())
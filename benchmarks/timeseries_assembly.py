@@ -0,0 +1,55 @@
+"""
+Compare the old history assembly, one scan of every row per requested id building a PointReading per row,
+with the single pass grouping of Timescale over rows ordered by (timeseriesid, ts) that formats the
+timestamps with NumPy.
+
+Runs on synthetic rows shaped like psycopg results, no database needed:
+
+  python benchmarks/timeseries_assembly.py
+"""
+from datetime import datetime, timezone
+import time
+from openoperator.domain.model import PointReading
+from openoperator.infrastructure.timescale import assemble_series
+
+SIZES = [(10, 10_000), (50, 100_000), (50, 500_000)]
+
+def make_rows(series: int, n: int) -> list[tuple]:
+  """
+  Rows as the new query returns them: (timeseriesid, epoch seconds, value) ordered by timeseriesid, ts.
+  """
+  start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+  per_series = n // series
+  return [(f"ts-{i}", start + j, float(j)) for i in range(series) for j in range(per_series)]
+
+def legacy_rows(rows: list[tuple]) -> list[tuple]:
+  """
+  The same rows as the old query returned them: (ts datetime, value, timeseriesid).
+  """
+  return [(datetime.fromtimestamp(epoch, tz=timezone.utc), value, id) for id, epoch, value in rows]
+
+def legacy(rows: list[tuple], ids: list[str]) -> list[dict]:
+  result = []
+  for id in ids:
+    data = [PointReading(ts=row[0].isoformat(), value=row[1], timeseriesid=row[2]).model_dump() for row in rows if row[2] == id]
+    result.append({'data': data, 'timeseriesid': id})
+  return result
+
+def timed(fn) -> float:
+  start = time.perf_counter()
+  fn()
+  return time.perf_counter() - start
+
+def main():
+  print(f"{'series':>8} {'rows':>10} {'legacy s':>10} {'rows s':>10} {'columnar s':>12} {'speedup':>9}")
+  for series, n in SIZES:
+    rows = make_rows(series, n)
+    ids = [f"ts-{i}" for i in range(series)]
+    old_rows = legacy_rows(rows)
+    old = timed(lambda: legacy(old_rows, ids))
+    new = timed(lambda: assemble_series(rows, ids))
+    columnar = timed(lambda: assemble_series(rows, ids, columnar=True))
+    print(f"{series:>8} {n:>10,} {old:>10.2f} {new:>10.2f} {columnar:>12.2f} {old / new:>8.1f}x")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,67 @@
+"""
+Dispatch cost of the MQTT topic router as the number of registered decoders grows,
+compared with testing every pattern in turn with re.match.
+
+  python benchmarks/topic_router_dispatch.py
+"""
+import random
+import re
+import timeit
+from openoperator.application.mqtt.topic_router import TopicRouter
+
+COUNTS = [2, 100, 500, 1000]
+TOPICS = 1000
+ROUNDS = 20
+
+def noop(topic: str, payload: bytes):
+  return []
+
+def make_filters(n: int) -> list[str]:
+  filters = []
+  for i in range(n):
+    kind = i % 3
+    if kind == 0:
+      filters.append(f"site{i}/+/status/switch:0")
+    elif kind == 1:
+      filters.append(f"site{i}/bacnet/#")
+    else:
+      filters.append(f"site{i}/device/{i}/events/rpc")
+  return filters
+
+def make_topics(n: int, count: int) -> list[str]:
+  rng = random.Random(0)
+  topics = []
+  for _ in range(count):
+    i = rng.randrange(n)
+    topics.append(rng.choice([f"site{i}/plug-{i}/status/switch:0", f"site{i}/bacnet/analogInput/{i}", f"site{i}/device/{i}/events/rpc", f"unknown/{i}/telemetry"]))
+  return topics
+
+def to_regex(topic_filter: str) -> str:
+  return "^" + topic_filter.replace("+", "[^/]+").replace("/#", "(/.*)?") + "$"
+
+def main():
+  print(f"{'decoders':>9} {'regex loop us/msg':>18} {'trie us/msg':>12} {'trie+cache us/msg':>18}")
+  for n in COUNTS:
+    filters = make_filters(n)
+    topics = make_topics(n, TOPICS)
+
+    patterns = [to_regex(f) for f in filters]
+    def regex_dispatch():
+      for topic in topics:
+        [p for p in patterns if re.match(p, topic)]
+
+    uncached = TopicRouter(cache_size=0)
+    cached = TopicRouter()
+    for f in filters:
+      uncached.register(f, noop)
+      cached.register(f, noop)
+
+    def trie_dispatch(router=uncached):
+      for topic in topics:
+        router.match(topic)
+
+    per_msg = lambda fn: min(timeit.repeat(fn, number=1, repeat=ROUNDS)) / TOPICS * 1e6
+    print(f"{n:>9} {per_msg(regex_dispatch):>18.2f} {per_msg(trie_dispatch):>12.2f} {per_msg(lambda: trie_dispatch(cached)):>18.2f}")
+
+if __name__ == "__main__":
+  main()
@@ -4,81 +4,61 @@ import os
 import jwt
 import json
 from io import BytesIO
-from fastapi import FastAPI, UploadFile, Depends, Security, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, Depends, Security, HTTPException, BackgroundTasks, Header, Query, WebSocket, WebSocketDisconnect
 from fastapi.responses import Response, JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from openoperator.infrastructure import KnowledgeGraph, AzureBlobStore, PGVectorStore, UnstructuredDocumentLoader, OpenAIEmbeddings, Postgres, Timescale, OpenaiLLM, OpenaiAudio, MQTTClient
-from openoperator.domain.repository import PortfolioRepository, UserRepository, FacilityRepository, DocumentRepository, COBieRepository, DeviceRepository, PointRepository
-from openoperator.domain.service import PortfolioService, UserService, FacilityService, DocumentService, COBieService, DeviceService, PointService, BACnetService, AIAssistantService
 from openoperator.domain.model import Portfolio, User, Facility, Document, DocumentQuery, DocumentMetadataChunk, Device, Point, PointUpdates, PointCreateParams, Message, LLMChatResponse, DeviceCreateParams
+from openoperator.application.api.history_stream import ndjson_stream, arrow_stream, ARROW_MEDIA_TYPE, NDJSON_MEDIA_TYPE
+from openoperator.application.api.live_stream import LiveFeed
+from openoperator.application.api.container import ApiContainer, ComponentUnavailable
+from openoperator.utils import run_blocking, iterate_blocking
+
+container = ApiContainer() # Components are built on first use, run the migrate command to set up schemas
 
-# System prompt for the AI Assistant
-llm_system_prompt = """You are an an AI Assistant that specializes in building operations and maintenance.
-Your goal is to help facility owners, managers, and operators manage their facilities and buildings more efficiently.
-Make sure to always follow ASHRAE guildelines.
-Be succinct and to the point.
-Provide sources for your information using markdown formatting."""
-
-# Infrastructure
-knowledge_graph = KnowledgeGraph()
-blob_store = AzureBlobStore()
-document_loader = UnstructuredDocumentLoader()
-embeddings = OpenAIEmbeddings()
-postgres = Postgres()
-vector_store = PGVectorStore(postgres=postgres, embeddings=embeddings)
-timescale = Timescale(postgres=postgres)
-llm = OpenaiLLM(model_name="gpt-4-0125-preview", system_prompt=llm_system_prompt)
-audio = OpenaiAudio()
-mqtt_client = MQTTClient()
-
-# Repositories
-portfolio_repository = PortfolioRepository(kg=knowledge_graph)
-user_repository = UserRepository(kg=knowledge_graph)
-facility_repository = FacilityRepository(kg=knowledge_graph)
-document_repository = DocumentRepository(kg=knowledge_graph, blob_store=blob_store, document_loader=document_loader, vector_store=vector_store)
-cobie_repository = COBieRepository(kg=knowledge_graph, blob_store=blob_store)
-point_repository = PointRepository(kg=knowledge_graph, ts=timescale)
-device_repository = DeviceRepository(kg=knowledge_graph, embeddings=embeddings, blob_store=blob_store)
-
-# Services
-base_uri = "https://syyclops.com/"
-portfolio_service = PortfolioService(portfolio_repository=portfolio_repository, base_uri=base_uri)
-user_service = UserService(user_repository=user_repository)
-facility_service = FacilityService(facility_repository=facility_repository)
-document_service = DocumentService(document_repository=document_repository)
-cobie_service = COBieService(cobie_repository=cobie_repository)
-device_service = DeviceService(device_repository=device_repository, point_repository=point_repository)
-point_service = PointService(point_repository=point_repository, device_repository=device_repository, mqtt_client=mqtt_client)
-bacnet_service = BACnetService(device_repository=device_repository)
-ai_assistant_service = AIAssistantService(llm=llm, document_repository=document_repository)
-  
 api_secret = os.getenv("API_TOKEN_SECRET")
 app = FastAPI(title="Open Operator API")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 security = HTTPBearer(auto_error=False)
 
+@app.exception_handler(ComponentUnavailable)
+async def component_unavailable(request, e: ComponentUnavailable) -> JSONResponse:
+  return JSONResponse(content={"message": str(e)}, status_code=503)
+
+@app.get("/health", tags=["Health"])
+async def health() -> JSONResponse:
+  """
+  Health and startup time of every component built so far, with the stats of those that keep them.
+  """
+  report = await run_blocking(container.health)
+  healthy = all(entry["status"] != "unhealthy" for entry in report.values())
+  return JSONResponse(content=report, status_code=200 if healthy else 503)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+  return await user_from_token(credentials.credentials if credentials else None)
+
+async def user_from_token(token: str | None) -> User:
   # If its local development, return a dummy user
   if os.environ.get("ENV") == "dev":
     return User(email="example@example.com", hashed_password="", full_name="Example User")
-  if credentials is None or credentials.credentials is None:
+  if token is None:
     raise HTTPException(status_code=401, detail="Invalid token")
-  token = credentials.credentials
   try:
     decoded = jwt.decode(token, api_secret, algorithms=["HS256"])
-    email = decoded.get("email")  
-    user = user_service.get_user(email)
-    return user
-  except HTTPException as e:
-    raise e
+  except jwt.InvalidTokenError:
+    raise HTTPException(status_code=401, detail="Invalid token")
+  email = decoded.get("email")  
+  user = await container.user_service.get_user(email) # Cached, unknown emails included
+  if user is None:
+    raise HTTPException(status_code=401, detail="Invalid token")
+  return user
 
 ## AUTH ROUTES 
 @app.post("/signup", tags=["Auth"])
 async def signup(email: str, password: str, full_name: str) -> JSONResponse:
   try:
-    user_service.create_user(email, full_name, password)
+    await container.user_service.create_user(email, full_name, password)
     token = jwt.encode({"email": email}, api_secret, algorithm="HS256")  
     return JSONResponse({
       "token": token,
@@ -89,7 +69,7 @@ async def signup(email: str, password: str, full_name: str) -> JSONResponse:
 @app.post("/login", tags=["Auth"])
 async def login(email: str, password: str) -> JSONResponse:
   try:
-    verified = user_service.verify_user_password(email, password)
+    verified = await container.user_service.verify_user_password(email, password)
     if not verified:
       return JSONResponse(content={"message": "Invalid credentials"}, status_code=401)
     token = jwt.encode({"email": email}, api_secret, algorithm="HS256")
@@ -110,7 +90,8 @@ async def chat(
     raise HTTPException(status_code=400, detail="If a document_uri is provided, a facility_uri must also be provided.")
 
   async def event_stream() -> Generator[str, None, None]:
-    for response in ai_assistant_service.chat(portfolio_uri=portfolio_uri, messages=messages, facility_uri=facility_uri, document_uri=document_uri, verbose=False):
+    # The tool calling loop and the document search it runs are synchronous, every step runs off the event loop
+    async for response in iterate_blocking(container.ai_assistant_service.chat(portfolio_uri=portfolio_uri, messages=messages, facility_uri=facility_uri, document_uri=document_uri, verbose=False)):
       yield f"event: message\ndata: {json.dumps(response.model_dump())}\n\n"
 
   return StreamingResponse(event_stream(), media_type="text/event-stream")
@@ -124,14 +105,14 @@ async def transcribe_audio(
     file_content = await file.read()
     buffer = BytesIO(file_content)
     buffer.name = file.filename
-    return Response(content=audio.transcribe(buffer))
+    return Response(content=await container.audio.transcribe(buffer))
   except HTTPException as e:
     return JSONResponse(content={"message": f"Unable to transcribe audio: {e}"}, status_code=500)
 
 ## PORTFOLIO ROUTES
 @app.get("/portfolio/list", tags=['Portfolio'], response_model=List[Portfolio])
 async def list_portfolios(current_user: User = Security(get_current_user)) -> JSONResponse:
-  portfolios = portfolio_service.list_portfolios_for_user(current_user.email)
+  portfolios = await container.portfolio_service.list_portfolios_for_user(current_user.email)
   return JSONResponse([portfolio.model_dump() for portfolio in portfolios])
 
 @app.post("/portfolio/create", tags=['Portfolio'], response_model=Portfolio)
@@ -140,7 +121,7 @@ async def create_portfolio(
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
   try:
-    portfolio = portfolio_service.create_portfolio(portfolio_name, current_user.email)
+    portfolio = await container.portfolio_service.create_portfolio(portfolio_name, current_user.email)
     return JSONResponse(portfolio.model_dump())
   except HTTPException as e:
     return JSONResponse(content={"message": f"Unable to create portfolio: {e}"}, status_code=500)
@@ -148,7 +129,7 @@ async def create_portfolio(
 ## FACILITY ROUTES
 @app.get("/facility/list", tags=['Facility'], response_model=List[Facility])
 async def list_facilities(portfolio_uri: str, current_user: User = Security(get_current_user)) -> JSONResponse:
-  return JSONResponse([facility.model_dump() for facility in facility_service.list_facilities_for_portfolio(portfolio_uri)])    
+  return JSONResponse([facility.model_dump() for facility in await container.facility_service.list_facilities_for_portfolio(portfolio_uri)])    
 
 @app.post("/facility/create", tags=['Facility'], response_model=Facility)
 async def create_facility(
@@ -157,7 +138,7 @@ async def create_facility(
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
   try:
-    facility = facility_service.create_facility(facility_name, portfolio_uri)
+    facility = await container.facility_service.create_facility(facility_name, portfolio_uri)
     return JSONResponse(facility.model_dump())
   except HTTPException as e:
     return JSONResponse(content={"message": f"Unable to create facility: {e}"}, status_code=500)
@@ -168,7 +149,7 @@ async def list_documents(
   facility_uri: str,
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
-  docs = [doc.model_dump() for doc in document_service.list_documents(facility_uri)]
+  docs = [doc.model_dump() for doc in await run_blocking(container.document_service.list_documents, facility_uri)]
   return JSONResponse(docs)
   
 @app.post("/documents/search", tags=['Document'], response_model=List[DocumentMetadataChunk])
@@ -176,7 +157,7 @@ async def search_documents(
   query: DocumentQuery,
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
-  return JSONResponse([chunk.model_dump() for chunk in document_service.search(query)])
+  return JSONResponse([chunk.model_dump() for chunk in await run_blocking(container.document_service.search, query)])
 
 @app.post("/documents/upload", tags=['Document'])
 async def upload_files(
@@ -193,8 +174,8 @@ async def upload_files(
     try:
       file_content = await file.read()
       file_type = mimetypes.guess_type(file.filename)[0]
-      document = document_service.upload_document(facility_uri=facility_uri, file_content=file_content, file_name=file.filename, file_type=file_type, discipline=discipline)
-      background_tasks.add_task(document_service.run_extraction_process, portfolio_uri, facility_uri, file_content, file.filename, document.uri, document.url)
+      document = await run_blocking(container.document_service.upload_document, facility_uri=facility_uri, file_content=file_content, file_name=file.filename, file_type=file_type, discipline=discipline)
+      background_tasks.add_task(container.document_service.run_extraction_process, portfolio_uri, facility_uri, file_content, file.filename, document.uri, document.url)
       uploaded_files_info.append({"filename": file.filename, "uri": document.uri})
     except Exception as e:  
       return JSONResponse(
@@ -210,7 +191,7 @@ async def delete_document(
   current_user: User = Security(get_current_user)
 ) -> Response:
   try:
-    document_service.delete_document(document_uri)
+    await run_blocking(container.document_service.delete_document, document_uri)
     return JSONResponse(content={
       "message": "Document deleted successfully",
     })
@@ -228,7 +209,7 @@ async def list_devices(
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
   try:
-    devices = device_service.get_devices(facility_uri=facility_uri, component_uri=component_uri)
+    devices = await run_blocking(container.device_service.get_devices, facility_uri=facility_uri, component_uri=component_uri)
     # for device in devices: # Remove the embedding from the response
     #   device.pop('embedding', None)
     devices = [device.model_dump() for device in devices]
@@ -247,7 +228,7 @@ async def get_device_graphic(
 ) -> JSONResponse:
   try:
     return Response(
-      device_service.get_device_graphic(facility_uri=facility_uri, device_uri=device_uri), 
+      await run_blocking(container.device_service.get_device_graphic, facility_uri=facility_uri, device_uri=device_uri), 
       media_type="image/svg+xml"
     )
   except HTTPException as e:
@@ -263,7 +244,7 @@ async def create_device(
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
   try:
-    device = device_service.create_device(facility_uri=facility_uri, device=device)
+    device = await run_blocking(container.device_service.create_device, facility_uri=facility_uri, device=device)
     return JSONResponse(device.model_dump())
   except HTTPException as e:
     return JSONResponse(
@@ -278,7 +259,7 @@ async def link_to_component(
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
   try:
-    return JSONResponse(device_service.link_device_to_component(device_uri=device_uri, component_uri=component_uri))
+    return JSONResponse(await run_blocking(container.device_service.link_device_to_component, device_uri=device_uri, component_uri=component_uri))
   except HTTPException as e:
     return JSONResponse(
         content={"message": f"Unable to link device to component: {e}"},
@@ -292,7 +273,7 @@ async def update_device(
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
   try:
-    device_service.update(device_uri=device_uri, new_details=new_details)
+    await run_blocking(container.device_service.update, device_uri=device_uri, new_details=new_details)
     return JSONResponse(content={"message": "Device updated successfully"})
   except HTTPException as e:
     return JSONResponse(
@@ -308,7 +289,7 @@ async def list_points(
   collect_enabled: bool | None = None,
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
-  points = point_service.get_points(facility_uri=facility_uri, component_uri=component_uri, collect_enabled=collect_enabled)
+  points = await run_blocking(container.point_service.get_points, facility_uri=facility_uri, component_uri=component_uri, collect_enabled=collect_enabled)
   points = [point.model_dump() for point in points]
   for point in points: # Remove the embedding from the response
     point.pop('embedding', None)
@@ -319,7 +300,7 @@ async def get_point(
   point_uri: str,
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
-  point = point_service.get_point(point_uri=point_uri)
+  point = await run_blocking(container.point_service.get_point, point_uri=point_uri)
   return JSONResponse(point.model_dump())
 
 @app.get("/point/live", tags=['Points'])
@@ -327,7 +308,57 @@ async def get_live_reading(
   point_uri: str,
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
-  return JSONResponse(point_service.get_live_reading(point_uri))
+  try:
+    return JSONResponse(await run_blocking(container.point_service.get_live_reading, point_uri))
+  except TimeoutError as e:
+    raise HTTPException(status_code=504, detail=str(e))
+
+@app.get("/points/live/stream", tags=['Points'])
+async def stream_live_points(
+  point_uris: List[str] = Query(),
+  min_interval: float = 1.0,
+  current_user: User = Security(get_current_user)
+) -> StreamingResponse:
+  """
+  Server-sent events with the latest readings of the points, at most one event every min_interval seconds.
+  """
+  feed = LiveFeed(container.mqtt_session, await run_blocking(container.point_service.get_mqtt_topics, point_uris), min_interval=min_interval)
+
+  async def event_stream():
+    try:
+      async for readings in feed.updates():
+        yield f"event: readings\ndata: {json.dumps(readings)}\n\n" if readings else ": keepalive\n\n"
+    finally:
+      feed.close()
+
+  return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.websocket("/points/live/stream")
+async def stream_live_points_websocket(
+  websocket: WebSocket,
+  point_uris: List[str] = Query(),
+  min_interval: float = 1.0,
+  token: str | None = None
+):
+  """
+  The same feed over a WebSocket. Browsers cannot set headers on a WebSocket, so the token can also be
+  passed as a query parameter.
+  """
+  authorization = websocket.headers.get("authorization", "")
+  try:
+    await user_from_token(token or (authorization[7:] if authorization.lower().startswith("bearer ") else None))
+  except HTTPException:
+    await websocket.close(code=1008)
+    return
+  await websocket.accept()
+  feed = LiveFeed(container.mqtt_session, await run_blocking(container.point_service.get_mqtt_topics, point_uris), min_interval=min_interval)
+  try:
+    async for readings in feed.updates():
+      await websocket.send_json({"readings": readings})
+  except WebSocketDisconnect:
+    pass
+  finally:
+    feed.close()
 
 @app.post("/point/create", tags=['Points'], response_model=Point)
 async def create_point(
@@ -338,7 +369,7 @@ async def create_point(
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
   try:
-    point = point_service.create_point(facility_uri=facility_uri, device_uri=device_uri, point=point, brick_class_uri=brick_class_uri)
+    point = await run_blocking(container.point_service.create_point, facility_uri=facility_uri, device_uri=device_uri, point=point, brick_class_uri=brick_class_uri)
     return JSONResponse(point.model_dump())
   except HTTPException as e:
     return JSONResponse(
@@ -353,8 +384,10 @@ async def command_point(
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
   try:
-    point_service.command_point(point_uri=point_uri, command=command)
+    await run_blocking(container.point_service.command_point, point_uri=point_uri, command=command)
     return JSONResponse(content={"message": "Command sent successfully"})
+  except TimeoutError as e:
+    raise HTTPException(status_code=504, detail=str(e))
   except HTTPException as e:
     return JSONResponse(
         content={"message": f"Unable to send command to point: {e}"},
@@ -366,9 +399,38 @@ async def get_points_history(
   start_time: str,
   end_time: str,
   point_uris: List[str],
+  resolution: str | None = None,
+  max_points: int | None = None,
+  downsample: Literal['bucket', 'lttb'] = 'bucket',
+  columnar: bool = False,
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
-  return JSONResponse(point_service.get_points_history(start_time=start_time, end_time=end_time, point_uris=point_uris))
+  """
+  Raw readings by default, as ts and value arrays per point with columnar. Pass a resolution interval
+  (e.g. '15 minutes') or max_points to get time bucket aggregates (avg as value, min, max, last) per series,
+  or downsample='lttb' with max_points to keep the most significant raw readings instead.
+  """
+  try:
+    return JSONResponse(await run_blocking(container.point_service.get_points_history, start_time=start_time, end_time=end_time, point_uris=point_uris, resolution=resolution, max_points=max_points, downsample=downsample, columnar=columnar))
+  except ValueError as e:
+    raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/points/history/stream", tags=['Points'])
+async def stream_points_history(
+  start_time: str,
+  end_time: str,
+  point_uris: List[str],
+  accept: str | None = Header(None),
+  current_user: User = Security(get_current_user)
+) -> StreamingResponse:
+  """
+  Raw readings streamed from a server side cursor as they are read, NDJSON lines of ts and value arrays per
+  series, or Arrow IPC record batches when the client accepts application/vnd.apache.arrow.stream.
+  """
+  point_uris_by_id, chunks = await run_blocking(container.point_service.stream_points_history, point_uris=point_uris, start_time=start_time, end_time=end_time)
+  if accept and ARROW_MEDIA_TYPE in accept:
+    return StreamingResponse(iterate_blocking(arrow_stream(chunks, point_uris_by_id)), media_type=ARROW_MEDIA_TYPE)
+  return StreamingResponse(iterate_blocking(ndjson_stream(chunks, point_uris_by_id)), media_type=NDJSON_MEDIA_TYPE)
 
 @app.put("/point/update", tags=['Points'])
 async def update_point(
@@ -378,7 +440,7 @@ async def update_point(
   current_user: User = Security(get_current_user)
 ) -> JSONResponse:
   try:
-    point_service.update_point(point_uri=point_uri, updates=updates, new_brick_class_uri=brick_class_uri)
+    await run_blocking(container.point_service.update_point, point_uri=point_uri, updates=updates, new_brick_class_uri=brick_class_uri)
     return JSONResponse(content={"message": "Point updated successfully"})
   except HTTPException as e:
     return JSONResponse(
@@ -396,7 +458,7 @@ async def import_cobie_spreadsheet(
 ):
   try:
     file_content = await file.read()
-    errors_found, errors = cobie_service.process_cobie_spreadsheet(facility_uri=facility_uri, file=file_content, validate=validate)
+    errors_found, errors = await run_blocking(container.cobie_service.process_cobie_spreadsheet, facility_uri=facility_uri, file=file_content, validate=validate)
     if errors_found:
       return JSONResponse(content={"errors": errors}, status_code=400)
     return "COBie spreadsheet imported successfully"
@@ -413,7 +475,7 @@ async def upload_bacnet_data(
 ):
   try:
     file_content = await file.read()
-    bacnet_service.upload_bacnet_data(facility_uri=facility_uri, file=file_content)
+    await run_blocking(container.bacnet_service.upload_bacnet_data, facility_uri=facility_uri, file=file_content)
 
     return "BACnet data uploaded successfully"
   except HTTPException as e:
@@ -0,0 +1,267 @@
+from typing import Any, Callable, Dict, List
+from collections import defaultdict
+import threading
+import time
+from openoperator.infrastructure import KnowledgeGraph, AzureBlobStore, PGVectorStore, UnstructuredDocumentLoader, OpenAIEmbeddings, CachedEmbeddings, Postgres, Timescale, LatestValueCache, OpenaiLLM, OpenaiAudio, MQTTClient, MQTTSession
+from openoperator.domain.repository import PortfolioRepository, UserRepository, FacilityRepository, DocumentRepository, COBieRepository, DeviceRepository, PointRepository
+from openoperator.domain.service import PortfolioService, UserService, FacilityService, DocumentService, COBieService, DeviceService, PointService, BACnetService, AIAssistantService
+
+# System prompt for the AI Assistant
+llm_system_prompt = """You are an an AI Assistant that specializes in building operations and maintenance.
+Your goal is to help facility owners, managers, and operators manage their facilities and buildings more efficiently.
+Make sure to always follow ASHRAE guildelines.
+Be succinct and to the point.
+Provide sources for your information using markdown formatting."""
+
+class ComponentUnavailable(Exception):
+  """
+  A component could not be built, usually because the service behind it is down. The next access retries.
+  """
+  def __init__(self, name: str, cause: Exception):
+    super().__init__(f"{name} is unavailable: {cause}")
+    self.name = name
+
+class component:
+  """
+  A lazily built singleton of a Container, declared like a property whose getter is the factory. Decorate a
+  second method with @<name>.health to give it a health check, it gets the built instance and raises when
+  the component is unhealthy.
+  """
+  def __init__(self, factory: Callable[[Any], Any], check: Callable[[Any, Any], None] | None = None):
+    self.factory = factory
+    self.check = check
+    self.name = factory.__name__
+
+  def health(self, check: Callable[[Any, Any], None]) -> 'component':
+    return component(self.factory, check)
+
+  def __get__(self, container: 'Container', owner=None):
+    if container is None:
+      return self
+    return container.resolve(self)
+
+class Container:
+  """
+  Builds each component on first access, once, and records how long it took to start excluding the
+  components it depends on. Building does not touch the network for the infrastructure here, schema setup
+  is left to migrate(), so importing the API is fast and an outage only fails the requests that need it.
+  """
+  migrations: List[str] = []
+
+  def __init__(self):
+    self.instances: Dict[str, Any] = {}
+    self.startup_times: Dict[str, float] = {}
+    self.locks = defaultdict(threading.Lock)
+    self.locks_lock = threading.Lock()
+    self.local = threading.local()
+
+  @classmethod
+  def components(cls) -> Dict[str, component]:
+    found = {}
+    for klass in reversed(cls.__mro__):
+      found.update({name: value for name, value in vars(klass).items() if isinstance(value, component)})
+    return found
+
+  def resolve(self, component: component) -> Any:
+    name = component.name
+    if name in self.instances:
+      return self.instances[name]
+    with self.locks_lock:
+      lock = self.locks[name]
+    with lock:
+      if name in self.instances:
+        return self.instances[name]
+      stack = self.local.__dict__.setdefault('stack', []) # Time spent building dependencies, per build in progress
+      stack.append(0.0)
+      start = time.perf_counter()
+      try:
+        instance = component.factory(self)
+      except ComponentUnavailable:
+        raise
+      except Exception as e:
+        raise ComponentUnavailable(name, e) from e
+      finally:
+        elapsed = time.perf_counter() - start
+        dependencies = stack.pop()
+        if stack:
+          stack[-1] += elapsed
+      self.startup_times[name] = elapsed - dependencies
+      self.instances[name] = instance
+      print(f"Started {name} in {self.startup_times[name] * 1000:.1f} ms")
+      return instance
+
+  def health(self) -> Dict[str, dict]:
+    """
+    Status, startup time and stats() of every component. Only built components are checked, the others are
+    reported as not started.
+    """
+    report = {}
+    for name, declared in self.components().items():
+      if name not in self.instances:
+        report[name] = {"status": "not started"}
+        continue
+      instance = self.instances[name]
+      entry = {"status": "ok", "startup_seconds": self.startup_times[name]}
+      if callable(getattr(instance, 'stats', None)):
+        entry["stats"] = instance.stats()
+      if declared.check is not None:
+        try:
+          declared.check(self, instance)
+        except Exception as e:
+          entry.update(status="unhealthy", error=str(e))
+      report[name] = entry
+    return report
+
+  def migrate(self) -> Dict[str, float]:
+    """
+    Run the schema setup of every component in migrations, in order, and return how long each took.
+    """
+    durations = {}
+    for name in self.migrations:
+      start = time.perf_counter()
+      getattr(self, name).migrate()
+      durations[name] = time.perf_counter() - start
+    return durations
+
+class ApiContainer(Container):
+  migrations = ['knowledge_graph', 'blob_store', 'embeddings', 'vector_store', 'timescale']
+
+  # Infrastructure
+  @component
+  def knowledge_graph(self) -> KnowledgeGraph:
+    return KnowledgeGraph(migrate=False)
+
+  @knowledge_graph.health
+  def knowledge_graph(self, knowledge_graph: KnowledgeGraph) -> None:
+    knowledge_graph.neo4j_driver.verify_connectivity()
+
+  @component
+  def blob_store(self) -> AzureBlobStore:
+    return AzureBlobStore(migrate=False)
+
+  @blob_store.health
+  def blob_store(self, blob_store: AzureBlobStore) -> None:
+    blob_store.container_client.get_container_properties()
+
+  @component
+  def document_loader(self) -> UnstructuredDocumentLoader:
+    return UnstructuredDocumentLoader()
+
+  @component
+  def embeddings(self) -> CachedEmbeddings:
+    return CachedEmbeddings(OpenAIEmbeddings(), postgres=self.postgres, migrate=False) # Shared by the vector store and device vectorization
+
+  @component
+  def postgres(self) -> Postgres:
+    return Postgres()
+
+  @postgres.health
+  def postgres(self, postgres: Postgres) -> None:
+    with postgres.pool.connection(timeout=5) as conn:
+      conn.execute('SELECT 1')
+
+  @component
+  def vector_store(self) -> PGVectorStore:
+    return PGVectorStore(postgres=self.postgres, embeddings=self.embeddings, migrate=False)
+
+  @component
+  def timescale(self) -> Timescale:
+    return Timescale(postgres=self.postgres, migrate=False)
+
+  @component
+  def latest_values(self) -> LatestValueCache:
+    latest_values = LatestValueCache(timescale=self.timescale)
+    latest_values.listen()
+    return latest_values
+
+  @latest_values.health
+  def latest_values(self, latest_values: LatestValueCache) -> None:
+    if latest_values.listening_since is None:
+      raise ConnectionError("Not listening for latest values, entries expire after the ttl")
+
+  @component
+  def llm(self) -> OpenaiLLM:
+    return OpenaiLLM(model_name="gpt-4-0125-preview", system_prompt=llm_system_prompt)
+
+  @component
+  def audio(self) -> OpenaiAudio:
+    return OpenaiAudio()
+
+  @component
+  def mqtt_session(self) -> MQTTSession:
+    mqtt_session = MQTTSession(mqtt_client=MQTTClient())
+    mqtt_session.start()
+    return mqtt_session
+
+  @mqtt_session.health
+  def mqtt_session(self, mqtt_session: MQTTSession) -> None:
+    if not mqtt_session.connected.is_set():
+      raise ConnectionError("Not connected to the MQTT broker")
+
+  # Repositories
+  @component
+  def portfolio_repository(self) -> PortfolioRepository:
+    return PortfolioRepository(kg=self.knowledge_graph)
+
+  @component
+  def user_repository(self) -> UserRepository:
+    return UserRepository(kg=self.knowledge_graph)
+
+  @component
+  def facility_repository(self) -> FacilityRepository:
+    return FacilityRepository(kg=self.knowledge_graph)
+
+  @component
+  def document_repository(self) -> DocumentRepository:
+    return DocumentRepository(kg=self.knowledge_graph, blob_store=self.blob_store, document_loader=self.document_loader, vector_store=self.vector_store)
+
+  @component
+  def cobie_repository(self) -> COBieRepository:
+    return COBieRepository(kg=self.knowledge_graph, blob_store=self.blob_store)
+
+  @component
+  def point_repository(self) -> PointRepository:
+    return PointRepository(kg=self.knowledge_graph, ts=self.timescale, latest_values=self.latest_values)
+
+  @component
+  def device_repository(self) -> DeviceRepository:
+    return DeviceRepository(kg=self.knowledge_graph, embeddings=self.embeddings, blob_store=self.blob_store)
+
+  # Services
+  base_uri = "https://syyclops.com/"
+
+  @component
+  def portfolio_service(self) -> PortfolioService:
+    return PortfolioService(portfolio_repository=self.portfolio_repository, base_uri=self.base_uri)
+
+  @component
+  def user_service(self) -> UserService:
+    return UserService(user_repository=self.user_repository)
+
+  @component
+  def facility_service(self) -> FacilityService:
+    return FacilityService(facility_repository=self.facility_repository)
+
+  @component
+  def document_service(self) -> DocumentService:
+    return DocumentService(document_repository=self.document_repository)
+
+  @component
+  def cobie_service(self) -> COBieService:
+    return COBieService(cobie_repository=self.cobie_repository)
+
+  @component
+  def device_service(self) -> DeviceService:
+    return DeviceService(device_repository=self.device_repository, point_repository=self.point_repository)
+
+  @component
+  def point_service(self) -> PointService:
+    return PointService(point_repository=self.point_repository, device_repository=self.device_repository, mqtt_session=self.mqtt_session)
+
+  @component
+  def bacnet_service(self) -> BACnetService:
+    return BACnetService(device_repository=self.device_repository)
+
+  @component
+  def ai_assistant_service(self) -> AIAssistantService:
+    return AIAssistantService(llm=self.llm, document_repository=self.document_repository)
@@ -0,0 +1,52 @@
+from typing import Dict, Iterable, Iterator
+import io
+import json
+import numpy as np
+import pyarrow as pa
+from openoperator.infrastructure.timescale import group_series, format_timestamps
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+ARROW_SCHEMA = pa.schema([
+  ('timeseriesid', pa.dictionary(pa.int32(), pa.string())),
+  ('ts', pa.timestamp('us', tz='UTC')),
+  ('value', pa.float64()),
+])
+
+def ndjson_stream(chunks: Iterable[np.ndarray], point_uris: Dict[str, str]) -> Iterator[bytes]:
+  """
+  One JSON line per series per chunk: {"timeseriesid", "point_uri", "ts": [...], "value": [...]}. Long
+  series are split over consecutive lines with the same timeseriesid.
+  """
+  for chunk in chunks:
+    for id, epochs, values in group_series(chunk):
+      line = {'timeseriesid': id, 'point_uri': point_uris.get(id), 'ts': format_timestamps(epochs), 'value': values.tolist()}
+      yield (json.dumps(line) + '\n').encode()
+
+def arrow_stream(chunks: Iterable[np.ndarray], point_uris: Dict[str, str]) -> Iterator[bytes]:
+  """
+  An Arrow IPC stream with one record batch per chunk. The timeseriesid to point uri mapping is stored in
+  the schema metadata under 'point_uris'.
+  """
+  schema = ARROW_SCHEMA.with_metadata({'point_uris': json.dumps(point_uris)})
+  sink = io.BytesIO()
+
+  def flush() -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+  with pa.ipc.new_stream(sink, schema) as writer:
+    yield flush() # The schema goes out before the first query result
+    for chunk in chunks:
+      micros = np.rint(chunk['epoch'] * 1e6).astype(np.int64)
+      batch = pa.record_batch([
+        pa.array(chunk['timeseriesid'], type=pa.string()).dictionary_encode(),
+        pa.array(micros).cast(pa.timestamp('us', tz='UTC')),
+        pa.array(chunk['value']),
+      ], schema=schema)
+      writer.write_batch(batch)
+      yield flush()
+  yield flush() # End of stream marker
@@ -0,0 +1,82 @@
+from typing import AsyncIterator, Dict, List
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import partial
+import asyncio
+import json
+import threading
+import time
+from openoperator.infrastructure import MQTTSession
+
+MIN_INTERVAL = 0.1 # Fastest update rate a client can ask for, in seconds
+
+def decode_reading(payload: bytes):
+  """
+  The value carried by a point message, decoded fresh for every feed so no two clients share a mutable
+  value. A feed decodes a message once for all of its points on that topic.
+  """
+  try:
+    data = json.loads(payload)
+  except ValueError:
+    return payload.decode(errors='replace')
+  return data.get('output') if isinstance(data, dict) and 'output' in data else data
+
+class LiveFeed:
+  """
+  One client's live view of a set of points.
+
+  Each topic is subscribed through the shared MQTTSession, so all clients watching a topic share one broker
+  subscription. Messages are coalesced to the latest value per point and handed to the client at most once
+  every min_interval seconds, a slow client only ever holds one pending value per point.
+  """
+  def __init__(self, session: MQTTSession, topics: Dict[str, str], min_interval: float = 1.0, heartbeat: float = 15):
+    self.loop = asyncio.get_running_loop()
+    self.min_interval = max(min_interval, MIN_INTERVAL)
+    self.heartbeat = heartbeat
+    self.pending: Dict[str, dict] = {}
+    self.lock = threading.Lock()
+    self.wakeup = asyncio.Event()
+    points_by_topic = defaultdict(list)
+    for point_uri, topic in topics.items():
+      points_by_topic[topic].append(point_uri)
+    self.subscriptions = [session.subscribe(topic, partial(self.on_message, point_uris)) for topic, point_uris in points_by_topic.items()]
+
+  def on_message(self, point_uris: List[str], topic: str, payload: bytes) -> None:
+    """
+    Runs on the MQTT network thread.
+    """
+    value = decode_reading(payload)
+    ts = datetime.now(timezone.utc).isoformat()
+    with self.lock:
+      idle = not self.pending
+      for point_uri in point_uris:
+        self.pending[point_uri] = {'point_uri': point_uri, 'value': value, 'ts': ts}
+    if idle:
+      self.loop.call_soon_threadsafe(self.wakeup.set)
+
+  async def updates(self) -> AsyncIterator[List[dict]]:
+    """
+    Batches of the latest readings. An empty batch is yielded when nothing changed for heartbeat seconds,
+    so the transport can check the client is still there.
+    """
+    last = 0.0
+    while True:
+      try:
+        await asyncio.wait_for(self.wakeup.wait(), self.heartbeat)
+      except asyncio.TimeoutError:
+        yield []
+        continue
+      delay = self.min_interval - (time.monotonic() - last)
+      if delay > 0:
+        await asyncio.sleep(delay)
+      with self.lock:
+        readings = list(self.pending.values())
+        self.pending.clear()
+        self.wakeup.clear()
+      if readings:
+        last = time.monotonic()
+        yield readings
+
+  def close(self) -> None:
+    for subscription in self.subscriptions:
+      subscription.close()
@@ -0,0 +1,15 @@
+"""
+Set up the graph config, blob container, vector table and timeseries schema the API needs. Run once per
+deployment before starting the API, the API itself no longer does this on startup:
+
+  python -m openoperator.application.api.migrate
+"""
+from openoperator.application.api.container import ApiContainer
+
+def main():
+  container = ApiContainer()
+  for name, seconds in container.migrate().items():
+    print(f"Migrated {name} in {seconds:.2f} s")
+
+if __name__ == "__main__":
+  main()
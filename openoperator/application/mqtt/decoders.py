@@ -0,0 +1,49 @@
+from openoperator.domain.model import PointReadingBatch
+from .topic_router import Decoder, TopicRouter
+import json
+
+def shelly_plug_rpc(topic: str, payload: bytes, batch: PointReadingBatch) -> None:
+  """
+  Shelly plug RPC notifications, e.g. shellyplugus-<id>/events/rpc.
+  One reading per current and voltage measurement of each switch.
+  """
+  data = json.loads(payload.decode())
+  ts = data["params"]["ts"] # Extract the timestamp
+
+  # Iterate through each key in "params" to find "switch:X" objects
+  for key, value in data["params"].items():
+    if key.startswith("switch"):
+      # Extract the "id" and iterate over each measurement key within the switch object
+      switch_id = value["id"]
+      for measurement_key in value:
+        if measurement_key in ["current", "voltage"]:
+          # Construct the timeseries ID
+          timeseriesId = f"{data['src']}-switch-{switch_id}-{measurement_key}"
+          batch.append(ts, value[measurement_key], timeseriesId)
+
+def shelly_status_switch(topic: str, payload: bytes, batch: PointReadingBatch) -> None:
+  """
+  Shelly plug switch status, e.g. shellyplugus-<id>/status/switch:0. The topic is the timeseries id.
+  """
+  data = json.loads(payload.decode())
+  # Extracting 'minute_ts' from 'aenergy' as timestamp
+  batch.append(data["aenergy"]["minute_ts"], data["output"], topic)
+
+def shelly_plug(decoder: Decoder) -> Decoder:
+  """
+  Restrict a decoder to Shelly plug topics. The device id is the first topic level and has no fixed value a
+  filter could match, so this is the one place that checks its prefix.
+  """
+  def guarded(topic: str, payload: bytes, batch: PointReadingBatch) -> None:
+    if topic.startswith("shellyplugus"):
+      decoder(topic, payload, batch)
+  return guarded
+
+def default_router() -> TopicRouter:
+  """
+  Router with all the built in decoders registered.
+  """
+  router = TopicRouter()
+  router.register("+/events/rpc", shelly_plug(shelly_plug_rpc))
+  router.register("+/status/switch:0", shelly_plug(shelly_status_switch))
+  return router
@@ -0,0 +1,78 @@
+from openoperator.domain.model import PointReadingBatch
+from typing import Awaitable, Callable
+import asyncio
+import time
+
+class FlushScheduler:
+  """
+  Double buffered batch for a single writer task.
+
+  Messages are decoded straight into the active buffer. When the buffer reaches batch_size readings, flush_bytes of
+  payload, or flush_interval seconds since its first reading, it is swapped for an empty one and flushed in
+  the background while the writer keeps filling the new buffer. Only one flush is in flight at a time,
+  so a slow database still slows the writer down instead of piling up batches in memory.
+  """
+  def __init__(
+    self,
+    flush: Callable[[PointReadingBatch], Awaitable[None]],
+    batch_size: int,
+    flush_interval: float,
+    flush_bytes: int | None = None,
+  ):
+    self.flush = flush
+    self.batch_size = batch_size
+    self.flush_interval = flush_interval
+    self.flush_bytes = flush_bytes
+    self.buffer = PointReadingBatch()
+    self.buffer_bytes = 0
+    self.deadline: float | None = None
+    self.in_flight: asyncio.Task | None = None
+
+  def added(self, nbytes: int) -> None:
+    """
+    Account for a message of nbytes that was decoded into the buffer.
+    """
+    if self.deadline is None:
+      self.deadline = time.monotonic() + self.flush_interval
+    self.buffer_bytes += nbytes
+
+  def trigger(self) -> str | None:
+    """
+    The reason the buffer should be flushed now, if any.
+    """
+    if len(self.buffer) >= self.batch_size:
+      return "size"
+    if self.flush_bytes is not None and self.buffer_bytes >= self.flush_bytes:
+      return "bytes"
+    if self.deadline is not None and time.monotonic() >= self.deadline:
+      return "age"
+    return None
+
+  def timeout(self) -> float | None:
+    """
+    Seconds until the age trigger fires, None when the buffer is empty.
+    """
+    if self.deadline is None:
+      return None
+    return max(self.deadline - time.monotonic(), 0)
+
+  async def swap(self) -> None:
+    """
+    Hand the active buffer to a background flush and start a new one.
+    """
+    batch = self.buffer
+    self.buffer, self.buffer_bytes, self.deadline = PointReadingBatch(), 0, None
+    if len(batch) == 0:
+      return
+    if self.in_flight:
+      await self.in_flight
+    self.in_flight = asyncio.create_task(self.flush(batch))
+
+  async def drain(self) -> None:
+    """
+    Flush whatever is buffered and wait for it to finish.
+    """
+    await self.swap()
+    if self.in_flight:
+      await self.in_flight
+      self.in_flight = None
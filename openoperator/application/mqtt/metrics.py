@@ -0,0 +1,94 @@
+from typing import Dict
+import bisect
+
+class LatencyHistogram:
+  """
+  Fixed bucket latency histogram, cumulative like a Prometheus histogram.
+  """
+  buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+  def __init__(self):
+    self.counts = [0] * (len(self.buckets) + 1) # The last bucket is +Inf
+    self.count = 0
+    self.sum = 0.0
+    self.max = 0.0
+
+  def observe(self, seconds: float):
+    self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+    self.count += 1
+    self.sum += seconds
+    self.max = max(self.max, seconds)
+
+  def quantile(self, q: float) -> float:
+    """
+    Upper bound of the bucket holding the q-th quantile.
+    """
+    if self.count == 0:
+      return 0.0
+    rank = q * self.count
+    seen = 0
+    for i, count in enumerate(self.counts):
+      seen += count
+      if seen >= rank:
+        return self.buckets[i] if i < len(self.buckets) else self.max
+    return self.max
+
+  def snapshot(self) -> dict:
+    cumulative = 0
+    buckets = {}
+    for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+      cumulative += count
+      buckets[f"le_{bound}"] = cumulative
+    return {
+      "count": self.count,
+      "sum": self.sum,
+      "avg": self.sum / self.count if self.count else 0.0,
+      "max": self.max,
+      "p50": self.quantile(0.5),
+      "p95": self.quantile(0.95),
+      "p99": self.quantile(0.99),
+      "buckets": buckets,
+    }
+
+class IngestMetrics:
+  """
+  Counters for each stage of the ingest pipeline: receive -> queue -> decode -> flush.
+  """
+  def __init__(self):
+    self.received = 0
+    self.dropped = 0
+    self.spilled = 0
+    self.queue_depth = 0
+    self.queue_depth_max = 0
+    self.decoded = 0
+    self.decode_errors = 0
+    self.flushes = 0
+    self.flushed_rows = 0
+    self.flush_errors = 0
+    self.flush_triggers: Dict[str, int] = {"size": 0, "bytes": 0, "age": 0, "stop": 0}
+    self.flush_latency = LatencyHistogram()
+
+  def observe_queue_depth(self, depth: int):
+    self.queue_depth = depth
+    self.queue_depth_max = max(self.queue_depth_max, depth)
+
+  def observe_flush(self, rows: int, seconds: float):
+    self.flushes += 1
+    self.flushed_rows += rows
+    self.flush_latency.observe(seconds)
+
+  def snapshot(self) -> dict:
+    return {
+      "received": self.received,
+      "dropped": self.dropped,
+      "spilled": self.spilled,
+      "queue_depth": self.queue_depth,
+      "queue_depth_max": self.queue_depth_max,
+      "decoded": self.decoded,
+      "decode_errors": self.decode_errors,
+      "flushes": self.flushes,
+      "flushed_rows": self.flushed_rows,
+      "flush_errors": self.flush_errors,
+      "flush_triggers": dict(self.flush_triggers),
+      "flush_latency": self.flush_latency.snapshot(),
+    }
@@ -1,135 +1,355 @@
 from openoperator.infrastructure import MQTTClient, Timescale, Postgres
-from openoperator.domain.model import PointReading
-from threading import Lock, Timer
-from typing import List
-import atexit
-import re
+from openoperator.domain.model import PointReadingBatch
+from openoperator.application.mqtt.topic_router import TopicRouter
+from openoperator.application.mqtt.decoders import default_router
+from openoperator.application.mqtt.spool import Spool
+from openoperator.application.mqtt.metrics import IngestMetrics
+from openoperator.application.mqtt.flush_scheduler import FlushScheduler
+from openoperator.application.mqtt.supervisor import Supervisor
+from typing import List, Literal, Tuple
+import asyncio
+import base64
+import concurrent.futures
 import json
-from datetime import datetime
-from dotenv import load_dotenv
-load_dotenv()
+import os
+import signal
+import time
+
+BackpressurePolicy = Literal['block', 'drop_oldest', 'spill']
+BLOCK_POLL_INTERVAL = 1.0 # Seconds a blocked network thread waits before checking whether the app is stopping
 
 class MQTT2Timescale:
   """
   This is a application that listens to messages from the broker and stores them in the database.
-  - message processing
-  - batch processing
-  - flushing the batch to the database
+  - message receiving on the paho network thread, handed to asyncio through a bounded queue
+  - message processing and batch processing in a pool of writer tasks
+  - flushing the batches to the database off the event loop, on size, payload bytes or age, while the
+    writer keeps filling a second buffer
+
+  When the queue is full the backpressure policy decides what happens to new messages:
+  - block: the network thread waits for room in the queue
+  - drop_oldest: the oldest queued message is discarded
+  - spill: the message is appended to a file in spill_dir and re-queued once there is room
+
+  With a spool every batch is written to disk before the database flush and removed after it commits.
+  Batches that fail to flush are retried after the next successful flush, and anything left in the
+  spool when the process died is replayed on start.
   """
-  def __init__(self, mqtt_client: MQTTClient, ts: Timescale, batch_size=100, flush_interval=30):
+  def __init__(
+    self,
+    mqtt_client: MQTTClient,
+    ts: Timescale | List[Timescale],
+    batch_size: int = 100,
+    flush_interval: float = 30,
+    flush_bytes: int | None = None,
+    queue_size: int = 10000,
+    backpressure: BackpressurePolicy = 'block',
+    spill_dir: str | None = None,
+    router: TopicRouter | None = None,
+    spool: Spool | None = None,
+  ):
+    if backpressure == 'spill' and spill_dir is None:
+      raise ValueError("spill_dir is required for the spill backpressure policy")
     self.mqtt_client = mqtt_client
-    self.ts = ts
+    # One writer task per entry, with a pooled Postgres they can share one Timescale
+    self.writers = ts if isinstance(ts, list) else [ts]
     self.mqtt_client.client.on_message = self.on_mqtt_message
     self.batch_size = batch_size
     self.flush_interval = flush_interval
-    self.batch: List[PointReading] = []
-    self.batch_lock = Lock()
-    self.flush_timer = None
-    self.reset_flush_timer()
+    self.flush_bytes = flush_bytes
+    self.queue_size = queue_size
+    self.backpressure = backpressure
+    self.spill_path = os.path.join(spill_dir, "mqtt2timescale.spill") if spill_dir else None
+    self.router = router if router is not None else default_router()
+    self.spool = spool
+    self.unflushed: List[Tuple[str, PointReadingBatch]] = [] # Spooled batches that failed to flush
+    self.retry_lock = asyncio.Lock() # One writer at a time retries the unflushed batches
+    self.metrics = IngestMetrics()
+    self.queue: asyncio.Queue | None = None
+    self.loop: asyncio.AbstractEventLoop | None = None
+    self.tasks: List[asyncio.Task] = []
+    self.drainer: asyncio.Task | None = None
+    self.running = False
 
-  def start_message_listener(self, topic: str):
+  async def start(self, topic: str):
     """
-    Used to start listening to messages then store them in the database.
+    Used to start listening to messages and the writer tasks that store them in the database.
     """
+    self.loop = asyncio.get_running_loop()
+    self.running = True
+    if self.spool:
+      await self.replay_spool()
+    self.queue = asyncio.Queue(maxsize=self.queue_size)
+    self.tasks = [asyncio.create_task(self.writer(ts)) for ts in self.writers]
+    if self.spill_path:
+      self.drainer = asyncio.create_task(self.drain_spill())
     self.mqtt_client.connect()
     self.mqtt_client.subscribe(topic)
-    self.mqtt_client.loop_forever()
+    self.mqtt_client.loop_start()
 
-  def stop(self):
+  async def stop(self):
     """
-    Used to stop the message listener and flush the batch to the database.
+    Used to stop the message listener and flush every queued message to the database.
     """
-    if self.flush_timer:
-      self.flush_timer.cancel()
-    self.flush_batch()
-    self.mqtt_client.stop()
+    self.running = False # Releases a network thread blocked on a full queue, so loop_stop can join it
+    await asyncio.to_thread(self.mqtt_client.loop_stop)
+    await asyncio.to_thread(self.mqtt_client.disconnect)
+    if self.drainer:
+      await self.drainer
+      await self.requeue_spill()
+    for _ in self.tasks:
+      await self.queue.put(None)
+    await asyncio.gather(*self.tasks)
 
-  def reset_flush_timer(self):
+  def on_mqtt_message(self, client, userdata, message):
     """
-    Used to reset the flush timer.
+    Runs on the paho network thread. Hand the raw message to the event loop as quickly as possible. Under
+    the block policy the thread waits for room in the queue until the app stops, then the message is dropped.
     """
-    if self.flush_timer:
-      self.flush_timer.cancel()
-    self.flush_timer = Timer(self.flush_interval, self.flush_batch)
-    self.flush_timer.start()
+    item = (message.topic, message.payload)
+    if self.backpressure == 'block':
+      if not self.running:
+        self.metrics.dropped += 1
+        return
+      future = asyncio.run_coroutine_threadsafe(self.enqueue(item), self.loop)
+      while True:
+        try:
+          future.result(BLOCK_POLL_INTERVAL)
+          return
+        except concurrent.futures.TimeoutError:
+          if not self.running:
+            if future.cancel():
+              self.metrics.dropped += 1
+            return
+    else:
+      self.loop.call_soon_threadsafe(self.enqueue_nowait, item)
 
-  def flush_batch(self):
-    with self.batch_lock:
-      if self.batch:
-        # Insert the batch into the database
-        self.ts.insert_timeseries(self.batch)
-        print(f"Flushed {len(self.batch)} messages to the database.")
-        self.batch.clear()
-      self.reset_flush_timer()
+  async def enqueue(self, item: tuple):
+    self.metrics.received += 1
+    await self.queue.put(item)
+    self.metrics.observe_queue_depth(self.queue.qsize())
 
-  def on_mqtt_message(self, client, userdata, message):
+  def enqueue_nowait(self, item: tuple):
+    self.metrics.received += 1
+    if self.queue.full():
+      if self.backpressure == 'drop_oldest':
+        self.queue.get_nowait()
+        self.metrics.dropped += 1
+      else:
+        self.spill(item)
+        return
+    self.queue.put_nowait(item)
+    self.metrics.observe_queue_depth(self.queue.qsize())
+
+  def spill(self, item: tuple):
+    topic, payload = item
+    with open(self.spill_path, 'a') as f:
+      f.write(json.dumps({"topic": topic, "payload": base64.b64encode(payload).decode()}) + "\n")
+    self.metrics.spilled += 1
+
+  async def requeue_spill(self):
+    """
+    Move spilled messages back into the queue, waiting for room as needed.
+    """
+    if not os.path.exists(self.spill_path):
+      return
+    draining_path = self.spill_path + ".draining"
+    os.replace(self.spill_path, draining_path)
+    with open(draining_path) as f:
+      for line in f:
+        record = json.loads(line)
+        await self.queue.put((record["topic"], base64.b64decode(record["payload"])))
+    os.remove(draining_path)
+
+  async def drain_spill(self):
+    while self.running:
+      await asyncio.sleep(1)
+      if self.queue.qsize() < self.queue_size // 2:
+        await self.requeue_spill()
+
+  async def writer(self, ts: Timescale):
+    """
+    Pull messages off the queue and decode them into the writer's flush scheduler, which flushes them
+    by size, payload bytes or age. A None item tells the writer to flush what it has and exit.
+    """
+    scheduler = FlushScheduler(
+      flush=lambda batch: self.flush_batch(ts, batch),
+      batch_size=self.batch_size,
+      flush_interval=self.flush_interval,
+      flush_bytes=self.flush_bytes,
+    )
+    # One get() stays pending across age timeouts. Cancelling a get() on timeout, as wait_for does, can
+    # drop an item that was handed over in the same loop iteration on Python 3.10.
+    get = None
+    try:
+      while True:
+        if get is None:
+          get = asyncio.ensure_future(self.queue.get())
+        done, _ = await asyncio.wait({get}, timeout=scheduler.timeout())
+        if not done:
+          self.metrics.flush_triggers["age"] += 1
+          await scheduler.swap()
+          continue
+        item, get = get.result(), None
+
+        if item is None:
+          self.metrics.flush_triggers["stop"] += 1
+          await scheduler.drain()
+          return
+
+        self.metrics.observe_queue_depth(self.queue.qsize())
+        topic, payload = item
+        self.decode_message(topic, payload, scheduler.buffer)
+        scheduler.added(len(payload))
+        trigger = scheduler.trigger()
+        if trigger:
+          self.metrics.flush_triggers[trigger] += 1
+          await scheduler.swap()
+    finally:
+      if get is not None:
+        get.cancel()
+
+  async def flush_batch(self, ts: Timescale, batch: PointReadingBatch):
+    if len(batch) == 0:
+      return
+    segment = await asyncio.to_thread(self.spool.append, batch) if self.spool else None
+    start = time.perf_counter()
+    try:
+      # Insert the batch into the database without blocking the event loop
+      await asyncio.to_thread(ts.insert_batch, batch)
+      self.metrics.observe_flush(len(batch), time.perf_counter() - start)
+      print(f"Flushed {len(batch)} messages to the database.")
+    except Exception as e:
+      self.metrics.flush_errors += 1
+      print(f"Error flushing batch to the database: {e}")
+      if segment:
+        self.unflushed.append((segment, batch))
+      return
+
+    if segment:
+      await asyncio.to_thread(self.spool.commit, segment)
+    if self.unflushed:
+      await self.retry_unflushed(ts)
+
+  async def retry_unflushed(self, ts: Timescale):
+    """
+    Flush spooled batches that failed earlier. Dedup guards against a failure after the commit went through.
+    """
+    async with self.retry_lock:
+      while self.unflushed:
+        segment, batch = self.unflushed[0]
+        try:
+          await asyncio.to_thread(ts.insert_batch, batch, dedup=True)
+        except Exception as e:
+          print(f"Error retrying spooled batch {segment}: {e}")
+          return
+        self.unflushed.pop(0)
+        await asyncio.to_thread(self.spool.commit, segment)
+        print(f"Flushed {len(batch)} spooled messages to the database.")
+
+  async def replay_spool(self):
     """
-    Process the message and store it in the batch.
-    """
-    topic = message.topic
-    print(f"Received message on topic {topic}")
-    print(f"Message payload: {message.payload}")
-    # shelly iot plug pattern
-    shelly_plug_pattern = r"shellyplugus.*events/rpc"
-    shelly_status_switch_pattern = r"shellyplugus.*status/switch:0"
-
-    if re.match(shelly_plug_pattern, topic):
-      # Ensure safe decoding of the message payload from bytes to str, then load as JSON
-      try:
-        data = json.loads(message.payload.decode())
-        ts = datetime.fromtimestamp(data["params"]["ts"]).isoformat() # Extract the timestamp
-        
-        # Dynamically handle extraction of other parameters if needed
-        # Iterate through each key in "params" to find "switch:X" objects
-        for key, value in data["params"].items():
-          if key.startswith("switch"):
-            # Extract the "id" and iterate over each measurement key within the switch object
-            switch_id = value["id"]
-            for measurement_key in value:
-              if measurement_key in ["current", "voltage"]:
-                # Construct the timeseries ID
-                timeseriesId = f"{data['src']}-switch-{switch_id}-{measurement_key}"
-                measurement_value = value[measurement_key]
-                point_reading = PointReading(ts=ts, value=measurement_value, timeseriesid=timeseriesId)
-                with self.batch_lock:
-                  self.batch.append(point_reading)
-                  if len(self.batch) >= self.batch_size:
-                    self.flush_batch()
-      except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
-      except KeyError as e:
-        print(f"Missing expected key in data: {e}")
-    elif re.match(shelly_status_switch_pattern, topic):
-      print("Shelly switch status message received")
-      try:
-        data = json.loads(message.payload.decode())
-        # Extracting 'minute_ts' from 'aenergy' as timestamp
-        ts = data["aenergy"]["minute_ts"]
-        ts = datetime.fromtimestamp(ts).isoformat()
-        output = data["output"]
-        
-        # Construct the timeseries ID
-        timeseriesId = topic
-        point_reading = PointReading(ts=ts, value=output, timeseriesid=timeseriesId)
-        with self.batch_lock:
-          self.batch.append(point_reading)
-          if len(self.batch) >= self.batch_size:
-            self.flush_batch()
-      except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
-      except KeyError as e:
-        print(f"Missing expected key in data: {e}")
-
-mqtt_client = MQTTClient()
-postgres = Postgres()
-timescale = Timescale(postgres=postgres)
-
-app = MQTT2Timescale(mqtt_client=mqtt_client, ts=timescale)
-
-app.start_message_listener(topic="#")
-
-def on_exit():
-  app.stop()
-  mqtt_client.disconnect()
-
-atexit.register(on_exit)
\ No newline at end of file
+    Queue every batch left in the spool by a previous run and flush them before taking new messages.
+    """
+    self.unflushed.extend(await asyncio.to_thread(self.spool.pending))
+    if self.unflushed:
+      print(f"Replaying {len(self.unflushed)} spooled batches.")
+      await self.retry_unflushed(self.writers[0])
+
+  def decode_message(self, topic: str, payload: bytes, batch: PointReadingBatch) -> None:
+    """
+    Decode a message into the batch with the decoders registered for its topic.
+    """
+    size = len(batch)
+    try:
+      self.router.decode(topic, payload, batch)
+    except json.JSONDecodeError as e:
+      self.metrics.decode_errors += 1
+      print(f"Error decoding JSON: {e}")
+    except KeyError as e:
+      self.metrics.decode_errors += 1
+      print(f"Missing expected key in data: {e}")
+    except (TypeError, ValueError) as e:
+      self.metrics.decode_errors += 1
+      print(f"Invalid reading in message on topic {topic}: {e}")
+
+    self.metrics.decoded += len(batch) - size
+
+async def report_metrics(app: MQTT2Timescale, interval: float):
+  while True:
+    await asyncio.sleep(interval)
+    print(f"Ingest metrics: {app.metrics.snapshot()}")
+
+def shared_topic(topic: str, group: str) -> str:
+  """
+  MQTT v5 shared subscription, the broker spreads the matching messages across the members of the group.
+  """
+  return f"$share/{group}/{topic}"
+
+async def run_worker(worker_id: int | None = None):
+  """
+  Run one ingest process until SIGINT or SIGTERM. Workers started by the supervisor join a shared
+  subscription and keep their spill and spool files in their own directory. Workers do not migrate the
+  schema, main() does that once before starting them.
+  """
+  def worker_dir(path: str | None) -> str | None:
+    if path is None or worker_id is None:
+      return path
+    return os.path.join(path, f"worker-{worker_id}")
+
+  writers = int(os.getenv('MQTT2TIMESCALE_WRITERS', '1'))
+  topic = os.getenv('MQTT2TIMESCALE_TOPIC', '#')
+  if worker_id is not None:
+    topic = shared_topic(topic, os.getenv('MQTT2TIMESCALE_GROUP', 'mqtt2timescale'))
+  mqtt_client = MQTTClient(port=int(os.getenv('MQTT_BROKER_PORT', '8883')), tls=os.getenv('MQTT_TLS', 'true') != 'false')
+  timescale = Timescale(postgres=Postgres(min_size=writers, max_size=writers), migrate=False)
+  spill_dir = worker_dir(os.getenv('MQTT2TIMESCALE_SPILL_DIR'))
+  if spill_dir:
+    os.makedirs(spill_dir, exist_ok=True)
+  spool_dir = worker_dir(os.getenv('MQTT2TIMESCALE_SPOOL_DIR'))
+
+  app = MQTT2Timescale(
+    mqtt_client=mqtt_client,
+    ts=[timescale] * writers,
+    batch_size=int(os.getenv('MQTT2TIMESCALE_BATCH_SIZE', '100')),
+    flush_interval=float(os.getenv('MQTT2TIMESCALE_FLUSH_INTERVAL', '30')),
+    flush_bytes=int(os.environ['MQTT2TIMESCALE_FLUSH_BYTES']) if os.getenv('MQTT2TIMESCALE_FLUSH_BYTES') else None,
+    queue_size=int(os.getenv('MQTT2TIMESCALE_QUEUE_SIZE', '10000')),
+    backpressure=os.getenv('MQTT2TIMESCALE_BACKPRESSURE', 'block'),
+    spill_dir=spill_dir,
+    spool=Spool(spool_dir) if spool_dir else None,
+  )
+
+  stop_event = asyncio.Event()
+  loop = asyncio.get_running_loop()
+  for sig in (signal.SIGINT, signal.SIGTERM):
+    loop.add_signal_handler(sig, stop_event.set)
+
+  await app.start(topic=topic)
+  reporter = asyncio.create_task(report_metrics(app, interval=60))
+  await stop_event.wait()
+  reporter.cancel()
+  await app.stop()
+
+def worker_process(worker_id: int):
+  asyncio.run(run_worker(worker_id))
+
+def main():
+  from dotenv import load_dotenv
+  load_dotenv()
+
+  # Set up the schema, rollups and policies once, before any worker starts writing
+  postgres = Postgres(min_size=1, max_size=1)
+  try:
+    Timescale(postgres=postgres)
+  finally:
+    postgres.close()
+
+  processes = int(os.getenv('MQTT2TIMESCALE_PROCESSES', '1'))
+  if processes > 1:
+    Supervisor(target=worker_process, processes=processes).run()
+  else:
+    asyncio.run(run_worker())
+
+if __name__ == "__main__":
+  main()
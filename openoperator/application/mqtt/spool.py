@@ -0,0 +1,83 @@
+from openoperator.domain.model import PointReadingBatch
+from typing import List, Tuple
+from threading import Lock
+from array import array
+import itertools
+import numpy as np
+import os
+import time
+
+class Spool:
+  """
+  Append-only write-ahead spool for ingest batches.
+
+  Every batch is written to its own segment file before it is flushed to the database and the segment is
+  removed once the database write commits. Segments are written to a temporary file, fsync'd and renamed
+  into place, so a crash leaves either a complete segment or none. Whatever is left in the directory on
+  startup is a batch that may not have reached the database and is replayed.
+  """
+  suffix = '.seg'
+
+  def __init__(self, directory: str, fsync: bool = True):
+    self.directory = directory
+    self.fsync = fsync
+    self.counter = itertools.count()
+    self.lock = Lock()
+    os.makedirs(directory, exist_ok=True)
+
+  def append(self, batch: PointReadingBatch) -> str:
+    """
+    Durably write a batch and return the segment name used to commit it.
+    """
+    with self.lock:
+      segment = f"{time.time_ns():020d}-{next(self.counter):06d}{self.suffix}"
+    path = os.path.join(self.directory, segment)
+    tmp_path = path + '.tmp'
+    ts, values, codes = batch.columns()
+    with open(tmp_path, 'wb') as f:
+      np.savez(f, ts=ts, values=values, codes=codes, ids=np.array(batch.ids, dtype=str))
+      if self.fsync:
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if self.fsync:
+      self.sync_directory()
+    return segment
+
+  def commit(self, segment: str) -> None:
+    """
+    Drop a segment once its batch is safely in the database.
+    """
+    os.remove(os.path.join(self.directory, segment))
+
+  def pending(self) -> List[Tuple[str, PointReadingBatch]]:
+    """
+    Segments that have not been committed, oldest first.
+    """
+    segments = []
+    for segment in sorted(os.listdir(self.directory)):
+      path = os.path.join(self.directory, segment)
+      if segment.endswith(self.suffix + '.tmp'):
+        os.remove(path) # Incomplete write, the batch never left the process
+        continue
+      if not segment.endswith(self.suffix):
+        continue
+      segments.append((segment, self.read(path)))
+    return segments
+
+  def read(self, path: str) -> PointReadingBatch:
+    with np.load(path) as data:
+      batch = PointReadingBatch()
+      batch.ts = array('d', data['ts'].tobytes())
+      batch.values = array('d', data['values'].tobytes())
+      batch.codes = array('I', data['codes'].tobytes())
+      batch.ids = data['ids'].tolist()
+      batch.index = {timeseriesid: code for code, timeseriesid in enumerate(batch.ids)}
+    return batch
+
+  def sync_directory(self) -> None:
+    fd = os.open(self.directory, os.O_RDONLY)
+    try:
+      os.fsync(fd)
+    finally:
+      os.close(fd)
@@ -0,0 +1,65 @@
+from typing import Callable, Dict
+import multiprocessing
+import signal
+import time
+
+class Supervisor:
+  """
+  Runs a worker function in several processes and keeps them running.
+
+  A worker that exits on its own is restarted after restart_delay seconds. On stop every worker gets a
+  SIGTERM so it can flush before exiting, and is killed only if it does not exit within the timeout.
+  """
+  def __init__(self, target: Callable[[int], None], processes: int, restart_delay: float = 1):
+    self.target = target
+    self.processes = processes
+    self.restart_delay = restart_delay
+    self.workers: Dict[int, multiprocessing.Process] = {}
+    self.stopping = False
+
+  def spawn(self, worker_id: int) -> None:
+    process = multiprocessing.Process(target=self.target, args=(worker_id,), name=f"worker-{worker_id}")
+    process.start()
+    self.workers[worker_id] = process
+
+  def start(self) -> None:
+    for worker_id in range(self.processes):
+      self.spawn(worker_id)
+
+  def check(self) -> None:
+    """
+    Restart workers that died.
+    """
+    for worker_id, process in list(self.workers.items()):
+      if not process.is_alive() and not self.stopping:
+        print(f"Worker {worker_id} exited with code {process.exitcode}, restarting.")
+        time.sleep(self.restart_delay)
+        self.spawn(worker_id)
+
+  def stop(self, timeout: float = 60) -> None:
+    self.stopping = True
+    for process in self.workers.values():
+      if process.is_alive():
+        process.terminate() # SIGTERM, the worker flushes its batches and exits
+    deadline = time.monotonic() + timeout
+    for worker_id, process in self.workers.items():
+      process.join(max(deadline - time.monotonic(), 0))
+      if process.is_alive():
+        print(f"Worker {worker_id} did not stop in time, killing it.")
+        process.kill()
+        process.join()
+
+  def run(self) -> None:
+    """
+    Start the workers and supervise them until SIGINT or SIGTERM.
+    """
+    def on_signal(signum, frame):
+      self.stopping = True
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    self.start()
+    while not self.stopping:
+      self.check()
+      time.sleep(1)
+    self.stop()
@@ -0,0 +1,98 @@
+from openoperator.domain.model import PointReadingBatch
+from typing import Callable, Dict, List
+
+Decoder = Callable[[str, bytes, PointReadingBatch], None] # Appends the readings in a payload to the batch
+
+class _Node:
+  __slots__ = ('children', 'decoders', 'multi_level')
+
+  def __init__(self):
+    self.children: Dict[str, '_Node'] = {}
+    self.decoders: List[Decoder] = [] # Decoders whose filter ends at this level
+    self.multi_level: List[Decoder] = [] # Decoders registered with a trailing '#' at this level
+
+class TopicRouter:
+  """
+  Registry of payload decoders keyed by MQTT topic filter.
+
+  Filters are stored in a trie with one level per topic segment, so dispatch walks the levels of the
+  incoming topic instead of testing every registered filter. '+' matches a single level and a trailing '#'
+  matches any number of levels, including none. As in the MQTT spec, wildcards at the first level do
+  not match topics starting with '$'. Matches are cached per topic since devices publish on the same
+  topics over and over.
+  """
+  def __init__(self, cache_size: int = 10000):
+    self.root = _Node()
+    self.filters: List[str] = []
+    self.cache_size = cache_size
+    self.cache: Dict[str, List[Decoder]] = {}
+
+  def register(self, topic_filter: str, decoder: Decoder) -> None:
+    levels = topic_filter.split('/')
+    for i, level in enumerate(levels):
+      if level == '#' and i != len(levels) - 1:
+        raise ValueError(f"'#' must be the last level of a topic filter: {topic_filter}")
+      if level not in ('+', '#') and ('+' in level or '#' in level):
+        raise ValueError(f"Wildcards must occupy an entire level of a topic filter: {topic_filter}")
+
+    node = self.root
+    for level in levels:
+      if level == '#':
+        node.multi_level.append(decoder)
+        break
+      node = node.children.setdefault(level, _Node())
+    else:
+      node.decoders.append(decoder)
+    self.filters.append(topic_filter)
+    self.cache.clear()
+
+  def route(self, topic_filter: str) -> Callable[[Decoder], Decoder]:
+    """
+    Decorator form of register.
+    """
+    def wrapper(decoder: Decoder) -> Decoder:
+      self.register(topic_filter, decoder)
+      return decoder
+    return wrapper
+
+  def match(self, topic: str) -> List[Decoder]:
+    decoders = self.cache.get(topic)
+    if decoders is not None:
+      return decoders
+
+    levels = topic.split('/')
+    decoders = []
+    nodes = [self.root]
+    for depth, level in enumerate(levels):
+      wildcards = not (depth == 0 and level.startswith('$'))
+      next_nodes = []
+      for node in nodes:
+        if wildcards:
+          decoders.extend(node.multi_level)
+        child = node.children.get(level)
+        if child is not None:
+          next_nodes.append(child)
+        if wildcards:
+          child = node.children.get('+')
+          if child is not None:
+            next_nodes.append(child)
+      nodes = next_nodes
+      if not nodes:
+        break
+    for node in nodes:
+      # 'a/#' also matches 'a'
+      decoders.extend(node.decoders)
+      decoders.extend(node.multi_level)
+
+    if self.cache_size:
+      if len(self.cache) >= self.cache_size:
+        self.cache.clear()
+      self.cache[topic] = decoders
+    return decoders
+
+  def decode(self, topic: str, payload: bytes, batch: PointReadingBatch) -> None:
+    """
+    Run every decoder registered for the topic, appending their point readings to the batch.
+    """
+    for decoder in self.match(topic):
+      decoder(topic, payload, batch)
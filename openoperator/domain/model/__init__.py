@@ -5,6 +5,6 @@ from .document import Document, DocumentMetadataChunk, DocumentQuery, DocumentMe
 from .tool import Tool, ToolParametersSchema
 from .cobie_spreadsheet import COBieSpreadsheet
 from .device import Device, DeviceCreateParams
-from .point import Point, PointReading, PointUpdates, PointCreateParams
+from .point import Point, PointReading, PointReadingBatch, PointUpdates, PointCreateParams
 from .brick_class import BrickClass
 from .chat_session import ChatSession, Message, LLMChatResponse
\ No newline at end of file
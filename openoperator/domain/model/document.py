@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, Literal
 from typing_extensions import TypedDict
 
@@ -8,6 +8,15 @@ class DocumentQuery(BaseModel):
   limit: int = 25
   facility_uri: Optional[str] = None
   document_uri: Optional[str] = None
+  ranking: Literal['hybrid', 'vector', 'lexical'] = 'hybrid'
+  vector_weight: float = Field(1.0, ge=0) # Weights of the two rankings in hybrid ranking, 0 leaves one out
+  lexical_weight: float = Field(1.0, ge=0)
+
+  @model_validator(mode='after')
+  def check_weights(self) -> 'DocumentQuery':
+    if self.ranking == 'hybrid' and self.vector_weight == 0 and self.lexical_weight == 0:
+      raise ValueError("Hybrid ranking needs a positive vector_weight or lexical_weight")
+    return self
 
 class DocumentMetadata(TypedDict, total=False):
   portfolio_uri: str
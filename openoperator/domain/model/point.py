@@ -1,6 +1,9 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict, Sequence, Tuple
 from typing_extensions import TypedDict 
+from array import array
+from datetime import datetime, timezone
+import numpy as np
 from .brick_class import BrickClass
 
 class PointReading(BaseModel): # TODO update point to use point reading
@@ -8,6 +11,109 @@ class PointReading(BaseModel): # TODO update point to use point reading
   value: float
   timeseriesid: str
 
+class PointReadingBatch:
+  """
+  Columnar batch of point readings for the ingest path.
+
+  Timestamps are epoch seconds and values are stored in float64 arrays, timeseries ids are dictionary
+  encoded so each distinct id is stored once and every reading only holds its integer code.
+  PointReading is only needed at the API boundary, see from_readings and to_readings.
+  """
+  def __init__(self):
+    self.ts = array('d')
+    self.values = array('d')
+    self.codes = array('I')
+    self.ids: List[str] = []
+    self.index: Dict[str, int] = {}
+
+  def __len__(self) -> int:
+    return len(self.ts)
+
+  def code(self, timeseriesid: str) -> int:
+    code = self.index.get(timeseriesid)
+    if code is None:
+      code = self.index[timeseriesid] = len(self.ids)
+      self.ids.append(timeseriesid)
+    return code
+
+  def append(self, ts: float | str, value: float, timeseriesid: str) -> None:
+    ts, value = to_epoch(ts), float(value) # Convert before appending so a bad value cannot misalign the columns
+    self.ts.append(ts)
+    self.values.append(value)
+    self.codes.append(self.code(timeseriesid))
+
+  def columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Zero copy numpy views of the ts, value and id code columns.
+    """
+    return (
+      np.frombuffer(self.ts, dtype=np.float64),
+      np.frombuffer(self.values, dtype=np.float64),
+      np.frombuffer(self.codes, dtype=np.uint32),
+    )
+
+  def latest(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    The newest reading of every timeseries in the batch as (timeseriesids, ts, values).
+    """
+    ts, values, codes = self.columns()
+    if len(ts) == 0:
+      return [], ts, values
+    order = np.lexsort((ts, codes)) # By id, then time
+    newest = order[np.append(codes[order][1:] != codes[order][:-1], True)]
+    return [self.ids[code] for code in codes[newest]], ts[newest], values[newest]
+
+  @classmethod
+  def from_columns(cls, ts: Sequence, values: Sequence[float], timeseriesids: Sequence[str]) -> 'PointReadingBatch':
+    """
+    Build a batch from column arrays. Timestamps may be epoch seconds, datetimes or ISO-8601 strings,
+    naive ones are treated as UTC.
+    """
+    if not (len(ts) == len(values) == len(timeseriesids)):
+      raise ValueError("ts, values and timeseriesids must have the same length")
+    batch = cls()
+    batch.ts = array('d', map(to_epoch, ts))
+    batch.values = array('d', values)
+    batch.codes = array('I', map(batch.code, timeseriesids))
+    return batch
+
+  @classmethod
+  def from_readings(cls, readings: List[PointReading]) -> 'PointReadingBatch':
+    return cls.from_columns([r.ts for r in readings], [r.value for r in readings], [r.timeseriesid for r in readings])
+
+  def to_readings(self) -> List[PointReading]:
+    return [
+      PointReading(ts=datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(), value=value, timeseriesid=self.ids[code])
+      for ts, value, code in zip(self.ts, self.values, self.codes)
+    ]
+
+def parse_timestamp(ts: str) -> datetime:
+  """
+  Parse an ISO-8601 timestamp, including a Z suffix which datetime.fromisoformat only accepts from Python
+  3.11. Naive timestamps are taken as UTC.
+  """
+  text = ts.strip()
+  if text[-1:] in ('Z', 'z'):
+    text = text[:-1] + '+00:00'
+  try:
+    parsed = datetime.fromisoformat(text)
+  except ValueError:
+    raise ValueError(f"Invalid timestamp {ts!r}, expected ISO-8601") from None
+  return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+def to_epoch(ts) -> float:
+  """
+  Epoch seconds of a number, a numeric string, a datetime or an ISO-8601 string. Naive values are UTC.
+  """
+  if isinstance(ts, str):
+    try:
+      return float(ts)
+    except ValueError:
+      ts = parse_timestamp(ts)
+  if isinstance(ts, datetime):
+    return (ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)).timestamp()
+  return float(ts)
+
 class Point(BaseModel):
   uri: str
   timeseriesId: str
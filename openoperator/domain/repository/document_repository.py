@@ -104,7 +104,8 @@ class DocumentRepository:
     
   def search(self, params: DocumentQuery) -> List[DocumentMetadataChunk]:
     """
-    Search vector store for documents in the facility
+    Search vector store for documents in the facility, ranked by params.ranking:
+    vector similarity, full text match, or both fused (hybrid).
     """
     query = params.query
     limit = params.limit
@@ -113,4 +114,8 @@ class DocumentRepository:
       query_filter = {"facility_uri": params.facility_uri}
     if params.document_uri:
       query_filter['document_uri'] = params.document_uri
-    return self.vector_store.similarity_search(query=query, limit=limit, filter=query_filter)
\ No newline at end of file
+    if params.ranking == 'vector':
+      return self.vector_store.similarity_search(query=query, limit=limit, filter=query_filter)
+    if params.ranking == 'lexical':
+      return self.vector_store.hybrid_search(query=query, limit=limit, filter=query_filter, vector_weight=0, lexical_weight=1)
+    return self.vector_store.hybrid_search(query=query, limit=limit, filter=query_filter, vector_weight=params.vector_weight, lexical_weight=params.lexical_weight)
\ No newline at end of file
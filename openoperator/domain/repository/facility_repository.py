@@ -5,25 +5,25 @@ class FacilityRepository:
   def __init__(self, kg: KnowledgeGraph):
     self.kg = kg
   
-  def get_facility(self, facility_uri: str) -> Facility:
-    with self.kg.create_session() as session:
-      result = session.run("MATCH (f:Facility {uri: $uri}) RETURN f", uri=facility_uri)
-      record = result.single()
+  async def get_facility(self, facility_uri: str) -> Facility:
+    async with self.kg.create_async_session() as session:
+      result = await session.run("MATCH (f:Facility {uri: $uri}) RETURN f", uri=facility_uri)
+      record = await result.single()
       if record is None:
         raise ValueError(f"Facility {facility_uri} not found")
       facility_record = record['f']
       return Facility(**facility_record)
     
-  def list_facilities_for_portfolio(self, portfolio_uri: str) -> list[Facility]:
-    with self.kg.create_session() as session:
-      result = session.run("MATCH (c:Customer {uri: $uri})-[:HAS_FACILITY]->(f:Facility) RETURN f", uri=portfolio_uri)
-      data = result.data()
+  async def list_facilities_for_portfolio(self, portfolio_uri: str) -> list[Facility]:
+    async with self.kg.create_async_session() as session:
+      result = await session.run("MATCH (c:Customer {uri: $uri})-[:HAS_FACILITY]->(f:Facility) RETURN f", uri=portfolio_uri)
+      data = await result.data()
       return [Facility(**f['f']) for f in data]
     
-  def create_facility(self, facility: Facility, portfolio_uri: str) -> Facility:
-    with self.kg.create_session() as session:
-      result = session.run("MATCH (c:Customer {uri: $portfolio_uri}) CREATE (f:Facility {name: $name, uri: $uri}) CREATE (c)-[:HAS_FACILITY]->(f) RETURN f", name=facility.name, uri=facility.uri, portfolio_uri=portfolio_uri)
-      record = result.single()
+  async def create_facility(self, facility: Facility, portfolio_uri: str) -> Facility:
+    async with self.kg.create_async_session() as session:
+      result = await session.run("MATCH (c:Customer {uri: $portfolio_uri}) CREATE (f:Facility {name: $name, uri: $uri}) CREATE (c)-[:HAS_FACILITY]->(f) RETURN f", name=facility.name, uri=facility.uri, portfolio_uri=portfolio_uri)
+      record = await result.single()
       if record is None:
         raise ValueError(f"Error creating facility {facility.uri}")
       return Facility(**record['f'])
\ No newline at end of file
@@ -1,11 +1,14 @@
-from openoperator.infrastructure import KnowledgeGraph, Timescale
+from openoperator.infrastructure import KnowledgeGraph, Timescale, LatestValueCache
 from openoperator.domain.model import Point, PointUpdates, BrickClass, Device
 from collections import OrderedDict
+from typing import Dict, Iterator, Literal, Tuple
+import numpy as np
 
 class PointRepository:
-  def __init__(self, kg: KnowledgeGraph, ts: Timescale):
+  def __init__(self, kg: KnowledgeGraph, ts: Timescale, latest_values: LatestValueCache | None = None):
     self.kg = kg
     self.ts = ts
+    self.latest_values = latest_values or ts # Without a cache every lookup goes to Timescale
 
   def get_points(self, facility_uri: str, component_uri: str | None = None, device_uri: str | None = None, collect_enabled: bool = None) -> list[Point]:
     query = "MATCH (p:Point"
@@ -31,7 +34,7 @@ class PointRepository:
 
       ids = [point.timeseriesId for point in points]
       if len(ids) > 0:
-        readings = self.ts.get_latest_values(ids)
+        readings = self.latest_values.get_latest_values(ids)
         readings_dict = OrderedDict((reading.timeseriesid, {"value": reading.value, "ts": reading.ts}) for reading in readings)
 
         for point in points:
@@ -42,6 +45,18 @@ class PointRepository:
     except Exception as e:
       raise e
     
+  def get_mqtt_topics(self, point_uris: list[str]) -> Dict[str, str]:
+    """
+    The mqtt topic of every point that has one, by point uri.
+    """
+    query = "MATCH (p:Point) WHERE p.uri in $point_uris AND p.mqtt_topic IS NOT NULL RETURN p.uri as uri, p.mqtt_topic as mqtt_topic"
+    try:
+      with self.kg.create_session() as session:
+        result = session.run(query, point_uris=point_uris)
+        return {record['uri']: record['mqtt_topic'] for record in result.data()}
+    except Exception as e:
+      raise e
+
   def get_point(self, point_uri: str) -> Point:
     query = """MATCH (p:Point {uri: $point_uri})
               OPTIONAL MATCH (p)-[:hasBrickClass]->(b:Class:Resource)
@@ -109,7 +124,14 @@ class PointRepository:
     except Exception as e:
       raise e
 
-  def points_history(self, start_time: str, end_time: str, point_uris: list[str]):
+  def points_history(self, start_time: str, end_time: str, point_uris: list[str], resolution: str | None = None, max_points: int | None = None, downsample: Literal['bucket', 'lttb'] = 'bucket', columnar: bool = False):
+    """
+    Readings for the points grouped by unit. Without a resolution or max_points every raw reading is returned,
+    as ts and value lists when columnar is set, otherwise the series are reduced in the database to time
+    buckets or picked with LTTB.
+    """
+    if downsample == 'lttb' and not max_points:
+      raise ValueError("LTTB downsampling requires max_points")
     query = "MATCH (p:Point) WHERE p.uri in $point_uris RETURN p"
     try:
       with self.kg.create_session() as session:
@@ -122,7 +144,12 @@ class PointRepository:
         point.pop('embedding', None)
         ids.append(point['timeseriesId'])
 
-      data = self.ts.get_timeseries(ids, start_time, end_time)
+      if resolution is None and max_points is None:
+        data = self.ts.get_timeseries(ids, start_time, end_time, columnar=columnar)
+      elif downsample == 'lttb':
+        data = self.ts.get_timeseries_lttb(ids, start_time, end_time, max_points=max_points)
+      else:
+        data = self.ts.get_timeseries_buckets(ids, start_time, end_time, bucket=resolution, max_points=max_points)
       data_dict = {item['timeseriesid']: item['data'] for item in data}
 
       for point in points:
@@ -141,4 +168,18 @@ class PointRepository:
     # Convert the dictionary to a list of groups
     grouped_points_list = [{'object_unit': k, 'points': v} for k, v in grouped_points.items()]
 
-    return grouped_points_list
\ No newline at end of file
+    return grouped_points_list
+
+  def stream_points_history(self, start_time: str, end_time: str, point_uris: list[str], itersize: int = 50_000) -> Tuple[Dict[str, str], Iterator[np.ndarray]]:
+    """
+    Map each requested point's timeseriesId to its uri and stream its raw readings in chunks of up to
+    itersize rows, ordered by timeseriesId and ts. Nothing is read from Timescale until the iterator is used.
+    """
+    query = "MATCH (p:Point) WHERE p.uri in $point_uris RETURN p.uri as uri, p.timeseriesId as timeseriesId"
+    try:
+      with self.kg.create_session() as session:
+        result = session.run(query, point_uris=point_uris)
+        uris = {record['timeseriesId']: record['uri'] for record in result.data()}
+    except Exception as e:
+      raise e
+    return uris, self.ts.stream_timeseries(list(uris), start_time, end_time, itersize=itersize)
@@ -1,17 +1,15 @@
 from openoperator.domain.model import Point, PointUpdates, PointCreateParams
 from openoperator.domain.repository import PointRepository, DeviceRepository
-from openoperator.infrastructure import MQTTClient
-from typing import List
-import time
+from openoperator.infrastructure import MQTTSession
+from typing import Dict, List, Literal
 from uuid import uuid4
-import threading
 import json
 
 class PointService:
-  def __init__(self, point_repository: PointRepository, device_repository: DeviceRepository, mqtt_client: MQTTClient):
+  def __init__(self, point_repository: PointRepository, device_repository: DeviceRepository, mqtt_session: MQTTSession):
     self.point_repository = point_repository
     self.device_repository = device_repository
-    self.mqtt_client = mqtt_client
+    self.mqtt_session = mqtt_session
 
   def get_points(self, facility_uri: str, collect_enabled: bool = None, component_uri: str | None = None) -> list[Point]:
     return self.point_repository.get_points(facility_uri=facility_uri, collect_enabled=collect_enabled, component_uri=component_uri)
@@ -28,50 +26,36 @@ class PointService:
   def update_point(self, point_uri: str, updates: PointUpdates, new_brick_class_uri: str | None = None):
     self.point_repository.update_point(point_uri=point_uri, updates=updates, new_brick_class_uri=new_brick_class_uri)
 
-  def get_points_history(self, point_uris: List[str], start_time: str, end_time: str):
-    return self.point_repository.points_history(start_time=start_time, end_time=end_time, point_uris=point_uris)
+  def get_points_history(self, point_uris: List[str], start_time: str, end_time: str, resolution: str | None = None, max_points: int | None = None, downsample: Literal['bucket', 'lttb'] = 'bucket', columnar: bool = False):
+    return self.point_repository.points_history(start_time=start_time, end_time=end_time, point_uris=point_uris, resolution=resolution, max_points=max_points, downsample=downsample, columnar=columnar)
   
-  def get_live_reading(self, point_uri: str):
+  def stream_points_history(self, point_uris: List[str], start_time: str, end_time: str, itersize: int = 50_000):
+    return self.point_repository.stream_points_history(start_time=start_time, end_time=end_time, point_uris=point_uris, itersize=itersize)
+  
+  def get_live_reading(self, point_uri: str, timeout: float = 10):
     """
-    Connects to the mqtt broker and listens to the topic of the point.
+    Wait for the next message on the point's mqtt topic. Raises TimeoutError if none arrives in time.
     """
     try:
       point = self.point_repository.get_point(point_uri)
       if point.mqtt_topic:
-        received_event = threading.Event()
-        value = None
-
-        def on_message(client, userdata, message):
-          nonlocal value
-          message_payload = message.payload.decode()
-          value = json.loads(message_payload)
-          value = value["output"]
-          received_event.set()
-
-        self.mqtt_client.client.on_message = on_message
-        try:
-          self.mqtt_client.connect()
-          self.mqtt_client.loop_start()
-          self.mqtt_client.subscribe(point.mqtt_topic)
-          received_event.wait()  # Wait until a message is received
-        finally:
-          self.mqtt_client.loop_stop()
-          self.mqtt_client.disconnect()
-        return value
+        payload = self.mqtt_session.read(point.mqtt_topic, timeout=timeout)
+        return json.loads(payload.decode())["output"]
     except Exception as e:
       raise e
     
-  def command_point(self, point_uri: str, command: str):
+  def get_mqtt_topics(self, point_uris: List[str]) -> Dict[str, str]:
+    return self.point_repository.get_mqtt_topics(point_uris)
+
+  def command_point(self, point_uri: str, command: str, timeout: float = 10):
+    """
+    Publish a command to the point's mqtt topic and wait until the broker acknowledges it.
+    """
     point = self.point_repository.get_point(point_uri)
     # Check if its a command point and has mqtt topic
     is_command_point = self.is_command_point(point)
-    if is_command_point:
-      self.mqtt_client.connect()
-      self.mqtt_client.loop_start()
-      self.mqtt_client.publish(point.mqtt_topic, command)
-      time.sleep(2) # Wait for the message to be sent
-      self.mqtt_client.loop_stop()
-      self.mqtt_client.disconnect()
+    if is_command_point and point.mqtt_topic:
+      self.mqtt_session.publish(point.mqtt_topic, command, timeout=timeout)
     else:
       raise ValueError("Point is not a command point or does not have mqtt topic")
 
@@ -7,13 +7,13 @@ class PortfolioService:
     self.portfolio_repository = portfolio_repository
     self.base_uri = base_uri
 
-  def get_portfolio(self, portfolio_uri: str) -> Portfolio:
-    return self.portfolio_repository.get_portfolio(portfolio_uri)
+  async def get_portfolio(self, portfolio_uri: str) -> Portfolio:
+    return await self.portfolio_repository.get_portfolio(portfolio_uri)
   
-  def create_portfolio(self, name: str, user_email: str) -> Portfolio:
+  async def create_portfolio(self, name: str, user_email: str) -> Portfolio:
     portfolio_uri = f"{self.base_uri}/{create_uri(name)}"
-    portfolio = Portfolio(uri=portfolio_uri, name=name, email=user_email)
-    return self.portfolio_repository.create_portfolio(portfolio)
+    portfolio = Portfolio(uri=portfolio_uri, name=name)
+    return await self.portfolio_repository.create_portfolio(portfolio, user_email)
   
-  def list_portfolios_for_user(self, email: str) -> list[Portfolio]:
-    return self.portfolio_repository.list_portfolios_for_user(email)
\ No newline at end of file
+  async def list_portfolios_for_user(self, email: str) -> list[Portfolio]:
+    return await self.portfolio_repository.list_portfolios_for_user(email)
\ No newline at end of file
@@ -1,24 +1,103 @@
 from openoperator.domain.repository import UserRepository
 from openoperator.domain.model import User
+from openoperator.utils import run_blocking
+from collections import OrderedDict
+from typing import Optional, Tuple
+import time
 import bcrypt
 
+class UserCache:
+  """
+  Users by email with the least recently used dropped first once capacity is reached. Entries expire after
+  ttl seconds, emails without a user are remembered for negative_ttl seconds so unknown tokens do not reach
+  the database either. Expiry bounds how stale another API process can be, changes made through this
+  process invalidate the entry right away.
+  """
+  def __init__(self, capacity: int = 10_000, ttl: float = 300, negative_ttl: float = 30):
+    self.capacity = capacity
+    self.ttl = ttl
+    self.negative_ttl = negative_ttl
+    self.entries: OrderedDict[str, Tuple[float, Optional[User]]] = OrderedDict() # email -> (expires, user or None)
+    self.hits = 0
+    self.negative_hits = 0
+    self.misses = 0
+
+  def get(self, email: str) -> Tuple[bool, Optional[User]]:
+    """
+    (True, user) on a hit, where user is None for an email known to have no user, (False, None) on a miss.
+    """
+    entry = self.entries.get(email)
+    if entry is None or entry[0] <= time.monotonic():
+      self.misses += 1
+      return False, None
+    self.entries.move_to_end(email)
+    if entry[1] is None:
+      self.negative_hits += 1
+    else:
+      self.hits += 1
+    return True, entry[1]
+
+  def put(self, email: str, user: Optional[User]) -> None:
+    self.entries[email] = (time.monotonic() + (self.ttl if user is not None else self.negative_ttl), user)
+    self.entries.move_to_end(email)
+    while len(self.entries) > self.capacity:
+      self.entries.popitem(last=False)
+
+  def invalidate(self, email: str | None = None) -> None:
+    """
+    Forget one email, or every entry when no email is given.
+    """
+    if email is None:
+      self.entries.clear()
+    else:
+      self.entries.pop(email, None)
+
+  def stats(self) -> dict:
+    lookups = self.hits + self.negative_hits + self.misses
+    return {
+      "entries": len(self.entries),
+      "hits": self.hits,
+      "negative_hits": self.negative_hits,
+      "misses": self.misses,
+      "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+    }
+
 class UserService:
-  def __init__(self, user_repository: UserRepository):
+  def __init__(self, user_repository: UserRepository, cache: UserCache | None = None):
     self.user_repository = user_repository
+    self.cache = cache or UserCache()
 
-  def create_user(self, email: str, full_name: str, password: str) -> None:
-    hashed_password = self.hash_password(password)
+  async def create_user(self, email: str, full_name: str, password: str) -> None:
+    hashed_password = await run_blocking(self.hash_password, password) # bcrypt is deliberately slow, keep it off the event loop
     user = User(email=email, full_name=full_name, hashed_password=hashed_password)
-    self.user_repository.create_user(user=user)
+    try:
+      await self.user_repository.create_user(user=user)
+    finally:
+      self.cache.invalidate(email) # Drops a cached "no such user" too
 
-  def verify_user_password(self, email: str, password: str) -> bool:
-    user = self.user_repository.get_user(email)
+  async def verify_user_password(self, email: str, password: str) -> bool:
+    user = await self.user_repository.get_user(email) # Logins always check the stored hash
+    self.cache.put(email, user)
     if user is None:
       return False
-    return bcrypt.checkpw(password.encode('utf-8'), user.hashed_password.encode('utf-8'))
+    return await run_blocking(bcrypt.checkpw, password.encode('utf-8'), user.hashed_password.encode('utf-8'))
+
+  async def get_user(self, email: str):
+    """
+    The user for an authenticated request, from the cache when possible.
+    """
+    hit, user = self.cache.get(email)
+    if hit:
+      return user
+    user = await self.user_repository.get_user(email)
+    self.cache.put(email, user)
+    return user
+
+  def invalidate_user(self, email: str | None = None) -> None:
+    self.cache.invalidate(email)
 
-  def get_user(self, email: str):
-    return self.user_repository.get_user(email)
+  def stats(self) -> dict:
+    return self.cache.stats()
 
   @staticmethod
   def hash_password(password: str) -> str:
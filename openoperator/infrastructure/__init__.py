@@ -1,10 +1,13 @@
 from .knowledge_graph import KnowledgeGraph
 from .blob_store import BlobStore, AzureBlobStore
 from .document_loader import DocumentLoader, UnstructuredDocumentLoader
-from .postgres import Postgres
-from .timescale import Timescale
+from .postgres import Postgres, AsyncPostgres
+from .copy_binary import IngestStats
+from .timescale import Timescale, Rollup
+from .latest_values import LatestValueCache
 from .vector_store import VectorStore, PGVectorStore
-from .embeddings import Embeddings, OpenAIEmbeddings
+from .embeddings import Embeddings, OpenAIEmbeddings, CachedEmbeddings
 from .llm import LLM, OpenaiLLM 
 from .audio import Audio, OpenaiAudio
-from .mqtt_client import MQTTClient
\ No newline at end of file
+from .mqtt_client import MQTTClient
+from .mqtt_session import MQTTSession, Subscription
\ No newline at end of file
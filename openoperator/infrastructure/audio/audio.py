@@ -2,7 +2,7 @@ from abc import ABC, abstractmethod
 
 class Audio(ABC):
   @abstractmethod
-  def transcribe(self, audio) -> str:
+  async def transcribe(self, audio) -> str:
     """
     Transcribe audio to text.
     """
\ No newline at end of file
@@ -1,7 +1,7 @@
 from .audio import Audio
 from io import BytesIO
 import os
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 class OpenaiAudio(Audio):
   def __init__(self, 
@@ -10,11 +10,11 @@ class OpenaiAudio(Audio):
     # Create openai client
     if openai_api_key is None:
       openai_api_key = os.environ['OPENAI_API_KEY']
-    self.openai = OpenAI(api_key=openai_api_key)
+    self.openai = AsyncOpenAI(api_key=openai_api_key)
 
-  def transcribe(self, audio: BytesIO) -> str:
+  async def transcribe(self, audio: BytesIO) -> str:
     try:
-      transcript = self.openai.audio.transcriptions.create(
+      transcript = await self.openai.audio.transcriptions.create(
         model="whisper-1",
         file=audio,
       )
@@ -4,14 +4,17 @@ from azure.storage.blob import ContainerClient, ContentSettings
 import urllib
 
 class AzureBlobStore(BlobStore):
-  def __init__(self, container_client_connection_string: str | None = None, container_name: str | None = None) -> None:
+  def __init__(self, container_client_connection_string: str | None = None, container_name: str | None = None, migrate: bool = True) -> None:
     # Create the container client
     if container_client_connection_string is None:
       container_client_connection_string = os.environ['AZURE_STORAGE_CONNECTION_STRING']
     if container_name is None:
       container_name = os.environ['AZURE_CONTAINER_NAME']
     self.container_client = ContainerClient.from_connection_string(container_client_connection_string, container_name=container_name)
+    if migrate:
+      self.migrate()
 
+  def migrate(self) -> None:
     # Check if the container exists, if it doesn't, create it
     if not self.container_client.exists():
       self.container_client.create_container(public_access="blob")
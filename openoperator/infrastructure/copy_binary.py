@@ -0,0 +1,18 @@
+from dataclasses import dataclass
+import struct
+
+PG_EPOCH = 946684800 # 2000-01-01T00:00:00Z in unix seconds, the zero point of binary timestamps
+COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0) # Signature, flags and header extension length
+COPY_TRAILER = struct.pack('>h', -1)
+
+@dataclass
+class IngestStats:
+  """
+  Summary of a bulk write, like a binary COPY into the timeseries table or the vector store.
+  """
+  rows: int
+  seconds: float
+
+  @property
+  def rows_per_sec(self) -> float:
+    return self.rows / self.seconds if self.seconds > 0 else float('inf')
@@ -1,2 +1,3 @@
 from .openai_embeddings import OpenAIEmbeddings
-from .embeddings import Embeddings
\ No newline at end of file
+from .embeddings import Embeddings
+from .cached_embeddings import CachedEmbeddings
\ No newline at end of file
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Dict, List
+import threading
+import numpy as np
+from openai.types import Embedding
+from ..postgres import Postgres
+from .embeddings import Embeddings
+
+class CachedEmbeddings(Embeddings):
+  """
+  Content addressed cache in front of an embeddings provider, keyed by (model, sha256(text)).
+
+  Vectors are kept in a Postgres table, shared by every process, with an in-process LRU of up to capacity
+  vectors in front of it. A call looks up all its texts in memory, then the misses in one query, and only
+  sends the texts found in neither to the provider, once each however often they repeat.
+  """
+  def __init__(self, embeddings: Embeddings, postgres: Postgres, model: str | None = None, capacity: int = 10_000, table: str = 'embedding_cache', migrate: bool = True) -> None:
+    self.embeddings = embeddings
+    self.postgres = postgres
+    self.model = model or getattr(embeddings, 'model', type(embeddings).__name__)
+    self.capacity = capacity
+    self.table = table
+    self.memory: OrderedDict[bytes, np.ndarray] = OrderedDict()
+    self.lock = threading.Lock()
+    self.memory_hits = 0
+    self.store_hits = 0
+    self.misses = 0
+    if migrate:
+      self.migrate()
+
+  def migrate(self) -> None:
+    with self.postgres.cursor() as cur:
+      cur.execute(f'CREATE TABLE IF NOT EXISTS {self.table} (model text NOT NULL, hash bytea NOT NULL, embedding bytea NOT NULL, PRIMARY KEY (model, hash))')
+
+  def remember(self, key: bytes, vector: np.ndarray) -> None:
+    """
+    Add a vector to the LRU. Call with the lock held.
+    """
+    self.memory[key] = vector
+    self.memory.move_to_end(key)
+    while len(self.memory) > self.capacity:
+      self.memory.popitem(last=False)
+
+  def lookup(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+    """
+    Vectors of the keys that are in the store.
+    """
+    with self.postgres.cursor() as cur:
+      cur.execute(f'SELECT hash, embedding FROM {self.table} WHERE model = %s AND hash = ANY(%s)', (self.model, keys), prepare=True)
+      return {bytes(hash): np.frombuffer(embedding, dtype=np.float32) for hash, embedding in cur.fetchall()}
+
+  def store(self, vectors: Dict[bytes, np.ndarray]) -> None:
+    with self.postgres.cursor() as cur:
+      cur.executemany(f'INSERT INTO {self.table} (model, hash, embedding) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING',
+                      [(self.model, key, vector.tobytes()) for key, vector in vectors.items()])
+
+  def create_embeddings(self, texts: list[str]) -> list[Embedding]:
+    keys = [sha256(text.encode()).digest() for text in texts]
+    found: Dict[bytes, np.ndarray] = {}
+    with self.lock:
+      for key in keys:
+        if key in self.memory:
+          self.memory.move_to_end(key)
+          found[key] = self.memory[key]
+    memory_hits = sum(key in found for key in keys)
+    missing = list(dict.fromkeys(key for key in keys if key not in found)) # Unique, in order
+
+    stored = self.lookup(missing) if missing else {}
+    found.update(stored)
+    new_texts = {key: text for key, text in zip(keys, texts) if key not in found}
+    if new_texts:
+      vectors = self.embeddings.create_embeddings(list(new_texts.values()))
+      created = {key: np.asarray(vector.embedding, dtype=np.float32) for key, vector in zip(new_texts, vectors)}
+      self.store(created)
+      found.update(created)
+
+    with self.lock:
+      for key in missing:
+        self.remember(key, found[key])
+      self.memory_hits += memory_hits
+      self.store_hits += sum(key in stored for key in keys)
+      self.misses += sum(key in new_texts for key in keys)
+    return [Embedding(embedding=found[key].tolist(), index=i, object='embedding') for i, key in enumerate(keys)]
+
+  def stats(self) -> dict:
+    lookups = self.memory_hits + self.store_hits + self.misses
+    return {
+      "entries": len(self.memory),
+      "memory_hits": self.memory_hits,
+      "store_hits": self.store_hits,
+      "misses": self.misses,
+      "hit_rate": (self.memory_hits + self.store_hits) / lookups if lookups else 0.0,
+    }
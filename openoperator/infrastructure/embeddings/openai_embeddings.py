@@ -1,63 +1,154 @@
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+import openai
 from openai import OpenAI
 from .embeddings import Embeddings
 import tiktoken
 
+class TokenBudget:
+  """
+  Token bucket for a tokens-per-minute rate limit, shared by the threads sending requests. It starts full
+  and refills continuously, a request larger than the whole budget waits for a full bucket.
+  """
+  def __init__(self, tokens_per_minute: int):
+    self.capacity = tokens_per_minute
+    self.available = float(tokens_per_minute)
+    self.rate = tokens_per_minute / 60
+    self.updated = time.monotonic()
+    self.lock = threading.Lock()
+
+  def acquire(self, tokens: int) -> None:
+    tokens = min(tokens, self.capacity)
+    while True:
+      with self.lock:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.available >= tokens:
+          self.available -= tokens
+          return
+        wait = (tokens - self.available) / self.rate
+      time.sleep(wait)
+
 class OpenAIEmbeddings(Embeddings):
-  def __init__(self, openai_api_key: str | None = None) -> None:
+  """
+  Embeddings from the OpenAI API.
+
+  Every text is tokenized once. Texts longer than the model's input limit are truncated, and consecutive
+  texts are packed into requests of up to max_batch_inputs inputs and max_batch_tokens tokens. Requests go
+  out concurrently under a tokens-per-minute budget. Rate limits, timeouts and server errors are retried
+  with exponential backoff, honouring Retry-After. Embeddings are returned in the order of the texts.
+  """
+  def __init__(
+    self,
+    openai_api_key: str | None = None,
+    model: str = "text-embedding-3-small",
+    base_url: str | None = None,
+    max_input_tokens: int = 8191,
+    max_batch_inputs: int = 2048,
+    max_batch_tokens: int = 300_000,
+    tokens_per_minute: int = 1_000_000,
+    concurrency: int = 8,
+    max_retries: int = 6,
+    encoding = None,
+  ) -> None:
     if openai_api_key is None:
       openai_api_key = os.environ['OPENAI_API_KEY']
-    openai = OpenAI(api_key=openai_api_key)
-    self.embeddings = openai.embeddings
-    self.model = "text-embedding-3-small"
-
-  def chunk_text(self, texts: list[str], max_tokens: int) -> list:
-    """
-    Split a list of texts into chunks that do not exceed the max tokens.
-    """
-    encoding = tiktoken.get_encoding('cl100k_base')
-    chunks = []
-    current_chunk = []
-    current_chunk_text = ""
-
-    for text in texts:
-      # Simulate adding this text to the current chunk
-      test_chunk_text = ' '.join([current_chunk_text, text]).strip()
-      test_chunk_token_count = len(encoding.encode(test_chunk_text))
-
-      if test_chunk_token_count <= max_tokens:
-        # If the test chunk does not exceed the max tokens, update the current chunk and text
-        current_chunk.append(text)
-        current_chunk_text = test_chunk_text
-      else:
-        # If the test chunk exceeds the max tokens, finalize the current chunk and start a new one
-        chunks.append(current_chunk)
-        current_chunk = [text]
-        current_chunk_text = text
-
-    # Don't forget to add the last chunk if it's not empty
-    if current_chunk:
-      chunks.append(current_chunk)
-
-    return chunks
-    
-  def create_embeddings(self, texts: list[str]) -> list:
+    client = OpenAI(api_key=openai_api_key, base_url=base_url, max_retries=0) # Retries are done here, under the budget
+    self.embeddings = client.embeddings
+    self.model = model
+    self.max_input_tokens = max_input_tokens
+    self.max_batch_inputs = max_batch_inputs
+    self.max_batch_tokens = max_batch_tokens
+    self.budget = TokenBudget(tokens_per_minute)
+    self.concurrency = concurrency
+    self.max_retries = max_retries
+    self._encoding = encoding
+
+  @property
+  def encoding(self):
+    if self._encoding is None: # Loaded on first use, it may have to be downloaded
+      self._encoding = tiktoken.get_encoding('cl100k_base')
+    return self._encoding
+
+  def prepare(self, texts: List[str]) -> Tuple[List[str], List[int]]:
+    """
+    Token count of every text, truncating texts over the input limit.
+    """
+    inputs, counts = [], []
+    for text, tokens in zip(texts, self.encoding.encode_ordinary_batch(texts)):
+      if len(tokens) > self.max_input_tokens:
+        tokens = tokens[:self.max_input_tokens]
+        text = self.encoding.decode(tokens)
+      inputs.append(text)
+      counts.append(len(tokens))
+    return inputs, counts
+
+  def batches(self, counts: List[int]) -> List[Tuple[int, int]]:
+    """
+    Split the texts into consecutive (start, end) ranges within the per-request input and token limits.
+    """
+    ranges = []
+    start, tokens = 0, 0
+    for i, count in enumerate(counts):
+      if i > start and (i - start == self.max_batch_inputs or tokens + count > self.max_batch_tokens):
+        ranges.append((start, i))
+        start, tokens = i, 0
+      tokens += count
+    if start < len(counts):
+      ranges.append((start, len(counts)))
+    return ranges
+
+  def retry_delay(self, error: Exception, attempt: int) -> float | None:
     """
-    Convert a list of strings into embeddings, ensuring each chunk does not exceed the token limit.
+    Seconds to wait before retrying a failed request, None if it should not be retried.
     """
-    max_tokens = 8191  # Max tokens allowed
-    chunks = self.chunk_text(texts, max_tokens)
-    embeddings = []
-    for chunk in chunks:
+    if isinstance(error, openai.APIStatusError):
+      if error.status_code != 429 and error.status_code < 500:
+        return None
+      retry_after = error.response.headers.get('retry-after')
+      if retry_after:
+        try:
+          return float(retry_after)
+        except ValueError:
+          pass
+    elif not isinstance(error, openai.APIConnectionError): # Timeouts are connection errors too
+      return None
+    return min(60, 2 ** attempt) * (0.5 + random.random() / 2)
+
+  def embed_batch(self, inputs: List[str], tokens: int) -> list:
+    attempt = 0
+    while True:
+      self.budget.acquire(tokens)
       try:
-        # Assuming self.embeddings.create correctly handles a list of strings as input
-        chunk_embeddings = self.embeddings.create(
-          model=self.model,
-          input=chunk,  # This should be correctly formatted per the API's expectations
-          encoding_format="float"
-        )
-        embeddings.extend(chunk_embeddings.data)
+        response = self.embeddings.create(model=self.model, input=inputs, encoding_format="float")
+        return response.data # In input order
       except Exception as e:
-        raise e
+        delay = self.retry_delay(e, attempt)
+        if delay is None or attempt == self.max_retries:
+          raise e
+        attempt += 1
+        time.sleep(delay)
 
-    return embeddings
\ No newline at end of file
+  def create_embeddings(self, texts: list[str]) -> list:
+    """
+    Convert a list of strings into embeddings, in the same order.
+    """
+    if not texts:
+      return []
+    inputs, counts = self.prepare(texts)
+    ranges = self.batches(counts)
+    if len(ranges) == 1:
+      return self.embed_batch(inputs, sum(counts))
+    with ThreadPoolExecutor(max_workers=min(self.concurrency, len(ranges)), thread_name_prefix='embeddings') as pool:
+      results = pool.map(lambda r: self.embed_batch(inputs[r[0]:r[1]], sum(counts[r[0]:r[1]])), ranges)
+      embeddings = []
+      for (start, _), batch in zip(ranges, results):
+        for embedding in batch:
+          embedding.index += start
+        embeddings.extend(batch)
+      return embeddings
@@ -1,5 +1,5 @@
 import os
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, AsyncGraphDatabase
 
 class KnowledgeGraph():
   def __init__(
@@ -7,6 +7,7 @@ class KnowledgeGraph():
           neo4j_uri: str | None = None,
           neo4j_user: str | None = None,
           neo4j_password: str | None = None,        
+          migrate: bool = True,
   ) -> None:
     # Create the neo4j driver
     if neo4j_uri is None:
@@ -16,10 +17,18 @@ class KnowledgeGraph():
     if neo4j_password is None:
       neo4j_password = os.environ['NEO4J_PASSWORD']
     
-    neo4j_driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password), max_connection_lifetime=200)
-    neo4j_driver.verify_connectivity()
-    self.neo4j_driver = neo4j_driver
+    # Drivers connect on first use
+    self.neo4j_driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password), max_connection_lifetime=200)
+    # For repositories called from async handlers, bound to the event loop that first uses it
+    self.async_driver = AsyncGraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password), max_connection_lifetime=200)
+    if migrate:
+      self.migrate()
 
+  def migrate(self) -> None:
+    """
+    Verify the connection and set up the unique uri constraint and the n10s graph config and prefixes.
+    """
+    self.neo4j_driver.verify_connectivity()
     namespaces = [
       ("cobie", "http://checksem.u-bourgogne.fr/ontology/cobie24#"),
       ("bacnet", "http://data.ashrae.org/bacnet/#"),
@@ -46,6 +55,9 @@ class KnowledgeGraph():
 
   def create_session(self):
     return self.neo4j_driver.session()
+
+  def create_async_session(self):
+    return self.async_driver.session()
               
   def import_rdf_data(self, url: str, format: str = "Turtle", inline: bool = False):
     """
@@ -0,0 +1,134 @@
+from typing import Dict, List, Sequence
+import json
+import math
+import threading
+import time
+import numpy as np
+import psycopg
+from openoperator.domain.model import PointReading, PointReadingBatch
+from openoperator.domain.model.point import to_epoch
+from .timescale import Timescale, LATEST_CHANNEL, format_timestamps
+
+class LatestValueCache:
+  """
+  The most recent reading per timeseriesid, kept in flat numpy columns indexed through a slot per id.
+
+  Entries are fed by the ingest path, in-process through update_batch or from other processes through the
+  NOTIFY messages Timescale.insert_batch sends, and are loaded from Timescale on a miss. While the listener
+  is connected every entry loaded since it connected is kept current by the notifications, otherwise an
+  entry is reloaded once it is ttl seconds old. Readings older than max_age seconds are reported as missing,
+  the same window Timescale.get_latest_values uses.
+  """
+  def __init__(self, timescale: Timescale, ttl: float = 60, max_age: float = 1800, capacity: int = 1024):
+    self.timescale = timescale
+    self.ttl = ttl
+    self.max_age = max_age
+    self.slots: Dict[str, int] = {}
+    self.ids: List[str] = []
+    self.ts = np.full(capacity, np.nan) # Epoch seconds of the newest reading, nan when there is none
+    self.values = np.full(capacity, np.nan)
+    self.checked = np.full(capacity, -np.inf) # Monotonic time the entry was last known to be current
+    self.lock = threading.Lock()
+    self.listening_since: float | None = None
+    self.hits = 0
+    self.misses = 0
+
+  def slot(self, timeseriesid: str) -> int:
+    """
+    The slot of an id, allocated on first use. Call with the lock held.
+    """
+    slot = self.slots.get(timeseriesid)
+    if slot is None:
+      slot = len(self.ids)
+      if slot == len(self.ts):
+        self.ts = np.concatenate([self.ts, np.full(slot, np.nan)])
+        self.values = np.concatenate([self.values, np.full(slot, np.nan)])
+        self.checked = np.concatenate([self.checked, np.full(slot, -np.inf)])
+      self.slots[timeseriesid] = slot
+      self.ids.append(timeseriesid)
+    return slot
+
+  def update(self, timeseriesids: Sequence[str], ts: Sequence[float], values: Sequence[float], checked: float | None = None) -> None:
+    """
+    Record readings. An older reading never replaces a newer one, so feeds may arrive out of order. A nan
+    timestamp marks an id as checked without a reading.
+    """
+    checked = time.monotonic() if checked is None else checked
+    with self.lock:
+      for timeseriesid, t, value in zip(timeseriesids, ts, values):
+        slot = self.slot(timeseriesid)
+        if t >= self.ts[slot] or math.isnan(self.ts[slot]):
+          self.ts[slot] = t
+          self.values[slot] = value
+        self.checked[slot] = max(self.checked[slot], checked)
+
+  def update_batch(self, batch: PointReadingBatch) -> None:
+    ids, ts, values = batch.latest()
+    self.update(ids, ts.tolist(), values.tolist())
+
+  def apply_notification(self, payload: str) -> None:
+    rows = json.loads(payload) # [[timeseriesid, epoch seconds, value], ...]
+    self.update([row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows])
+
+  def is_current(self, slot: int, now: float) -> bool:
+    listening_since = self.listening_since
+    checked = self.checked[slot]
+    return checked > now - self.ttl or (listening_since is not None and checked >= listening_since)
+
+  def get_latest_values(self, timeseriesIds: List[str]) -> List[PointReading]:
+    """
+    Drop-in for Timescale.get_latest_values that only queries the ids whose entries are not current.
+    """
+    now = time.monotonic()
+    with self.lock:
+      missing = [id for id in timeseriesIds if id not in self.slots or not self.is_current(self.slots[id], now)]
+      self.hits += len(timeseriesIds) - len(missing)
+      self.misses += len(missing)
+    if missing:
+      found = {reading.timeseriesid: reading for reading in self.timescale.get_latest_values(missing)}
+      ts = [to_epoch(found[id].ts) if id in found else math.nan for id in missing] # Ids without a recent reading are remembered too
+      values = [found[id].value if id in found else math.nan for id in missing]
+      self.update(missing, ts, values, checked=now)
+
+    with self.lock:
+      slots = np.array([self.slots[id] for id in timeseriesIds], dtype=np.int64)
+      ts = self.ts[slots]
+      values = self.values[slots]
+    recent = np.flatnonzero(ts >= time.time() - self.max_age)
+    return [PointReading(ts=stamp, value=value, timeseriesid=timeseriesIds[i]) for i, stamp, value in zip(recent.tolist(), format_timestamps(ts[recent]), values[recent].tolist())]
+
+  def listen(self, conninfo: str | None = None, reconnect_delay: float = 5) -> threading.Thread:
+    """
+    Keep the cache current from the NOTIFY messages of ingest processes, on a daemon thread with its own
+    connection. While disconnected entries fall back to the ttl.
+    """
+    conninfo = conninfo or self.timescale.postgres.pool.conninfo
+    thread = threading.Thread(target=self.run_listener, args=(conninfo, reconnect_delay), name='latest-values-listener', daemon=True)
+    thread.start()
+    return thread
+
+  def run_listener(self, conninfo: str, reconnect_delay: float) -> None:
+    while True:
+      try:
+        with psycopg.connect(conninfo, autocommit=True) as conn:
+          conn.execute(f'LISTEN {LATEST_CHANNEL}')
+          self.listening_since = time.monotonic()
+          for notify in conn.notifies():
+            self.apply_notification(notify.payload)
+      except psycopg.Error as e:
+        print(f"Latest value listener disconnected: {e}")
+      finally:
+        self.listening_since = None
+      time.sleep(reconnect_delay)
+
+  def stats(self) -> dict:
+    with self.lock:
+      entries, hits, misses = len(self.ids), self.hits, self.misses
+    lookups = hits + misses
+    return {
+      "entries": entries,
+      "hits": hits,
+      "misses": misses,
+      "hit_rate": hits / lookups if lookups else 0.0,
+      "listening": self.listening_since is not None,
+    }
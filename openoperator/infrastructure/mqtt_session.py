@@ -0,0 +1,150 @@
+from typing import Callable, Dict, List, Set
+import threading
+import time
+import paho.mqtt.client as paho
+from .mqtt_client import MQTTClient
+
+MessageCallback = Callable[[str, bytes], None]
+
+class Subscription:
+  """
+  One subscriber's interest in a topic filter. Close it, or use it as a context manager, to stop receiving.
+  """
+  def __init__(self, session: 'MQTTSession', topic: str, callback: MessageCallback):
+    self.session = session
+    self.topic = topic
+    self.callback = callback
+
+  def close(self) -> None:
+    self.session.unsubscribe(self)
+
+  def __enter__(self) -> 'Subscription':
+    return self
+
+  def __exit__(self, *exc) -> None:
+    self.close()
+
+class MQTTSession:
+  """
+  One long lived broker connection shared by every request of the API process.
+
+  Any number of subscribers can listen to a topic filter. The broker subscription is made for the first
+  one and dropped with the last one, and every message is fanned out to all of them. Subscriptions are
+  restored after a reconnect. Publishes complete when the broker acknowledges them (PUBACK for QoS 1).
+  Callbacks run on the MQTT network thread and must not block.
+  """
+  def __init__(self, mqtt_client: MQTTClient, qos: int = 1):
+    self.mqtt_client = mqtt_client
+    self.client = mqtt_client.client
+    self.qos = qos
+    self.subscribers: Dict[str, List[Subscription]] = {}
+    self.wildcards: Set[str] = set()
+    self.lock = threading.Lock()
+    self.connected = threading.Event()
+    self.started = False
+    self.client.on_connect = self.on_connect
+    self.client.on_disconnect = self.on_disconnect
+    self.client.on_message = self.on_message
+
+  def start(self) -> None:
+    """
+    Connect in the background. After a lost connection the network loop reconnects on its own.
+    """
+    with self.lock:
+      if self.started:
+        return
+      self.started = True
+    self.client.reconnect_delay_set(min_delay=1, max_delay=30)
+    self.client.connect_async(self.mqtt_client.host, self.mqtt_client.port, 60)
+    self.client.loop_start()
+
+  def stop(self) -> None:
+    self.client.disconnect()
+    self.client.loop_stop()
+    self.connected.clear()
+    self.started = False
+
+  def wait_connected(self, timeout: float) -> None:
+    if not self.connected.wait(timeout):
+      raise TimeoutError("Not connected to the MQTT broker")
+
+  def on_connect(self, client, userdata, flags, reason_code, properties=None):
+    if reason_code.is_failure:
+      print(f"Unable to connect to MQTT broker: {reason_code}")
+      return
+    with self.lock:
+      topics = list(self.subscribers)
+    for topic in topics:
+      client.subscribe(topic, qos=self.qos)
+    self.connected.set()
+
+  def on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+    self.connected.clear()
+
+  def on_message(self, client, userdata, message):
+    with self.lock:
+      subscriptions = list(self.subscribers.get(message.topic, ()))
+      for topic_filter in self.wildcards:
+        if paho.topic_matches_sub(topic_filter, message.topic):
+          subscriptions.extend(self.subscribers[topic_filter])
+    for subscription in subscriptions:
+      try:
+        subscription.callback(message.topic, message.payload)
+      except Exception as e:
+        print(f"Error in subscriber of {subscription.topic}: {e}")
+
+  def subscribe(self, topic: str, callback: MessageCallback) -> Subscription:
+    subscription = Subscription(self, topic, callback)
+    with self.lock:
+      subscriptions = self.subscribers.setdefault(topic, [])
+      first = not subscriptions
+      subscriptions.append(subscription)
+      if '+' in topic or '#' in topic:
+        self.wildcards.add(topic)
+    if first and self.connected.is_set(): # Otherwise on_connect subscribes
+      self.client.subscribe(topic, qos=self.qos)
+    return subscription
+
+  def unsubscribe(self, subscription: Subscription) -> None:
+    with self.lock:
+      subscriptions = self.subscribers.get(subscription.topic, [])
+      if subscription not in subscriptions:
+        return
+      subscriptions.remove(subscription)
+      last = not subscriptions
+      if last:
+        del self.subscribers[subscription.topic]
+        self.wildcards.discard(subscription.topic)
+    if last and self.connected.is_set():
+      self.client.unsubscribe(subscription.topic)
+
+  def read(self, topic: str, timeout: float = 10) -> bytes:
+    """
+    Wait for the next message on a topic.
+    """
+    received = threading.Event()
+    payload = None
+
+    def on_message(topic: str, data: bytes):
+      nonlocal payload
+      if not received.is_set():
+        payload = data
+        received.set()
+
+    with self.subscribe(topic, on_message):
+      if not received.wait(timeout):
+        raise TimeoutError(f"No message on {topic} within {timeout} seconds")
+    return payload
+
+  def publish(self, topic: str, payload: str | bytes, timeout: float = 10) -> None:
+    """
+    Publish and wait until the broker has acknowledged the message.
+    """
+    deadline = time.monotonic() + timeout
+    self.wait_connected(timeout)
+    info = self.client.publish(topic, payload, qos=self.qos)
+    if info.rc != paho.MQTT_ERR_SUCCESS:
+      raise ConnectionError(f"Unable to publish to {topic}: {paho.error_string(info.rc)}")
+    info.wait_for_publish(max(0.0, deadline - time.monotonic()))
+    if not info.is_published():
+      raise TimeoutError(f"Broker did not acknowledge the message on {topic} within {timeout} seconds")
@@ -1,14 +1,120 @@
 import os
+import time
+import weakref
+from contextlib import contextmanager, asynccontextmanager
+from typing import Callable, Iterator, AsyncIterator, List
 import psycopg
+from psycopg_pool import ConnectionPool, AsyncConnectionPool
+
+class PoolWaitMetrics:
+  """
+  How long callers waited to check a connection out of the pool.
+  """
+  def __init__(self):
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def observe(self, seconds: float):
+    self.count += 1
+    self.total += seconds
+    self.max = max(self.max, seconds)
+
+  def snapshot(self) -> dict:
+    return {
+      "checkouts": self.count,
+      "wait_avg": self.total / self.count if self.count else 0.0,
+      "wait_max": self.max,
+    }
 
 class Postgres():
-  def __init__(self, connection_string: str | None = None) -> None:
+  """
+  Postgres connection pool.
+
+  Every operation checks out its own connection, so concurrent requests do not serialize on one connection
+  and a failed transaction only rolls back that operation. Leaving a connection() or cursor() block commits
+  the transaction, an exception rolls it back. Connections are health checked when they are handed out.
+  """
+  def __init__(self, connection_string: str | None = None, min_size: int = 1, max_size: int = 10, timeout: float = 30) -> None:
     if connection_string is None:
       connection_string = os.environ['POSTGRES_CONNECTION_STRING']
+    self.configure_callbacks: List[Callable[[psycopg.Connection], None]] = []
+    self.configured = weakref.WeakKeyDictionary() # connection -> number of configure callbacks applied
+    self.wait_metrics = PoolWaitMetrics()
     try:
-      self.conn = psycopg.connect(connection_string)
+      self.pool = ConnectionPool(connection_string, min_size=min_size, max_size=max_size, timeout=timeout, check=ConnectionPool.check_connection, open=True)
     except Exception as e:
       raise e
 
-  def cursor(self):
-    return self.conn.cursor()
\ No newline at end of file
+  def configure(self, callback: Callable[[psycopg.Connection], None]) -> None:
+    """
+    Run a callback, like registering type adapters, once on every pooled connection before it is used.
+    """
+    self.configure_callbacks.append(callback)
+
+  @contextmanager
+  def connection(self) -> Iterator[psycopg.Connection]:
+    start = time.perf_counter()
+    with self.pool.connection() as conn:
+      self.wait_metrics.observe(time.perf_counter() - start)
+      applied = self.configured.get(conn, 0)
+      for callback in self.configure_callbacks[applied:]:
+        callback(conn)
+      self.configured[conn] = len(self.configure_callbacks)
+      yield conn
+
+  @contextmanager
+  def cursor(self) -> Iterator[psycopg.Cursor]:
+    with self.connection() as conn:
+      with conn.cursor() as cur:
+        yield cur
+
+  def stats(self) -> dict:
+    return {**self.pool.get_stats(), **self.wait_metrics.snapshot()}
+
+  def close(self) -> None:
+    self.pool.close()
+
+class AsyncPostgres():
+  """
+  Asyncio variant of Postgres backed by an AsyncConnectionPool. Call open() from a running event loop.
+  """
+  def __init__(self, connection_string: str | None = None, min_size: int = 1, max_size: int = 10, timeout: float = 30) -> None:
+    if connection_string is None:
+      connection_string = os.environ['POSTGRES_CONNECTION_STRING']
+    self.configure_callbacks: List[Callable[[psycopg.AsyncConnection], object]] = []
+    self.configured = weakref.WeakKeyDictionary()
+    self.wait_metrics = PoolWaitMetrics()
+    self.pool = AsyncConnectionPool(connection_string, min_size=min_size, max_size=max_size, timeout=timeout, check=AsyncConnectionPool.check_connection, open=False)
+
+  async def open(self) -> None:
+    await self.pool.open()
+
+  def configure(self, callback: Callable[[psycopg.AsyncConnection], object]) -> None:
+    """
+    Await a callback once on every pooled connection before it is used.
+    """
+    self.configure_callbacks.append(callback)
+
+  @asynccontextmanager
+  async def connection(self) -> AsyncIterator[psycopg.AsyncConnection]:
+    start = time.perf_counter()
+    async with self.pool.connection() as conn:
+      self.wait_metrics.observe(time.perf_counter() - start)
+      applied = self.configured.get(conn, 0)
+      for callback in self.configure_callbacks[applied:]:
+        await callback(conn)
+      self.configured[conn] = len(self.configure_callbacks)
+      yield conn
+
+  @asynccontextmanager
+  async def cursor(self) -> AsyncIterator[psycopg.AsyncCursor]:
+    async with self.connection() as conn:
+      async with conn.cursor() as cur:
+        yield cur
+
+  def stats(self) -> dict:
+    return {**self.pool.get_stats(), **self.wait_metrics.snapshot()}
+
+  async def close(self) -> None:
+    await self.pool.close()
@@ -1,11 +1,62 @@
 from .postgres import Postgres
-from typing import List
-from openoperator.domain.model import PointReading
+from .copy_binary import IngestStats, PG_EPOCH, COPY_HEADER, COPY_TRAILER
+from typing import Iterator, List, Sequence, Tuple
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import json
+import math
+import time
+import numpy as np
+from openoperator.domain.model import PointReading, PointReadingBatch
+from openoperator.domain.model.point import to_epoch
+from openoperator.utils import lttb
+
+@dataclass
+class Rollup:
+  """
+  A continuous aggregate of the timeseries table at a fixed bucket width. A refresh policy materializes the
+  window from start_offset up to the last complete bucket every schedule_interval, newer readings are
+  aggregated on the fly. Only changed buckets are recomputed, so a wide window is cheap and lets late
+  readings, like a replayed ingest spool, land in the rollup.
+  """
+  name: str
+  bucket: timedelta
+  start_offset: timedelta
+  schedule_interval: timedelta
+  retention: timedelta | None = None
+
+DEFAULT_ROLLUPS = [
+  Rollup('timeseries_1m', timedelta(minutes=1), start_offset=timedelta(days=1), schedule_interval=timedelta(minutes=1)),
+  Rollup('timeseries_15m', timedelta(minutes=15), start_offset=timedelta(days=7), schedule_interval=timedelta(minutes=15)),
+  Rollup('timeseries_1h', timedelta(hours=1), start_offset=timedelta(days=30), schedule_interval=timedelta(hours=1)),
+  Rollup('timeseries_1d', timedelta(days=1), start_offset=timedelta(days=90), schedule_interval=timedelta(days=1)),
+]
 
 class Timescale:
-  def __init__(self, postgres: Postgres) -> None:
+  """
+  Point readings stored in a TimescaleDB hypertable.
+
+  migrate() brings the database in line with the configuration: rollups are created as continuous
+  aggregates, chunks older than compress_after are compressed (segmented by timeseriesid, ordered by ts) and
+  raw chunks older than retention are dropped. Policies whose settings changed are replaced, policies that
+  are no longer configured are removed. The constructor runs it unless migrate is False.
+  """
+  def __init__(self, postgres: Postgres, rollups: List[Rollup] = DEFAULT_ROLLUPS, compress_after: timedelta | None = timedelta(days=7), retention: timedelta | None = None, notify_latest: bool = True, migrate: bool = True) -> None:
+    if retention is not None and any(rollup.start_offset >= retention for rollup in rollups):
+      raise ValueError("Raw retention must be longer than the refresh window of every rollup")
     self.postgres = postgres
+    self.rollups = sorted(rollups, key=lambda rollup: rollup.bucket)
+    self.compress_after = compress_after
+    self.retention = retention
+    self.notify_latest = notify_latest
+    if migrate:
+      self.migrate()
+
+  def migrate(self) -> None:
     collection_name = 'timeseries'
+    compress_after, retention = self.compress_after, self.retention
+    created = []
     try:
       with self.postgres.cursor() as cur:
         cur.execute('CREATE EXTENSION IF NOT EXISTS timescaledb') # Create timescaledb extension
@@ -15,46 +66,388 @@ class Timescale:
         if not cur.fetchone(): cur.execute(f'SELECT create_hypertable(\'{collection_name}\', \'ts\')') # Create hypertable if it doesn't exist
         cur.execute(f'SELECT indexname FROM pg_indexes WHERE tablename = \'{collection_name}\' AND indexname = \'{collection_name}_timeseriesid_ts_idx\'') # Check if the table has the timeseriesid index
         if not cur.fetchone(): cur.execute(f'CREATE INDEX {collection_name}_timeseriesid_ts_idx ON {collection_name} (timeseriesid, ts DESC)') # Create the timeseriesid index if it doesn't exist
+        if compress_after is not None:
+          cur.execute(f'SELECT compression_enabled FROM timescaledb_information.hypertables WHERE hypertable_name = \'{collection_name}\'') # Check if compression is enabled
+          if not cur.fetchone()[0]: cur.execute(f'ALTER TABLE {collection_name} SET (timescaledb.compress, timescaledb.compress_segmentby = \'timeseriesid\', timescaledb.compress_orderby = \'ts\')')
+        self.ensure_policy(cur, collection_name, 'compression', compress_after)
+        self.ensure_policy(cur, collection_name, 'retention', retention)
+        for rollup in self.rollups:
+          cur.execute('SELECT EXISTS (SELECT FROM timescaledb_information.continuous_aggregates WHERE view_name = %s)', (rollup.name,)) # Check if the rollup exists
+          if not cur.fetchone()[0]: # Create the rollup if it doesn't exist
+            cur.execute(f"""CREATE MATERIALIZED VIEW {rollup.name} WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+                            SELECT timeseriesid, time_bucket(INTERVAL '{int(rollup.bucket.total_seconds())} seconds', ts) AS bucket,
+                            avg(value) AS avg, min(value) AS min, max(value) AS max, last(value, ts) AS last, count(*) AS count
+                            FROM {collection_name} GROUP BY timeseriesid, bucket WITH NO DATA""")
+            created.append(rollup)
+          self.ensure_policy(cur, rollup.name, 'refresh', rollup.start_offset, end_offset=rollup.bucket, schedule_interval=rollup.schedule_interval)
+          self.ensure_policy(cur, rollup.name, 'retention', rollup.retention)
+      if created:
+        self.refresh_rollups(rollups=created) # Readings older than the refresh window would never be materialized otherwise
+    except Exception as e:
+      raise e
+
+  def ensure_policy(self, cur, relation: str, kind: str, interval: timedelta | None, **options) -> None:
+    """
+    Make the compression, retention or refresh policy of a hypertable or continuous aggregate match the
+    configured interval and options. A policy with a different interval or option is replaced, None removes
+    the policy.
+    """
+    proc, key, add, remove = POLICIES[kind]
+    conditions, params = ['(j.config->>%s)::interval = %s::interval'], [key, interval]
+    for name, value in options.items():
+      if name == 'schedule_interval': # A property of the job, not of the policy config
+        conditions.append('j.schedule_interval = %s::interval')
+        params.append(value)
+      else:
+        conditions.append('(j.config->>%s)::interval = %s::interval')
+        params += [name, value]
+    cur.execute(f"""SELECT {' AND '.join(conditions)} FROM timescaledb_information.jobs j
+                   LEFT JOIN timescaledb_information.continuous_aggregates c ON c.materialization_hypertable_name = j.hypertable_name
+                   WHERE j.proc_name = %s AND (j.hypertable_name = %s OR c.view_name = %s)""", (*params, proc, relation, relation))
+    row = cur.fetchone()
+    if row is not None and row[0]:
+      return
+    if row is not None:
+      cur.execute(f'SELECT {remove}(%s::regclass, if_exists => true)', (relation,))
+    if interval is not None:
+      params = ''.join(f', {name} => %s::interval' for name in options)
+      cur.execute(f'SELECT {add}(%s::regclass, %s::interval{params})', (relation, interval, *options.values()))
+
+  def refresh_rollups(self, start_time: str | datetime | None = None, end_time: str | datetime | None = None, rollups: List[Rollup] | None = None) -> None:
+    """
+    Materialize the rollups over a range, for backfills older than the refresh policy window. None leaves
+    the range open on that side.
+    """
+    try:
+      with self.postgres.connection() as conn:
+        conn.autocommit = True # refresh_continuous_aggregate cannot run inside a transaction
+        try:
+          for rollup in rollups or self.rollups:
+            conn.execute(f'CALL refresh_continuous_aggregate(\'{rollup.name}\', %s, %s)', (start_time, end_time))
+        finally:
+          conn.autocommit = False
+    except Exception as e:
+      raise e
+
+  def rollup_for(self, bucket: timedelta | None) -> Rollup | None:
+    """
+    The coarsest rollup that the requested bucket can be rebuilt from exactly, None when only the raw
+    readings will do.
+    """
+    if bucket is None:
+      return None
+    seconds = bucket.total_seconds()
+    for rollup in reversed(self.rollups):
+      width = rollup.bucket.total_seconds()
+      if seconds >= width and seconds % width == 0:
+        return rollup
+    return None
+
+  def align_bucket(self, bucket: timedelta) -> timedelta:
+    """
+    Round a computed bucket width up to a multiple of the coarsest rollup no wider than it, so the buckets
+    can be rebuilt from that rollup. Wider buckets only mean fewer points.
+    """
+    seconds = bucket.total_seconds()
+    for rollup in reversed(self.rollups):
+      width = rollup.bucket.total_seconds()
+      if width <= seconds:
+        return timedelta(seconds=math.ceil(seconds / width) * width)
+    return bucket
+
+  def get_timeseries(self, timeseriesIds: List[str], start_time: str, end_time: str, columnar: bool = False) -> List[dict]:
+    """
+    Raw readings per series, in the order of timeseriesIds. With columnar the data of a series is a pair of
+    'ts' and 'value' lists instead of one object per reading.
+    """
+    query = RAW_QUERY.format(ids=ids_condition(timeseriesIds))
+    try:
+      with self.postgres.cursor() as cur:
+        cur.execute(query, (list(timeseriesIds), start_time, end_time), prepare=True)
+        return assemble_series(cur.fetchall(), timeseriesIds, columnar=columnar)
+    except Exception as e:
+      raise e
+
+  def stream_timeseries(self, timeseriesIds: List[str], start_time: str, end_time: str, itersize: int = 50_000) -> Iterator[np.ndarray]:
+    """
+    Raw readings as SERIES_ROW record arrays of up to itersize rows, ordered by timeseriesid and ts. Rows are
+    read through a server side cursor so memory stays flat however long the range is. A series can span
+    several chunks. The pooled connection is held until the iterator is exhausted or closed.
+    """
+    query = RAW_QUERY.format(ids=ids_condition(timeseriesIds))
+    try:
+      with self.postgres.connection() as conn:
+        with conn.cursor(name='timeseries_stream') as cur:
+          cur.itersize = itersize
+          cur.execute(query, (list(timeseriesIds), start_time, end_time))
+          while rows := cur.fetchmany(itersize):
+            yield np.array(rows, dtype=SERIES_ROW)
+    except Exception as e:
+      raise e
+
+  def get_timeseries_buckets(self, timeseriesIds: List[str], start_time: str, end_time: str, bucket: str | timedelta | None = None, max_points: int | None = None) -> List[dict]:
+    """
+    Aggregate readings into fixed width time buckets inside TimescaleDB. The bucket is either an interval,
+    like '15 minutes', or derived from max_points so that each series returns at most that many buckets.
+    Intervals that are not fixed width, like '1 month', raise ValueError.
+    Every bucket carries the average as value along with the min, max and last reading. The buckets are the
+    whole buckets that overlap the range, so the first and last cover readings just outside it.
+
+    The buckets are built from the coarsest rollup whose width divides the bucket, the raw table is only
+    scanned for buckets narrower than the finest rollup or widths that no rollup lines up with. Widths
+    derived from max_points are rounded up to line up with a rollup.
+    """
+    if bucket is None:
+      if max_points is None:
+        raise ValueError("Either bucket or max_points is required")
+      if max_points < 1:
+        raise ValueError("max_points must be at least 1")
+      bucket = self.align_bucket(bucket_width(start_time, end_time, max_points))
+    width = bucket if isinstance(bucket, timedelta) else parse_interval(bucket)
+    if width is None or width <= timedelta(0):
+      raise ValueError(f"Invalid bucket interval: {bucket!r}, expected a fixed width like '15 minutes'")
+    rollup = self.rollup_for(width)
+    ids = ids_condition(timeseriesIds)
+    # Both paths read the same whole buckets, from the one holding start_time to the one holding end_time
+    bounds = "{column} >= time_bucket(%s::interval, %s::timestamptz) AND {column} < time_bucket(%s::interval, %s::timestamptz) + %s::interval"
+    if rollup is None:
+      query = f"""SELECT timeseriesid, time_bucket(%s::interval, ts) AS bucket, avg(value), min(value), max(value), last(value, ts)
+                  FROM timeseries WHERE {ids} AND {bounds.format(column='ts')}
+                  GROUP BY timeseriesid, bucket ORDER BY timeseriesid, bucket"""
+    else:
+      query = f"""SELECT timeseriesid, time_bucket(%s::interval, bucket) AS b, sum(avg * count) / sum(count), min(min), max(max), last(last, bucket)
+                  FROM {rollup.name} WHERE {ids} AND {bounds.format(column='bucket')}
+                  GROUP BY timeseriesid, b ORDER BY timeseriesid, b"""
+    try:
+      with self.postgres.cursor() as cur:
+        cur.execute(query, (bucket, list(timeseriesIds), bucket, start_time, bucket, end_time, bucket), prepare=True)
+        grouped = {id: [] for id in timeseriesIds}
+        for id, ts, avg, min_value, max_value, last in cur.fetchall():
+          grouped[id].append({'ts': ts.isoformat(), 'value': avg, 'min': min_value, 'max': max_value, 'last': last})
+        return [{'data': data, 'timeseriesid': id} for id, data in grouped.items()]
     except Exception as e:
       raise e
-  
-  def get_timeseries(self, timeseriesIds: List[str], start_time: str, end_time: str) -> List[dict]:
-    ids = ', '.join([f'\'{id}\'' for id in timeseriesIds])
-    query = f"SELECT * FROM timeseries WHERE timeseriesid IN ({ids}) AND ts >= %s AND ts <= %s ORDER BY ts ASC"
+
+  def get_timeseries_lttb(self, timeseriesIds: List[str], start_time: str, end_time: str, max_points: int) -> List[dict]:
+    """
+    Downsample each series to at most max_points raw readings with Largest-Triangle-Three-Buckets, which keeps
+    the visual shape of the series (spikes included) instead of smoothing it like an average would.
+    """
+    if max_points < 3:
+      raise ValueError("LTTB downsampling requires max_points of at least 3")
+    query = RAW_QUERY.format(ids=ids_condition(timeseriesIds))
     try:
       with self.postgres.cursor() as cur:
-        cur.execute(query, (start_time, end_time))
+        cur.execute(query, (list(timeseriesIds), start_time, end_time), prepare=True)
         rows = cur.fetchall()
-        result = []
-        for id in timeseriesIds:
-          data = [PointReading(ts=row[0].isoformat(), value=row[1], timeseriesid=row[2]).model_dump() for row in rows if row[2] == id]
-          result.append({'data': data, 'timeseriesid': id})
-        return result
     except Exception as e:
       raise e
-    
+    downsampled = {id: [] for id in timeseriesIds}
+    for id, epochs, values in group_series(rows):
+      kept = lttb(epochs, values, max_points)
+      downsampled[id] = [{'ts': ts, 'value': value, 'timeseriesid': id} for ts, value in zip(format_timestamps(epochs[kept]), values[kept].tolist())]
+    return [{'data': data, 'timeseriesid': id} for id, data in downsampled.items()]
+
   def get_latest_values(self, timeseriesIds: List[str]) -> List[PointReading]:
     """
     Get the most recent reading for a list of timeseriesIds. Limit to the last 30 minutes.
+
+    Each id is looked up with its own backwards scan of the (timeseriesid, ts DESC) index that stops at the
+    first row, instead of sorting every reading of the window.
     """
-    ids = ', '.join([f'\'{id}\'' for id in timeseriesIds])
-    query = f"SELECT DISTINCT ON (timeseriesid) * FROM timeseries WHERE timeseriesid IN ({ids}) AND ts >= NOW() - INTERVAL '30 minutes' ORDER BY timeseriesid, ts DESC"
+    query = """SELECT l.ts, l.value, l.timeseriesid FROM unnest(%s::text[]) AS ids(timeseriesid)
+               CROSS JOIN LATERAL (SELECT ts, value, timeseriesid FROM timeseries t WHERE t.timeseriesid = ids.timeseriesid
+                                   AND t.ts >= NOW() - INTERVAL '30 minutes' ORDER BY t.ts DESC LIMIT 1) l"""
     try:
       with self.postgres.cursor() as cur:
-        cur.execute(query)
+        cur.execute(query, (list(timeseriesIds),), prepare=True)
         return [PointReading(ts=row[0].isoformat(), value=row[1], timeseriesid=row[2]) for row in cur.fetchall()]
     except Exception as e:
       raise e
-    
-  def insert_timeseries(self, data: List[PointReading]) -> None:
+
+  def insert_timeseries(self, data: List[PointReading], dedup: bool = False) -> IngestStats:
     """
     Insert a list of timeseries data into the timeseries table.
     """
-    query = "INSERT INTO timeseries (ts, value, timeseriesid) VALUES (%s, %s, %s)"
-    values = [(reading.ts, reading.value, reading.timeseriesid) for reading in data]
+    return self.insert_batch(PointReadingBatch.from_readings(data), dedup=dedup)
+
+  def copy_timeseries(self, ts: Sequence, values: Sequence[float], timeseriesids: Sequence[str], dedup: bool = False) -> IngestStats:
+    """
+    Bulk load column arrays into the timeseries table. Timestamps may be epoch seconds, datetimes or
+    ISO-8601 strings, naive ones are treated as UTC.
+    """
+    return self.insert_batch(PointReadingBatch.from_columns(ts, values, timeseriesids), dedup=dedup)
+
+  def insert_batch(self, batch: PointReadingBatch, dedup: bool = False) -> IngestStats:
+    """
+    Bulk load a columnar batch into the timeseries table with a binary COPY.
+
+    When dedup is set the rows are copied into a temporary staging table first and only rows whose
+    (timeseriesid, ts) pair is not already stored are moved into the hypertable. With notify_latest the
+    newest stored reading of every series is announced on the LATEST_CHANNEL for latest value caches.
+    """
+    start = time.perf_counter()
+    if len(batch) == 0:
+      return IngestStats(rows=0, seconds=0.0)
+    target = 'timeseries_staging' if dedup else 'timeseries'
     try:
-      with self.postgres.cursor() as cur:
-        cur.executemany(query, values)
-        cur.execute('COMMIT')
+      with self.postgres.cursor() as cur: # Commits when the block exits
+        if dedup:
+          cur.execute('CREATE TEMP TABLE IF NOT EXISTS timeseries_staging (LIKE timeseries) ON COMMIT DELETE ROWS')
+        with cur.copy(f'COPY {target} (ts, value, timeseriesid) FROM STDIN (FORMAT BINARY)') as copy:
+          copy.write(encode_copy_binary(batch))
+        if dedup:
+          cur.execute("""INSERT INTO timeseries (ts, value, timeseriesid)
+                        SELECT DISTINCT ON (s.timeseriesid, s.ts) s.ts, s.value, s.timeseriesid FROM timeseries_staging s
+                        WHERE NOT EXISTS (SELECT 1 FROM timeseries t WHERE t.timeseriesid = s.timeseriesid AND t.ts = s.ts)
+                        RETURNING extract(epoch FROM ts)::float8, value, timeseriesid""")
+          inserted = PointReadingBatch()
+          for ts, value, id in cur.fetchall():
+            inserted.append(ts, value, id)
+        else:
+          inserted = batch
+        if self.notify_latest:
+          # Only the rows that were stored, a duplicate skipped by dedup is not a new reading
+          for payload in latest_payloads(inserted):
+            cur.execute('SELECT pg_notify(%s, %s)', (LATEST_CHANNEL, payload)) # Delivered when the transaction commits
+      return IngestStats(rows=len(inserted), seconds=time.perf_counter() - start)
     except Exception as e:
-      raise e
\ No newline at end of file
+      raise e
+
+RAW_QUERY = "SELECT timeseriesid, extract(epoch FROM ts)::float8, value FROM timeseries WHERE {ids} AND ts >= %s AND ts <= %s ORDER BY timeseriesid, ts"
+UNNEST_THRESHOLD = 1000 # Id sets larger than this are joined through unnest instead of tested with = ANY
+
+def ids_condition(timeseriesIds: Sequence[str]) -> str:
+  """
+  The condition matching timeseriesid against an array parameter. Ids are always bound as one text[]
+  parameter, so the query text, and with it the prepared statement, is the same whichever ids are asked for.
+  Large sets go through an unnest semi-join the planner can hash instead of testing every row against the
+  whole array.
+  """
+  if len(timeseriesIds) > UNNEST_THRESHOLD:
+    return 'timeseriesid IN (SELECT unnest(%s::text[]))'
+  return 'timeseriesid = ANY(%s)'
+
+SERIES_ROW = np.dtype([('timeseriesid', object), ('epoch', np.float64), ('value', np.float64)])
+
+def group_series(rows: Sequence[tuple] | np.ndarray) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+  """
+  Split (timeseriesid, epoch seconds, value) rows ordered by timeseriesid into one (timeseriesid, epochs,
+  values) group per series. The rows are loaded into one record array and the series boundaries are found
+  with a single vectorized comparison.
+  """
+  if len(rows) == 0:
+    return
+  table = rows if isinstance(rows, np.ndarray) else np.array(rows, dtype=SERIES_ROW)
+  ids = table['timeseriesid']
+  bounds = [0, *(np.flatnonzero(ids[1:] != ids[:-1]) + 1).tolist(), len(table)]
+  for start, end in zip(bounds, bounds[1:]):
+    yield ids[start], table['epoch'][start:end], table['value'][start:end]
+
+def format_timestamps(epochs: np.ndarray) -> List[str]:
+  """
+  ISO-8601 UTC strings for epoch seconds, formatted in one vectorized call. Fractions of a second are only
+  written when some timestamp has one.
+  """
+  micros = np.rint(epochs * 1e6).astype('datetime64[us]')
+  unit = 'us' if (micros.astype(np.int64) % 1_000_000).any() else 's'
+  return np.char.add(np.datetime_as_string(micros, unit=unit), '+00:00').tolist()
+
+def assemble_series(rows: Sequence[tuple], timeseriesIds: List[str], columnar: bool = False) -> List[dict]:
+  """
+  Build the history response from (timeseriesid, epoch seconds, value) rows ordered by timeseriesid.
+  Series without readings get empty data.
+  """
+  series = {id: {'ts': [], 'value': []} if columnar else [] for id in timeseriesIds}
+  for id, epochs, values in group_series(rows):
+    timestamps = format_timestamps(epochs)
+    if columnar:
+      series[id] = {'ts': timestamps, 'value': values.tolist()}
+    else:
+      series[id] = [{'ts': ts, 'value': value, 'timeseriesid': id} for ts, value in zip(timestamps, values.tolist())]
+  return [{'data': data, 'timeseriesid': id} for id, data in series.items()]
+
+def bucket_width(start_time: str | datetime, end_time: str | datetime, max_points: int) -> timedelta:
+  """
+  The narrowest whole-second bucket that splits the range into at most max_points buckets. Naive bounds
+  are UTC, an unparseable one raises ValueError.
+  """
+  span = to_epoch(end_time) - to_epoch(start_time)
+  return timedelta(seconds=max(1, math.ceil(span / max_points)))
+
+POLICIES = {
+  # kind: (job proc name, config key holding the interval, add function, remove function)
+  'compression': ('policy_compression', 'compress_after', 'add_compression_policy', 'remove_compression_policy'),
+  'retention': ('policy_retention', 'drop_after', 'add_retention_policy', 'remove_retention_policy'),
+  'refresh': ('policy_refresh_continuous_aggregate', 'start_offset', 'add_continuous_aggregate_policy', 'remove_continuous_aggregate_policy'),
+}
+
+INTERVAL_UNITS = {
+  **dict.fromkeys(['s', 'sec', 'secs', 'second', 'seconds'], 1),
+  **dict.fromkeys(['m', 'min', 'mins', 'minute', 'minutes'], 60),
+  **dict.fromkeys(['h', 'hr', 'hrs', 'hour', 'hours'], 3600),
+  **dict.fromkeys(['d', 'day', 'days'], 86400),
+  **dict.fromkeys(['w', 'week', 'weeks'], 604800),
+}
+
+def parse_interval(interval: str) -> timedelta | None:
+  """
+  Parse simple fixed width intervals like '15 minutes' or '1h'. Returns None for anything else, such as
+  calendar intervals like '1 month' whose width varies.
+  """
+  match = re.fullmatch(r'\s*(\d+)\s*([a-z]+)\s*', interval.lower())
+  if not match or match.group(2) not in INTERVAL_UNITS:
+    return None
+  return timedelta(seconds=int(match.group(1)) * INTERVAL_UNITS[match.group(2)])
+
+LATEST_CHANNEL = 'timeseries_latest'
+NOTIFY_PAYLOAD_LIMIT = 7900 # Postgres rejects NOTIFY payloads of 8000 bytes or more
+
+def latest_payloads(batch: PointReadingBatch) -> Iterator[str]:
+  """
+  The newest reading per series of a batch as JSON arrays of [timeseriesid, epoch seconds, value], split so
+  that every payload fits in one NOTIFY.
+  """
+  ids, ts, values = batch.latest()
+  parts, size = [], 2
+  for id, t, value in zip(ids, ts.tolist(), values.tolist()):
+    part = json.dumps([id, t, value])
+    if parts and size + len(part) + 1 > NOTIFY_PAYLOAD_LIMIT:
+      yield '[' + ','.join(parts) + ']'
+      parts, size = [], 2
+    parts.append(part)
+    size += len(part) + 1
+  if parts:
+    yield '[' + ','.join(parts) + ']'
+
+def encode_copy_binary(batch: PointReadingBatch) -> bytes:
+  """
+  Encode a batch as a binary COPY stream of (ts timestamptz, value float8, timeseriesid text) tuples.
+
+  Rows are grouped by timeseries id so that every row in a group has the same width and the whole group
+  can be laid out as one packed numpy record array instead of being written tuple by tuple.
+  """
+  ts, values, codes = batch.columns()
+  micros = np.rint((ts - PG_EPOCH) * 1e6).astype('>i8')
+  values = values.astype('>f8')
+  order = np.argsort(codes, kind='stable')
+  groups = np.split(order, np.flatnonzero(np.diff(codes[order])) + 1)
+
+  parts = [COPY_HEADER]
+  for group in groups:
+    name = batch.ids[codes[group[0]]].encode()
+    fields = [('count', '>i2'), ('ts_len', '>i4'), ('ts', '>i8'), ('value_len', '>i4'), ('value', '>f8'), ('id_len', '>i4')]
+    if name:
+      fields.append(('id', f'S{len(name)}'))
+    rows = np.empty(len(group), dtype=fields)
+    rows['count'] = 3
+    rows['ts_len'] = 8
+    rows['ts'] = micros[group]
+    rows['value_len'] = 8
+    rows['value'] = values[group]
+    rows['id_len'] = len(name)
+    if name:
+      rows['id'] = name
+    parts.append(rows.tobytes())
+  parts.append(COPY_TRAILER)
+  return b''.join(parts)
@@ -1,13 +1,20 @@
 from pgvector.psycopg import register_vector
 import json
+import struct
+import time
 import numpy as np
 import os
 from typing import List
 from ..postgres import Postgres
+from ..copy_binary import IngestStats, COPY_HEADER, COPY_TRAILER
 from .vector_store import VectorStore
 from ..embeddings.embeddings import Embeddings
 from openoperator.domain.model.document import DocumentMetadataChunk, DocumentMetadata
 
+INDEX_METHODS = {'hnsw', 'ivfflat', None}
+HNSW_DEFAULT_EF_SEARCH = 40 # pgvector's default for hnsw.ef_search
+FILTER_COLUMNS = ('portfolio_uri', 'facility_uri', 'document_uri') # Metadata keys kept in indexed columns
+
 class PGVectorStore(VectorStore):
   """
   PG Vector Store is a vector store that uses Postgres to store text embeddings.
@@ -16,21 +23,61 @@ class PGVectorStore(VectorStore):
   - Create text embeddings for documents and upload to the vector store
   - Search the vector store for similar documents
   """
-  def __init__(self, postgres: Postgres, embeddings: Embeddings, collection_name: str | None = None) -> None:
+  def __init__(
+    self,
+    postgres: Postgres,
+    embeddings: Embeddings,
+    collection_name: str | None = None,
+    migrate: bool = True,
+    index: str | None = 'hnsw',
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int = 100,
+    ef_search: int | None = None,
+    probes: int | None = None,
+    iterative_scan: str | None = 'relaxed_order',
+    text_search_config: str = 'english',
+  ) -> None:
+    """
+    index is the approximate nearest neighbour index on the embeddings, 'hnsw', 'ivfflat' or None for exact
+    scans. m and ef_construction shape an HNSW graph, lists the clusters of an IVFFlat index. ef_search and
+    probes are the default search settings, None leaves the server's. iterative_scan is the pgvector (0.8+)
+    mode for filtered searches, 'relaxed_order', 'strict_order' or None to turn it off. text_search_config is
+    the Postgres text search configuration of the lexical index.
+    """
     if collection_name is None:
       collection_name = os.environ['POSTGRES_EMBEDDINGS_TABLE']
+    if index not in INDEX_METHODS:
+      raise ValueError(f"Unknown vector index {index}, expected 'hnsw', 'ivfflat' or None")
     self.postgres = postgres
     self.embeddings = embeddings
+    self.collection_name = collection_name
+    self.index = index
+    self.m = m
+    self.ef_construction = ef_construction
+    self.lists = lists
+    self.ef_search = ef_search
+    self.probes = probes
+    self.iterative_scan = iterative_scan
+    self.text_search_config = text_search_config
+    if migrate:
+      self.migrate()
+    self.postgres.configure(register_vector) # Every pooled connection needs the vector type adapters, which need the extension
 
-    try:
-      # Connect to postgres
-      self.collection_name = collection_name
+  def migrate(self) -> None:
+    """
+    Make sure pgvector is installed and the table and its vector index are created. An existing index is
+    kept as it is, rebuild it with create_index to change its parameters.
 
-      # Make sure pgvector is installed and table is created
-      self.postgres.conn.autocommit = True
+    The FILTER_COLUMNS are generated from the metadata and indexed, so scoping a search or a delete to a
+    facility or a document reads that facility's or document's rows only. Adding them to an existing table
+    fills them in for the rows already there. The same goes for content_tsv, the full text search vector of
+    the content, which has a GIN index for hybrid_search.
+    """
+    collection_name = self.collection_name
+    try:
       with self.postgres.cursor() as cur:
         cur.execute('CREATE EXTENSION IF NOT EXISTS vector')
-        register_vector(self.postgres.conn)
 
         # Check if table exists
         cur.execute(f'SELECT EXISTS (SELECT FROM pg_tables WHERE tablename = \'{collection_name}\')')
@@ -39,82 +86,260 @@ class PGVectorStore(VectorStore):
         # Create table if it doesn't exist
         if not exists:
           cur.execute(f'CREATE TABLE {collection_name} (id bigserial PRIMARY KEY, content text, metadata jsonb, embedding vector(1536));')
+
+        for column in FILTER_COLUMNS:
+          cur.execute(f"ALTER TABLE {collection_name} ADD COLUMN IF NOT EXISTS {column} text GENERATED ALWAYS AS (metadata->>'{column}') STORED")
+          cur.execute(f'CREATE INDEX IF NOT EXISTS {collection_name}_{column}_idx ON {collection_name} ({column})')
+
+        cur.execute(f"ALTER TABLE {collection_name} ADD COLUMN IF NOT EXISTS content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('{self.text_search_config}', coalesce(content, ''))) STORED")
+        cur.execute(f'CREATE INDEX IF NOT EXISTS {collection_name}_content_tsv_idx ON {collection_name} USING gin (content_tsv)')
+
+        if self.index is not None:
+          cur.execute(self.index_statement(self.index, if_not_exists=True))
     except Exception as e:
       raise e
 
-  def add_documents(self, documents: List[DocumentMetadataChunk]) -> None:
+  @property
+  def index_name(self) -> str:
+    return f'{self.collection_name}_embedding_idx'
+
+  def index_statement(self, method: str, if_not_exists: bool = False, concurrently: bool = False) -> str:
+    if method == 'hnsw':
+      options = f'm = {int(self.m)}, ef_construction = {int(self.ef_construction)}'
+    elif method == 'ivfflat':
+      options = f'lists = {int(self.lists)}'
+    else:
+      raise ValueError(f"Unknown vector index {method}, expected 'hnsw' or 'ivfflat'")
+    return (f'CREATE INDEX {"CONCURRENTLY " if concurrently else ""}{"IF NOT EXISTS " if if_not_exists else ""}{self.index_name} '
+            f'ON {self.collection_name} USING {method} (embedding vector_cosine_ops) WITH ({options})')
+
+  def create_index(self, method: str = 'hnsw', m: int | None = None, ef_construction: int | None = None, lists: int | None = None, concurrently: bool = False) -> float:
     """
-    Creates text embeddings for a list of documents and uploads them to the vector store.
+    Replace the vector index, returning the seconds the build took. IVFFlat learns its lists from the rows in
+    the table, so build it after loading the documents. With concurrently the old index keeps serving
+    searches and writes are not blocked while the new one is built.
     """
+    self.index = method
+    self.m = m or self.m
+    self.ef_construction = ef_construction or self.ef_construction
+    self.lists = lists or self.lists
+    statement = self.index_statement(method, concurrently=concurrently)
+    start = time.perf_counter()
+    with self.postgres.connection() as conn:
+      if concurrently: # Concurrent index builds can not run in a transaction
+        conn.autocommit = True
+        try:
+          conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {self.index_name}')
+          conn.execute(statement)
+        finally:
+          conn.autocommit = False
+      else:
+        conn.execute(f'DROP INDEX IF EXISTS {self.index_name}')
+        conn.execute(statement)
+    return time.perf_counter() - start
+
+  def drop_index(self) -> None:
+    """
+    Drop the vector index, searches become exact scans.
+    """
+    self.index = None
     with self.postgres.cursor() as cur:
-      # Create the embeddings
-      docs = [doc.content for doc in documents]
-      embeddings = self.embeddings.create_embeddings(docs)
-      
-      # Insert into postgrs
-      for i, doc in enumerate(documents):
-        text = doc.content
-        metadata = json.dumps(doc.metadata)
-        embedding = np.array(embeddings[i].embedding)
-
-        cur.execute(f'INSERT INTO {self.collection_name} (content, metadata, embedding) VALUES (%s, %s, %s)', (text, metadata, embedding))
+      cur.execute(f'DROP INDEX IF EXISTS {self.index_name}')
+
+  def add_documents(self, documents: List[DocumentMetadataChunk]) -> IngestStats:
+    """
+    Creates text embeddings for a list of documents and uploads them to the vector store with one binary
+    COPY in a single transaction. The returned stats time the upload, not the embeddings.
+    """
+    if not documents:
+      return IngestStats(rows=0, seconds=0.0)
+    # Create the embeddings
+    embeddings = self.embeddings.create_embeddings([doc.content for doc in documents])
+    matrix = np.array([embedding.embedding for embedding in embeddings], dtype=np.float32)
+
+    start = time.perf_counter()
+    data = encode_vector_copy([doc.content for doc in documents], [doc.metadata for doc in documents], matrix)
+    with self.postgres.cursor() as cur: # Commits when the block exits
+      with cur.copy(f'COPY {self.collection_name} (content, metadata, embedding) FROM STDIN (FORMAT BINARY)') as copy:
+        copy.write(data)
+    return IngestStats(rows=len(documents), seconds=time.perf_counter() - start)
     
-  def similarity_search(self, query: str, limit: int, filter: dict | None = None) -> list[DocumentMetadataChunk]:
+  def similarity_search(self, query: str, limit: int, filter: dict | None = None, ef_search: int | None = None, probes: int | None = None) -> list[DocumentMetadataChunk]:
     """
     Search for similar documents in the vector store.
     """
     # Get embedding from OpenAI
     embeddings = self.embeddings.create_embeddings(texts=[query])
     embedding = np.array(embeddings[0].embedding)
+    return self.search_by_vector(embedding, limit, filter=filter, ef_search=ef_search, probes=probes)
+
+  def search_settings(self, limit: int, ef_search: int | None = None, probes: int | None = None, filtered: bool = False) -> dict:
+    """
+    Index search settings for one query, on top of the store's defaults. HNSW never returns more than
+    ef_search rows, so it is raised to the limit. A filtered search keeps scanning the index until it has
+    limit matching rows, instead of returning the few of the first ef_search candidates that match.
+    """
+    ef_search = ef_search or self.ef_search
+    probes = probes or self.probes
+    settings = {}
+    if self.index == 'hnsw' and (ef_search or limit > HNSW_DEFAULT_EF_SEARCH):
+      settings['hnsw.ef_search'] = max(ef_search or HNSW_DEFAULT_EF_SEARCH, limit)
+    if self.index == 'ivfflat' and probes:
+      settings['ivfflat.probes'] = probes
+    if self.index is not None and filtered and self.iterative_scan:
+      settings[f'{self.index}.iterative_scan'] = self.iterative_scan
+    return settings
+
+  def where_clause(self, filter: dict) -> tuple[str, list]:
+    """
+    SQL conditions and parameters of a metadata filter. Keys in FILTER_COLUMNS use their indexed column.
+    """
+    conditions, params = [], []
+    for key, value in filter.items():
+      if key in FILTER_COLUMNS:
+        conditions.append(f'{key} = %s')
+      else:
+        conditions.append('metadata->>%s = %s')
+        params.append(key)
+      params.append(str(value))
+    return ' AND '.join(conditions), params
+
+  def search_by_vector(self, embedding: np.ndarray, limit: int, filter: dict | None = None, ef_search: int | None = None, probes: int | None = None) -> list[DocumentMetadataChunk]:
+    """
+    The chunks nearest to an embedding. ef_search (HNSW) and probes (IVFFlat) trade speed for recall, they
+    only apply to this query.
+
+    With a filter the planner picks between the vector index, scanned iteratively until enough rows match,
+    and the filter column's btree index followed by an exact sort, which is faster for a small facility.
+    """
+    where, filter_params = self.where_clause(filter or {})
+    query = f"SELECT content, metadata, embedding <=> %s AS distance FROM {self.collection_name}"
+    if where:
+      query += f" WHERE {where}"
+    query += " ORDER BY distance LIMIT %s"
+    params = [embedding, *filter_params, limit]
+
+    settings = self.search_settings(limit, ef_search, probes, filtered=bool(where))
+    if 'relaxed_order' in settings.values(): # Relaxed iterative scans can return rows slightly out of order
+      query = f"WITH results AS MATERIALIZED ({query}) SELECT content, metadata, distance FROM results ORDER BY distance"
 
-    # Prepare base SQL query
-    query  = f"SELECT content, metadata FROM {self.collection_name} "
-    params = []
-
-    # Add filter to query
-    if filter is not None:
-      query += " WHERE "
-      for i, (key, value) in enumerate(filter.items()):
-        # Ensure the value is a string
-        value_str = str(value)
-        query += f"metadata->>'{key}' = %s"
-        params.append(value_str)
-        if i != len(filter) - 1:
-          query += " AND "
-
-    query += " ORDER BY embedding <=> %s LIMIT %s"
-    params.append(embedding)
-    params.append(limit)
-    
     # Query postgres
     with self.postgres.cursor() as cur:
-      register_vector(self.postgres.conn)
+      for name, value in settings.items():
+        cur.execute("SELECT set_config(%s, %s, true)", (name, str(value))) # Local to this transaction
       records = cur.execute(query, params).fetchall()
-      
-      # Convert the list of tuples to a list of dicts
-      data = [DocumentMetadataChunk(content=record[0], metadata=DocumentMetadata(
-        filename=record[1]['filename'],
-        portfolio_uri=record[1]['portfolio_uri'],
-        facility_uri=record[1]['facility_uri'],
-        document_uri=record[1]['document_uri'] if 'document_uri' in record[1] else None,
-        document_url=record[1]['document_url'] if 'document_url' in record[1] else None,
-        filetype=record[1]['filetype'] if 'filetype' in record[1] else None,
-        page_number=record[1]['page_number'] if 'page_number' in record[1] else None, 
-      )) for record in records]
-
-      return data
+      return [to_chunk(record) for record in records]
+
+  def hybrid_search(
+    self,
+    query: str,
+    limit: int,
+    filter: dict | None = None,
+    vector_weight: float = 1.0,
+    lexical_weight: float = 1.0,
+    rrf_k: int = 60,
+    candidates: int | None = None,
+    ef_search: int | None = None,
+    probes: int | None = None,
+  ) -> list[DocumentMetadataChunk]:
+    """
+    Search with both the embedding and the words of the query, fused with reciprocal rank fusion.
+
+    The candidates nearest to the query embedding and the candidates that best match its words, as ranked
+    by ts_rank_cd, each score weight / (rrf_k + rank), summed for chunks found by both. Exact terms like
+    equipment tags that embeddings blur together rank high lexically. Any of the query's words can match,
+    chunks with more of them rank higher. A zero weight leaves that side out, without embedding the query
+    when it is the vector side. Everything runs in one query.
+    """
+    if vector_weight <= 0 and lexical_weight <= 0:
+      raise ValueError("At least one of vector_weight and lexical_weight must be positive")
+    candidates = max(candidates or limit * 4, limit)
+    where, filter_params = self.where_clause(filter or {})
+    ctes, ranked, params = [], [], []
+
+    if vector_weight > 0:
+      embeddings = self.embeddings.create_embeddings(texts=[query])
+      embedding = np.array(embeddings[0].embedding)
+      ctes.append(f"""vector_candidates AS (
+        SELECT id, embedding <=> %s AS distance FROM {self.collection_name}{f" WHERE {where}" if where else ""}
+        ORDER BY distance LIMIT %s
+      )""")
+      ranked.append("SELECT id, %s::float8 / (%s + row_number() OVER (ORDER BY distance)) AS score FROM vector_candidates")
+      params += [embedding, *filter_params, candidates]
+
+    if lexical_weight > 0:
+      ctes.append(f"""lexical_query AS (
+        SELECT replace(plainto_tsquery(%s::regconfig, %s)::text, ' & ', ' | ')::tsquery AS terms
+      ), lexical_candidates AS (
+        SELECT id, ts_rank_cd(content_tsv, terms) AS rank FROM {self.collection_name}, lexical_query
+        WHERE content_tsv @@ terms{f" AND {where}" if where else ""} ORDER BY rank DESC LIMIT %s
+      )""")
+      ranked.append("SELECT id, %s::float8 / (%s + row_number() OVER (ORDER BY rank DESC)) AS score FROM lexical_candidates")
+      params += [self.text_search_config, query, *filter_params, candidates]
+
+    weights = ([vector_weight, rrf_k] if vector_weight > 0 else []) + ([lexical_weight, rrf_k] if lexical_weight > 0 else [])
+    sql = f"""WITH {', '.join(ctes)}
+      SELECT content, metadata, fused.score FROM (
+        SELECT id, sum(score) AS score FROM ({' UNION ALL '.join(ranked)}) ranked GROUP BY id
+      ) fused JOIN {self.collection_name} USING (id) ORDER BY fused.score DESC LIMIT %s"""
+    params += [*weights, limit]
+
+    with self.postgres.cursor() as cur:
+      settings = self.search_settings(candidates, ef_search, probes, filtered=bool(where)) if vector_weight > 0 else {}
+      for name, value in settings.items():
+        cur.execute("SELECT set_config(%s, %s, true)", (name, str(value))) # Local to this transaction
+      records = cur.execute(sql, params).fetchall()
+      return [to_chunk(record) for record in records]
 
   def delete_documents(self, filter: dict) -> None:
     """
     Deletes documents from the vector store.
     """
+    where, params = self.where_clause(filter)
+    if not where:
+      raise ValueError("Refusing to delete documents without a filter")
     with self.postgres.cursor() as cur:
-      query = f"DELETE FROM {self.collection_name} WHERE "
-      params = []
-      for i, (key, value) in enumerate(filter.items()):
-        query += f"metadata->>'{key}' = %s"
-        params.append(str(value))
-        if i != len(filter) - 1:
-          query += " AND "
-      
-      cur.execute(query, params)
\ No newline at end of file
+      cur.execute(f"DELETE FROM {self.collection_name} WHERE {where}", params)
+
+def to_chunk(record: tuple) -> DocumentMetadataChunk:
+  """
+  A chunk from a (content, metadata, ...) row.
+  """
+  metadata = record[1]
+  return DocumentMetadataChunk(content=record[0], metadata=DocumentMetadata(
+    filename=metadata['filename'],
+    portfolio_uri=metadata['portfolio_uri'],
+    facility_uri=metadata['facility_uri'],
+    document_uri=metadata['document_uri'] if 'document_uri' in metadata else None,
+    document_url=metadata['document_url'] if 'document_url' in metadata else None,
+    filetype=metadata['filetype'] if 'filetype' in metadata else None,
+    page_number=metadata['page_number'] if 'page_number' in metadata else None,
+  ))
+
+def encode_vector_copy(contents: List[str], metadata: List[dict], matrix: np.ndarray) -> bytes:
+  """
+  Encode rows of (content text, metadata jsonb, embedding vector) as a binary COPY stream.
+
+  The embedding fields, pgvector's binary format of a dimension and big-endian float32s, all have the same
+  width and are laid out for every row at once from the float32 matrix. Only the text fields are encoded
+  row by row.
+  """
+  rows, dim = matrix.shape
+  vectors = np.empty(rows, dtype=[('len', '>i4'), ('dim', '>i2'), ('unused', '>i2'), ('values', '>f4', (dim,))])
+  vectors['len'] = 4 + 4 * dim
+  vectors['dim'] = dim
+  vectors['unused'] = 0
+  vectors['values'] = matrix
+  vector_bytes = memoryview(vectors.tobytes())
+  width = vectors.dtype.itemsize
+
+  parts = [COPY_HEADER]
+  for i, (content, meta) in enumerate(zip(contents, metadata)):
+    text = content.encode()
+    meta = json.dumps(meta).encode()
+    parts.append(struct.pack(f'>hi{len(text)}si', 3, len(text), text, len(meta) + 1))
+    parts.append(b'\x01') # jsonb binary format version
+    parts.append(meta)
+    parts.append(vector_bytes[i * width:(i + 1) * width])
+  parts.append(COPY_TRAILER)
+  return b''.join(parts)
@@ -28,4 +28,10 @@ class VectorStore(ABC):
   def similarity_search(self, query: str, limit: int, filter: dict | None = None) -> list:
     """
     Search for similar documents in the vector store.
-    """
\ No newline at end of file
+    """
+  def hybrid_search(self, query: str, limit: int, filter: dict | None = None, vector_weight: float = 1.0, lexical_weight: float = 1.0) -> list:
+    """
+    Search with both the embedding and the words of the query. Stores without lexical search fall back to
+    similarity_search.
+    """
+    return self.similarity_search(query=query, limit=limit, filter=filter)
@@ -1,5 +1,9 @@
-from typing import List
+from typing import AsyncIterator, Callable, Iterable, List, TypeVar
 from urllib.parse import quote
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import partial
+import asyncio
+import os
 from sklearn.cluster import DBSCAN
 from sklearn.neighbors import NearestNeighbors
 from kneed import KneeLocator
@@ -62,4 +66,73 @@ def dbscan_cluster(x):
   print(f"Estimated number of clusters: {n_clusters_}")
   print(f"Estimated number of noise points: {n_noise_}")
 
-  return labels
\ No newline at end of file
+  return labels
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+  """
+  Largest-Triangle-Three-Buckets downsampling. Returns the indices of the points to keep.
+
+  The first and last points are always kept. The points in between are split into threshold - 2 buckets
+  and from each bucket the point forming the largest triangle with the previously kept point and the mean
+  of the next bucket is kept, which preserves peaks and troughs far better than averaging.
+  """
+  n = len(x)
+  if threshold >= n or threshold < 3:
+    return np.arange(n)
+  x = np.asarray(x, dtype=np.float64)
+  y = np.asarray(y, dtype=np.float64)
+  edges = (np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)) + 1).astype(np.int64)
+  edges = np.append(edges, n) # The last "bucket" is the final point on its own
+  kept = np.empty(threshold, dtype=np.int64)
+  kept[0] = 0
+  kept[-1] = n - 1
+  a = 0
+  for i in range(threshold - 2):
+    start, end = edges[i], edges[i + 1]
+    next_start, next_end = edges[i + 1], edges[i + 2]
+    cx = x[next_start:next_end].mean()
+    cy = y[next_start:next_end].mean()
+    areas = np.abs((x[a] - cx) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (cy - y[a]))
+    a = start + int(np.argmax(areas))
+    kept[i + 1] = a
+  return kept
+
+T = TypeVar('T')
+
+# Blocking calls made from the event loop run here, so a burst of slow calls queues up instead of starting
+# an unbounded number of threads or exhausting the connection pools behind them.
+blocking_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('BLOCKING_THREADS', 32)), thread_name_prefix='blocking')
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+  """
+  Run a synchronous call on the bounded blocking executor without stalling the event loop.
+  """
+  return await asyncio.get_running_loop().run_in_executor(blocking_executor, partial(func, *args, **kwargs))
+
+async def iterate_blocking(iterable: Iterable[T]) -> AsyncIterator[T]:
+  """
+  Iterate a synchronous iterator, like a streaming response, with every step on the blocking executor.
+  When the iteration stops early, like a client disconnecting, the iterator is closed on the executor too,
+  so a generator releases its cursor and connection right away instead of whenever it is collected.
+  """
+  iterator = iter(iterable)
+  done = object()
+  step = None
+  try:
+    while True:
+      step = blocking_executor.submit(next, iterator, done)
+      item = await asyncio.wrap_future(step)
+      if item is done:
+        return
+      yield item
+  finally:
+    if hasattr(iterator, 'close'):
+      await run_blocking(close_after, step, iterator)
+
+def close_after(step: Future | None, iterator) -> None:
+  """
+  Close an iterator once its last step is done, a cancelled await leaves the step running.
+  """
+  if step is not None:
+    wait([step])
+  iterator.close()
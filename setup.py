@@ -25,6 +25,7 @@ setup(name='openoperator',
         'fastapi',
         'uvicorn',
         'psycopg',
+        'psycopg-pool',
         'pydantic',
         'tiktoken',
         'unstructured-client',
@@ -0,0 +1,69 @@
+import unittest
+import time
+from openoperator.application.api.container import Container, ComponentUnavailable, component
+
+class FakeContainer(Container):
+  migrations = ['database']
+
+  def __init__(self):
+    super().__init__()
+    self.builds = []
+    self.fail_database = False
+    self.healthy = True
+
+  @component
+  def database(self):
+    self.builds.append('database')
+    if self.fail_database:
+      raise ConnectionError("refused")
+    time.sleep(0.05)
+    return type('Database', (), {'migrated': False, 'migrate': lambda db: setattr(db, 'migrated', True)})()
+
+  @database.health
+  def database(self, database):
+    if not self.healthy:
+      raise ConnectionError("lost")
+
+  @component
+  def service(self):
+    self.builds.append('service')
+    return ('service', self.database)
+
+class TestContainer(unittest.TestCase):
+  def setUp(self) -> None:
+    self.container = FakeContainer()
+
+  def test_lazy_singletons(self):
+    self.assertEqual(self.container.builds, [])
+    service = self.container.service
+    self.assertIs(self.container.service, service)
+    self.assertIs(service[1], self.container.database)
+    self.assertEqual(self.container.builds, ['service', 'database'])
+    # Startup time of a component does not include its dependencies
+    self.assertGreaterEqual(self.container.startup_times['database'], 0.05)
+    self.assertLess(self.container.startup_times['service'], 0.05)
+
+  def test_failed_build_is_retried(self):
+    self.container.fail_database = True
+    with self.assertRaises(ComponentUnavailable) as context:
+      self.container.service
+    self.assertIn("database is unavailable: refused", str(context.exception))
+    self.assertNotIn('service', self.container.instances)
+    self.container.fail_database = False
+    self.assertEqual(self.container.service[0], 'service')
+
+  def test_health(self):
+    self.assertEqual(self.container.health(), {'database': {'status': 'not started'}, 'service': {'status': 'not started'}})
+    self.container.service
+    self.container.healthy = False
+    report = self.container.health()
+    self.assertEqual(report['database']['status'], 'unhealthy')
+    self.assertEqual(report['database']['error'], 'lost')
+    self.assertEqual(report['service']['status'], 'ok')
+    self.assertIn('startup_seconds', report['service'])
+
+  def test_migrate(self):
+    durations = self.container.migrate()
+    self.assertEqual(list(durations), ['database'])
+    self.assertTrue(self.container.database.migrated)
+    self.assertNotIn('service', self.container.instances)
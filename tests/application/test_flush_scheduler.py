@@ -0,0 +1,63 @@
+import unittest
+import asyncio
+from openoperator.application.mqtt.flush_scheduler import FlushScheduler
+from openoperator.application.mqtt.metrics import LatencyHistogram
+
+class TestFlushScheduler(unittest.IsolatedAsyncioTestCase):
+  async def asyncSetUp(self) -> None:
+    self.flushed = []
+    self.release = asyncio.Event()
+    self.release.set()
+
+    async def flush(batch):
+      await self.release.wait()
+      self.flushed.append(list(batch.values))
+
+    self.scheduler = FlushScheduler(flush=flush, batch_size=3, flush_interval=60, flush_bytes=100)
+
+  def add(self, values: list, nbytes: int):
+    for value in values:
+      self.scheduler.buffer.append(0, value, 'id')
+    self.scheduler.added(nbytes)
+
+  async def test_triggers(self):
+    self.assertIsNone(self.scheduler.timeout())
+    self.add([1, 2], 10)
+    self.assertIsNone(self.scheduler.trigger())
+    self.assertGreater(self.scheduler.timeout(), 0)
+    self.add([3], 10)
+    self.assertEqual(self.scheduler.trigger(), "size")
+    await self.scheduler.swap()
+    self.add([4], 100)
+    self.assertEqual(self.scheduler.trigger(), "bytes")
+    self.scheduler.deadline = 0
+    self.scheduler.buffer_bytes = 0
+    self.assertEqual(self.scheduler.trigger(), "age")
+
+  async def test_fills_new_buffer_while_flushing(self):
+    self.release.clear()
+    self.add([1, 2, 3], 0)
+    await self.scheduler.swap()
+    # The first batch is still in flight, the writer keeps adding to a fresh buffer
+    self.add([4], 0)
+    self.assertEqual(list(self.scheduler.buffer.values), [4])
+    self.assertEqual(self.flushed, [])
+    self.release.set()
+    await self.scheduler.drain()
+    self.assertEqual(self.flushed, [[1, 2, 3], [4]])
+
+class TestLatencyHistogram(unittest.TestCase):
+  def test_snapshot(self):
+    histogram = LatencyHistogram()
+    for seconds in [0.001, 0.02, 0.02, 0.3, 20]:
+      histogram.observe(seconds)
+    snapshot = histogram.snapshot()
+    self.assertEqual(snapshot["count"], 5)
+    self.assertEqual(snapshot["buckets"]["le_0.005"], 1)
+    self.assertEqual(snapshot["buckets"]["le_0.025"], 3)
+    self.assertEqual(snapshot["buckets"]["le_inf"], 5)
+    self.assertEqual(snapshot["p50"], 0.025)
+    self.assertEqual(snapshot["p99"], 20)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import json
+import numpy as np
+import pyarrow as pa
+from openoperator.application.api.history_stream import ndjson_stream, arrow_stream
+from openoperator.infrastructure.timescale import SERIES_ROW
+
+def chunk(rows: list) -> np.ndarray:
+  return np.array(rows, dtype=SERIES_ROW)
+
+class TestHistoryStream(unittest.TestCase):
+  def setUp(self) -> None:
+    # ts-b spans both chunks
+    self.chunks = [
+      chunk([('ts-a', 1700000000.0, 1.0), ('ts-a', 1700000001.0, 2.0), ('ts-b', 1700000000.0, 3.0)]),
+      chunk([('ts-b', 1700000001.0, 4.0)]),
+    ]
+    self.point_uris = {'ts-a': 'point/a', 'ts-b': 'point/b'}
+
+  def test_ndjson(self):
+    lines = [json.loads(line) for line in ndjson_stream(self.chunks, self.point_uris)]
+    self.assertEqual(lines, [
+      {'timeseriesid': 'ts-a', 'point_uri': 'point/a', 'ts': ['2023-11-14T22:13:20+00:00', '2023-11-14T22:13:21+00:00'], 'value': [1.0, 2.0]},
+      {'timeseriesid': 'ts-b', 'point_uri': 'point/b', 'ts': ['2023-11-14T22:13:20+00:00'], 'value': [3.0]},
+      {'timeseriesid': 'ts-b', 'point_uri': 'point/b', 'ts': ['2023-11-14T22:13:21+00:00'], 'value': [4.0]},
+    ])
+
+  def test_arrow(self):
+    parts = list(arrow_stream(iter(self.chunks), self.point_uris))
+    self.assertEqual(len(parts), 4) # Schema, one message per chunk and the end of stream marker
+    reader = pa.ipc.open_stream(b''.join(parts))
+    self.assertEqual(json.loads(reader.schema.metadata[b'point_uris']), self.point_uris)
+    table = reader.read_all()
+    self.assertEqual(table.column('timeseriesid').to_pylist(), ['ts-a', 'ts-a', 'ts-b', 'ts-b'])
+    self.assertEqual(table.column('value').to_pylist(), [1.0, 2.0, 3.0, 4.0])
+    self.assertEqual(table.column('ts').to_pylist()[-1].timestamp(), 1700000001.0)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import MagicMock
+import asyncio
+import threading
+from openoperator.application.api.live_stream import LiveFeed, decode_reading, MIN_INTERVAL
+
+class TestLiveFeed(unittest.IsolatedAsyncioTestCase):
+  async def asyncSetUp(self) -> None:
+    self.session = MagicMock()
+    self.callbacks = {}
+    self.session.subscribe.side_effect = lambda topic, callback: self.callbacks.setdefault(topic, callback) and MagicMock()
+    self.feed = LiveFeed(self.session, {'point/a': 'site/a', 'point/b': 'site/b', 'point/c': 'site/a'}, min_interval=0.1, heartbeat=0.05)
+
+  def publish(self, topic: str, payload: bytes) -> None:
+    thread = threading.Thread(target=self.callbacks[topic], args=(topic, payload)) # As the MQTT network thread would
+    thread.start()
+    thread.join()
+
+  def test_one_subscription_per_topic(self):
+    self.assertEqual(sorted(call[0][0] for call in self.session.subscribe.call_args_list), ['site/a', 'site/b'])
+
+  async def test_coalesces_to_latest_value(self):
+    updates = self.feed.updates()
+    self.publish('site/a', b'{"output": 1}')
+    self.publish('site/a', b'{"output": 2}')
+    self.publish('site/b', b'3')
+    readings = await asyncio.wait_for(updates.__anext__(), 1)
+    self.assertEqual(sorted((r['point_uri'], r['value']) for r in readings), [('point/a', 2), ('point/b', 3), ('point/c', 2)])
+
+  async def test_rate_limit_and_heartbeat(self):
+    updates = self.feed.updates()
+    self.publish('site/b', b'1')
+    await updates.__anext__()
+    loop = asyncio.get_running_loop()
+    self.publish('site/b', b'2')
+    start = loop.time()
+    readings = await updates.__anext__()
+    self.assertGreaterEqual(loop.time() - start, 0.05) # Held back until min_interval since the last batch
+    self.assertEqual(readings[0]['value'], 2)
+    self.assertEqual(await updates.__anext__(), []) # Nothing new within the heartbeat
+
+  async def test_close(self):
+    subscriptions = [MagicMock(), MagicMock()]
+    self.session.subscribe.side_effect = subscriptions
+    feed = LiveFeed(self.session, {'point/a': 'site/a', 'point/b': 'site/b'}, min_interval=0)
+    self.assertEqual(feed.min_interval, MIN_INTERVAL)
+    feed.close()
+    for subscription in subscriptions:
+      subscription.close.assert_called_once()
+
+class TestDecodeReading(unittest.TestCase):
+  def test_decode_reading(self):
+    self.assertEqual(decode_reading(b'{"output": 21.5}'), 21.5)
+    self.assertEqual(decode_reading(b'{"status": "ok"}'), {'status': 'ok'})
+    self.assertEqual(decode_reading(b'on'), 'on')
+    # Callers never share a decoded value
+    first = decode_reading(b'{"status": "ok"}')
+    first['status'] = 'changed'
+    self.assertEqual(decode_reading(b'{"status": "ok"}'), {'status': 'ok'})
@@ -0,0 +1,167 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from openoperator.application.mqtt.mqtt2timescale import MQTT2Timescale
+from openoperator.application.mqtt.spool import Spool
+from openoperator.domain.model import PointReadingBatch
+
+def status_switch_payload(output: float) -> bytes:
+  return json.dumps({"aenergy": {"minute_ts": 1700000000}, "output": output}).encode()
+
+class TestMQTT2Timescale(unittest.IsolatedAsyncioTestCase):
+  def create_app(self, **kwargs) -> MQTT2Timescale:
+    self.mqtt_client = MagicMock()
+    self.ts = MagicMock()
+    return MQTT2Timescale(mqtt_client=self.mqtt_client, ts=self.ts, **kwargs)
+
+  def test_decode_rpc_message(self):
+    app = self.create_app()
+    payload = json.dumps({"src": "shellyplugus-1", "params": {"ts": 1700000000, "switch:0": {"id": 0, "current": 1.5, "voltage": 120.0, "apower": 5}}}).encode()
+    batch = PointReadingBatch()
+    app.decode_message("shellyplugus-1/events/rpc", payload, batch)
+    readings = batch.to_readings()
+    self.assertEqual([r.timeseriesid for r in readings], ["shellyplugus-1-switch-0-current", "shellyplugus-1-switch-0-voltage"])
+    self.assertEqual([r.value for r in readings], [1.5, 120.0])
+    self.assertEqual(app.metrics.decoded, 2)
+
+  def test_decode_z_timestamp(self):
+    app = self.create_app()
+    batch = PointReadingBatch()
+    app.decode_message("shellyplugus-1/status/switch:0", json.dumps({"aenergy": {"minute_ts": "2024-01-01T00:00:00Z"}, "output": 1.0}).encode(), batch)
+    self.assertEqual(app.metrics.decode_errors, 0)
+    self.assertEqual(batch.to_readings()[0].ts, "2024-01-01T00:00:00+00:00")
+
+  def test_decode_invalid_json(self):
+    app = self.create_app()
+    batch = PointReadingBatch()
+    app.decode_message("shellyplugus-1/status/switch:0", b"not json", batch)
+    app.decode_message("shellyplugus-1/status/switch:0", json.dumps({"aenergy": {"minute_ts": 1700000000}, "output": "on"}).encode(), batch)
+    self.assertEqual(len(batch), 0)
+    self.assertEqual(app.metrics.decode_errors, 2)
+
+  async def test_batch_size_flush_and_stop(self):
+    app = self.create_app(batch_size=2)
+    await app.start(topic="#")
+    for i in range(3):
+      await app.enqueue(("shellyplugus-1/status/switch:0", status_switch_payload(i)))
+    await app.stop()
+    # One full batch of two, then the remainder flushed on stop
+    self.assertEqual([len(call.args[0]) for call in self.ts.insert_batch.call_args_list], [2, 1])
+    self.assertEqual(app.metrics.flushed_rows, 3)
+
+  async def test_age_flush_keeps_pending_get(self):
+    app = self.create_app(batch_size=100, flush_interval=0.05)
+    await app.start(topic="#")
+    await app.enqueue(("shellyplugus-1/status/switch:0", status_switch_payload(1)))
+    await asyncio.sleep(0.2)
+    # The writer is still waiting on the same get() after the age flush, so the next item is not lost
+    await app.enqueue(("shellyplugus-1/status/switch:0", status_switch_payload(2)))
+    await app.stop()
+    self.assertEqual([len(call.args[0]) for call in self.ts.insert_batch.call_args_list], [1, 1])
+    self.assertEqual(app.metrics.flush_triggers["age"], 1)
+
+  async def test_flush_error_is_counted(self):
+    app = self.create_app(batch_size=1)
+    self.ts.insert_batch.side_effect = Exception("db down")
+    await app.start(topic="#")
+    await app.enqueue(("shellyplugus-1/status/switch:0", status_switch_payload(1)))
+    await app.stop()
+    self.assertEqual(app.metrics.flush_errors, 1)
+
+  async def test_spooled_batch_retried_after_failure(self):
+    with tempfile.TemporaryDirectory() as spool_dir:
+      spool = Spool(spool_dir)
+      app = self.create_app(batch_size=1, spool=spool)
+      self.ts.insert_batch.side_effect = [Exception("db down"), None, None]
+      await app.start(topic="#")
+      await app.enqueue(("shellyplugus-1/status/switch:0", status_switch_payload(1)))
+      await app.enqueue(("shellyplugus-1/status/switch:0", status_switch_payload(2)))
+      await app.stop()
+      # The failed batch stays spooled until the next successful flush, then is retried with dedup
+      self.assertEqual(self.ts.insert_batch.call_args_list[2].kwargs, {"dedup": True})
+      self.assertEqual(app.unflushed, [])
+      self.assertEqual(spool.pending(), [])
+
+  async def test_concurrent_writers_retry_each_batch_once(self):
+    with tempfile.TemporaryDirectory() as spool_dir:
+      spool = Spool(spool_dir)
+      writers = [MagicMock(), MagicMock()]
+      app = MQTT2Timescale(mqtt_client=MagicMock(), ts=writers, spool=spool)
+      for i in range(2):
+        batch = PointReadingBatch()
+        batch.append(1704067200 + i, float(i), 'id1')
+        app.unflushed.append((spool.append(batch), batch))
+      inserted = []
+      def insert_batch(batch, dedup=False):
+        time.sleep(0.05) # Both writers are in flight at once
+        inserted.append(batch.to_readings()[0].value)
+      for ts in writers:
+        ts.insert_batch.side_effect = insert_batch
+
+      await asyncio.gather(*(app.retry_unflushed(ts) for ts in writers))
+
+      self.assertEqual(sorted(inserted), [0.0, 1.0])
+      self.assertEqual(app.unflushed, [])
+      self.assertEqual(spool.pending(), [])
+
+  async def test_replay_spool_on_start(self):
+    with tempfile.TemporaryDirectory() as spool_dir:
+      spool = Spool(spool_dir)
+      batch = PointReadingBatch()
+      batch.append(1704067200, 1.0, 'id1')
+      spool.append(batch)
+      app = self.create_app(spool=spool)
+      await app.start(topic="#")
+      await app.stop()
+      self.ts.insert_batch.assert_called_once()
+      self.assertEqual(self.ts.insert_batch.call_args.args[0].to_readings(), batch.to_readings())
+      self.assertEqual(self.ts.insert_batch.call_args.kwargs, {"dedup": True})
+      self.assertEqual(spool.pending(), [])
+
+  @patch('openoperator.application.mqtt.mqtt2timescale.BLOCK_POLL_INTERVAL', 0.01)
+  async def test_stop_releases_blocked_network_thread(self):
+    app = self.create_app(queue_size=1)
+    app.loop = asyncio.get_running_loop()
+    app.running = True
+    app.queue = asyncio.Queue(maxsize=1)
+    app.queue.put_nowait(("topic", b"0"))
+    network_thread = threading.Thread(target=app.on_mqtt_message, args=(None, None, MagicMock(topic="topic", payload=b"1")))
+    network_thread.start()
+    await asyncio.sleep(0.05)
+    self.assertTrue(network_thread.is_alive()) # Blocked on the full queue
+
+    # loop_stop joins the network thread, like paho does
+    self.mqtt_client.loop_stop.side_effect = lambda: network_thread.join(5)
+    await asyncio.wait_for(app.stop(), 5)
+    self.assertFalse(network_thread.is_alive())
+    self.assertEqual(app.metrics.dropped, 1)
+
+  async def test_drop_oldest(self):
+    app = self.create_app(queue_size=2, backpressure='drop_oldest')
+    app.queue = asyncio.Queue(maxsize=2)
+    for i in range(3):
+      app.enqueue_nowait(("topic", str(i).encode()))
+    self.assertEqual(app.metrics.dropped, 1)
+    self.assertEqual(app.queue.get_nowait(), ("topic", b"1"))
+
+  async def test_spill_and_requeue(self):
+    with tempfile.TemporaryDirectory() as spill_dir:
+      app = self.create_app(queue_size=1, backpressure='spill', spill_dir=spill_dir)
+      app.queue = asyncio.Queue(maxsize=1)
+      app.enqueue_nowait(("topic", b"0"))
+      app.enqueue_nowait(("topic", b"\x00\x01"))
+      self.assertEqual(app.metrics.spilled, 1)
+      self.assertTrue(os.path.exists(app.spill_path))
+
+      app.queue.get_nowait()
+      await app.requeue_spill()
+      self.assertEqual(app.queue.get_nowait(), ("topic", b"\x00\x01"))
+      self.assertFalse(os.path.exists(app.spill_path))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+import os
+import tempfile
+from openoperator.application.mqtt.spool import Spool
+from openoperator.domain.model import PointReadingBatch
+
+class TestSpool(unittest.TestCase):
+  def setUp(self) -> None:
+    self.tmp = tempfile.TemporaryDirectory()
+    self.spool = Spool(self.tmp.name)
+    self.batch = PointReadingBatch()
+    self.batch.append(1704067200, 1.0, 'id1')
+    self.batch.append(1704067201, 2.0, 'id2')
+
+  def tearDown(self) -> None:
+    self.tmp.cleanup()
+
+  def test_append_and_commit(self):
+    segment = self.spool.append(self.batch)
+    [(pending_segment, batch)] = self.spool.pending()
+    self.assertEqual(pending_segment, segment)
+    self.assertEqual(batch.to_readings(), self.batch.to_readings())
+    self.assertEqual(batch.index, self.batch.index)
+    self.spool.commit(segment)
+    self.assertEqual(self.spool.pending(), [])
+
+  def test_pending_is_ordered_and_drops_partial_writes(self):
+    first = self.spool.append(self.batch)
+    second = self.spool.append(self.batch)
+    with open(os.path.join(self.tmp.name, 'partial.seg.tmp'), 'w') as f:
+      f.write('{"ts": ')
+    self.assertEqual([segment for segment, _ in self.spool.pending()], [first, second])
+    self.assertEqual(sorted(os.listdir(self.tmp.name)), [first, second])
+
+if __name__ == '__main__':
+  unittest.main()
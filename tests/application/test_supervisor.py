@@ -0,0 +1,38 @@
+import unittest
+import signal
+import sys
+import time
+from openoperator.application.mqtt.supervisor import Supervisor
+from openoperator.application.mqtt.mqtt2timescale import shared_topic
+
+def wait_for_sigterm(worker_id: int):
+  signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+  time.sleep(30)
+
+def exit_immediately(worker_id: int):
+  sys.exit(1)
+
+class TestSupervisor(unittest.TestCase):
+  def test_start_and_stop(self):
+    supervisor = Supervisor(target=wait_for_sigterm, processes=2)
+    supervisor.start()
+    self.assertEqual(len(supervisor.workers), 2)
+    self.assertTrue(all(process.is_alive() for process in supervisor.workers.values()))
+    time.sleep(1) # Give the workers time to install their SIGTERM handler
+    supervisor.stop(timeout=10)
+    self.assertEqual([process.exitcode for process in supervisor.workers.values()], [0, 0])
+
+  def test_restarts_dead_workers(self):
+    supervisor = Supervisor(target=exit_immediately, processes=1, restart_delay=0)
+    supervisor.start()
+    first = supervisor.workers[0]
+    first.join()
+    supervisor.check()
+    self.assertIsNot(supervisor.workers[0], first)
+    supervisor.stop(timeout=10)
+
+  def test_shared_topic(self):
+    self.assertEqual(shared_topic("+/status/switch:0", "ingest"), "$share/ingest/+/status/switch:0")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import json
+from openoperator.application.mqtt.topic_router import TopicRouter
+from openoperator.application.mqtt.decoders import default_router
+from openoperator.domain.model import PointReadingBatch
+
+def decoder(name: str):
+  def decode(topic: str, payload: bytes, batch):
+    batch.append(name)
+  return decode
+
+class TestTopicRouter(unittest.TestCase):
+  def setUp(self) -> None:
+    self.router = TopicRouter()
+    for topic_filter in ["a/b/c", "a/+/c", "a/#", "#", "+/+", "$SYS/#"]:
+      self.router.register(topic_filter, decoder(topic_filter))
+
+  def matches(self, topic: str) -> set:
+    names = []
+    for d in self.router.match(topic):
+      d(topic, b"", names)
+    return set(names)
+
+  def test_wildcards(self):
+    self.assertEqual(self.matches("a/b/c"), {"a/b/c", "a/+/c", "a/#", "#"})
+    self.assertEqual(self.matches("a/x"), {"a/#", "#", "+/+"})
+    self.assertEqual(self.matches("a"), {"a/#", "#"})
+    self.assertEqual(self.matches("b/c/d"), {"#"})
+
+  def test_dollar_topics_skip_wildcards(self):
+    self.assertEqual(self.matches("$SYS/broker/uptime"), {"$SYS/#"})
+
+  def test_cache_invalidated_on_register(self):
+    self.assertEqual(self.matches("x/y/z"), {"#"})
+    self.router.register("x/y/z", decoder("x/y/z"))
+    self.assertEqual(self.matches("x/y/z"), {"#", "x/y/z"})
+
+  def test_invalid_filters(self):
+    with self.assertRaises(ValueError):
+      self.router.register("a/#/b", decoder("bad"))
+    with self.assertRaises(ValueError):
+      self.router.register("a/b+", decoder("bad"))
+
+  def test_shelly_decoders(self):
+    router = default_router()
+    payload = json.dumps({"aenergy": {"minute_ts": 1700000000}, "output": True}).encode()
+    batch = PointReadingBatch()
+    router.decode("shellyplugus-1/status/switch:0", payload, batch)
+    router.decode("otherdevice/status/switch:0", payload, batch)
+    readings = batch.to_readings()
+    self.assertEqual(len(readings), 1)
+    self.assertEqual(readings[0].timeseriesid, "shellyplugus-1/status/switch:0")
+    self.assertEqual(readings[0].ts, "2023-11-14T22:13:20+00:00")
+    self.assertEqual(readings[0].value, 1.0)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,14 @@
+import unittest
+from pydantic import ValidationError
+from openoperator.domain.model import DocumentQuery
+
+class TestDocumentQuery(unittest.TestCase):
+  def test_ranking_weights(self):
+    query = DocumentQuery(portfolio_uri='https://example.com/portfolio', query='AHU-3', lexical_weight=0)
+    self.assertEqual((query.ranking, query.vector_weight, query.lexical_weight), ('hybrid', 1.0, 0))
+    with self.assertRaises(ValidationError):
+      DocumentQuery(portfolio_uri='https://example.com/portfolio', query='AHU-3', vector_weight=-1)
+    with self.assertRaises(ValidationError):
+      DocumentQuery(portfolio_uri='https://example.com/portfolio', query='AHU-3', vector_weight=0, lexical_weight=0)
+    # The weights only apply to hybrid ranking
+    DocumentQuery(portfolio_uri='https://example.com/portfolio', query='AHU-3', ranking='vector', vector_weight=0, lexical_weight=0)
@@ -0,0 +1,26 @@
+import unittest
+from datetime import datetime, timezone
+from openoperator.domain.model import PointReadingBatch
+from openoperator.domain.model.point import parse_timestamp, to_epoch
+
+class TestPointReadingTimestamps(unittest.TestCase):
+  def test_parse_timestamp(self):
+    expected = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    self.assertEqual(parse_timestamp('2024-01-01T00:00:00Z'), expected)
+    self.assertEqual(parse_timestamp('2024-01-01T00:00:00+00:00'), expected)
+    self.assertEqual(parse_timestamp('2024-01-01 00:00:00'), expected) # Naive is UTC
+    with self.assertRaises(ValueError):
+      parse_timestamp('yesterday')
+
+  def test_to_epoch(self):
+    self.assertEqual(to_epoch('2024-01-01T00:00:00Z'), 1704067200.0)
+    self.assertEqual(to_epoch('1704067200'), 1704067200.0)
+    self.assertEqual(to_epoch(datetime(2024, 1, 1)), 1704067200.0)
+    self.assertEqual(to_epoch(1704067200), 1704067200.0)
+
+  def test_decoded_z_timestamps(self):
+    batch = PointReadingBatch()
+    batch.append('2024-01-01T00:00:00Z', 1.0, 'id1')
+    self.assertEqual(batch.to_readings()[0].ts, '2024-01-01T00:00:00+00:00')
+    batch = PointReadingBatch.from_columns(['2024-01-01T00:00:00.500Z'], [2.0], ['id2'])
+    self.assertEqual(batch.to_readings()[0].ts, '2024-01-01T00:00:00.500000+00:00')
@@ -201,15 +201,33 @@ class TestDocuments(unittest.TestCase):
   def test_search(self):
     params = DocumentQuery(query="test_query", portfolio_uri=self.portfolio_uri, facility_uri=self.facility_uri)
 
-    # Mock the vector_store.search method
-    self.vector_store.similarity_search.return_value = []
+    # Mock the vector_store.hybrid_search method
+    self.vector_store.hybrid_search.return_value = []
 
     # Execute the search method
     documents = self.document_repository.search(params)
 
     # Verify the result
+    self.vector_store.hybrid_search.assert_called_once_with(query=params.query, limit=25, filter={"facility_uri": self.facility_uri}, vector_weight=1.0, lexical_weight=1.0)
+    assert documents == []
+
+  def test_search_vector_ranking(self):
+    params = DocumentQuery(query="test_query", portfolio_uri=self.portfolio_uri, facility_uri=self.facility_uri, ranking='vector')
+    self.vector_store.similarity_search.return_value = []
+
+    documents = self.document_repository.search(params)
+
     self.vector_store.similarity_search.assert_called_once_with(query=params.query, limit=25, filter={"facility_uri": self.facility_uri})
+    self.vector_store.hybrid_search.assert_not_called()
     assert documents == []
+
+  def test_search_lexical_ranking(self):
+    params = DocumentQuery(query="AHU-3", portfolio_uri=self.portfolio_uri, ranking='lexical', limit=5)
+    self.vector_store.hybrid_search.return_value = []
+
+    self.document_repository.search(params)
+
+    self.vector_store.hybrid_search.assert_called_once_with(query="AHU-3", limit=5, filter={"portfolio_uri": self.portfolio_uri}, vector_weight=0, lexical_weight=1)
         
 
 if __name__ == '__main__':
@@ -62,4 +62,37 @@ class TestPointManager(unittest.TestCase):
     assert len(points) == 2
     assert points[0].object_name == "test_point"
     assert points[0].uri == "https://openoperator.com/facility/point"
-    assert points[1].object_name == "test_point2"
\ No newline at end of file
+    assert points[1].object_name == "test_point2"
+  def test_points_history_downsampling(self):
+    session_mock = self.setup_session_mock()
+    mock_query_result = Mock()
+    mock_query_result.data.return_value = [
+      {
+        "p": {
+          "object_name": "test_point",
+          "uri": "https://openoperator.com/facility/point",
+          "timeseriesId": "ts1",
+          "collect_enabled": True,
+          "object_units": "degreesFahrenheit",
+          "object_type": "analogInput",
+          "object_index": "1"
+        }
+      }
+    ]
+    session_mock.run.return_value = mock_query_result
+    ts = self.point_repository.ts
+    ts.get_timeseries_buckets.return_value = [{'timeseriesid': 'ts1', 'data': [{'ts': '2024-01-01T00:00:00+00:00', 'value': 70.5, 'min': 70.0, 'max': 71.0, 'last': 71.0}]}]
+
+    groups = self.point_repository.points_history("2024-01-01 00:00:00", "2024-01-31 00:00:00", ["https://openoperator.com/facility/point"], max_points=500)
+
+    ts.get_timeseries_buckets.assert_called_once_with(["ts1"], "2024-01-01 00:00:00", "2024-01-31 00:00:00", bucket=None, max_points=500)
+    ts.get_timeseries.assert_not_called()
+    assert groups[0]['object_unit'] == "degreesFahrenheit"
+    assert groups[0]['points'][0]['data'][0]['max'] == 71.0
+
+    ts.get_timeseries_lttb.return_value = []
+    self.point_repository.points_history("2024-01-01 00:00:00", "2024-01-31 00:00:00", ["https://openoperator.com/facility/point"], max_points=500, downsample='lttb')
+    ts.get_timeseries_lttb.assert_called_once_with(["ts1"], "2024-01-01 00:00:00", "2024-01-31 00:00:00", max_points=500)
+
+    with self.assertRaises(ValueError):
+      self.point_repository.points_history("2024-01-01 00:00:00", "2024-01-31 00:00:00", ["https://openoperator.com/facility/point"], downsample='lttb')
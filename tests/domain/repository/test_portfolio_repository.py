@@ -1,10 +1,10 @@
 import unittest
-from unittest.mock import Mock 
+from unittest.mock import Mock, MagicMock, AsyncMock
 from openoperator.domain.repository import PortfolioRepository
 from openoperator.domain.model import Portfolio, Facility
 from neo4j.exceptions import Neo4jError
 
-class TestPortfolioRepository(unittest.TestCase):
+class TestPortfolioRepository(unittest.IsolatedAsyncioTestCase):
   def setUp(self):
     self.blob_store = Mock()
     self.embeddings = Mock()
@@ -20,19 +20,21 @@ class TestPortfolioRepository(unittest.TestCase):
 
   def setup_session_mock(self):
     # Create the session mock
-    session_mock = Mock()
+    session_mock = MagicMock()
     # Simulate entering the context
-    session_mock.__enter__ = Mock(return_value=session_mock)
+    session_mock.__aenter__ = AsyncMock(return_value=session_mock)
     # Simulate exiting the context
-    session_mock.__exit__ = Mock(return_value=None)
+    session_mock.__aexit__ = AsyncMock(return_value=None)
+    # session.run resolves to a result whose single() and data() are awaited
+    session_mock.run = AsyncMock(return_value=AsyncMock())
     # Configure the knowledge_graph to return this session mock
-    self.portfolio_repository.kg.create_session.return_value = session_mock
+    self.portfolio_repository.kg.create_async_session.return_value = session_mock
     return session_mock
 
-  def test_create_portfolio(self):
+  async def test_create_portfolio(self):
     session_mock = self.setup_session_mock()
     # Mock the session.run method to simulate a successful query execution
-    mock_query_result = Mock()
+    mock_query_result = AsyncMock()
     mock_query_result.single.return_value = {
       "p": {
         "name": "Test Portfolio",
@@ -41,13 +43,13 @@ class TestPortfolioRepository(unittest.TestCase):
     }
     session_mock.run.return_value = mock_query_result
 
-    portfolio = self.portfolio_repository.create_portfolio(portfolio=Portfolio(name="Test Portfolio", uri="https://openoperator.com/test%20portfolio"), user_email=self.user_email)
+    portfolio = await self.portfolio_repository.create_portfolio(portfolio=Portfolio(name="Test Portfolio", uri="https://openoperator.com/test%20portfolio"), user_email=self.user_email)
     
     # Verify the portfolio's properties
     assert portfolio.uri == "https://openoperator.com/test%20portfolio"
 
-    # Assert that create_session was called once
-    self.portfolio_repository.kg.create_session.assert_called_once()
+    # Assert that create_async_session was called once
+    self.portfolio_repository.kg.create_async_session.assert_called_once()
 
     session_query_string = session_mock.run.call_args[0][0]
     # Assert that session.run was called with the expected query
@@ -55,27 +57,27 @@ class TestPortfolioRepository(unittest.TestCase):
     assert "CREATE (u)-[:HAS_ACCESS_TO]->(p)" in session_query_string
     assert "RETURN p" in session_query_string
     
-  def test_create_portfolio_no_result(self):
+  async def test_create_portfolio_no_result(self):
     session_mock = self.setup_session_mock()
     # Simulate a scenario where the query returns no result
     session_mock.run.return_value.single.return_value = None
 
     with self.assertRaises(Exception) as context:
-      self.portfolio_repository.create_portfolio(portfolio=Portfolio(name="Test Portfolio", uri="https://openoperator.com/test%20portfolio"), user_email=self.user_email)
+      await self.portfolio_repository.create_portfolio(portfolio=Portfolio(name="Test Portfolio", uri="https://openoperator.com/test%20portfolio"), user_email=self.user_email)
 
     self.assertTrue("Error creating portfolio" in str(context.exception))
 
-  def test_create_portfolio_exception(self):
+  async def test_create_portfolio_exception(self):
     session_mock = self.setup_session_mock()
     # Simulate raising a Neo4jError on query execution
     session_mock.run.side_effect = Neo4jError("Simulated database error")
 
     with self.assertRaises(Exception) as context:
-      self.portfolio_repository.create_portfolio(portfolio=Portfolio(name="Test Portfolio", uri="https://openoperator.com/test%20portfolio"), user_email=self.user_email)
+      await self.portfolio_repository.create_portfolio(portfolio=Portfolio(name="Test Portfolio", uri="https://openoperator.com/test%20portfolio"), user_email=self.user_email)
 
     self.assertTrue("Simulated database error" in str(context.exception))
 
-  def test_portfolios(self):
+  async def test_portfolios(self):
     session_mock = self.setup_session_mock()
     # Simulate a query result with two records
     session_mock.run.return_value.data.return_value = [
@@ -95,7 +97,7 @@ class TestPortfolioRepository(unittest.TestCase):
         },
     ]
 
-    portfolios = self.portfolio_repository.list_portfolios_for_user(email=self.user_email)
+    portfolios = await self.portfolio_repository.list_portfolios_for_user(email=self.user_email)
 
     # Verify the returned data
     assert portfolios == [
@@ -109,37 +111,37 @@ class TestPortfolioRepository(unittest.TestCase):
         ]),
     ]
 
-    # Assert that create_session was called once
-    self.portfolio_repository.kg.create_session.assert_called_once()
+    # Assert that create_async_session was called once
+    self.portfolio_repository.kg.create_async_session.assert_called_once()
 
     session_query_string = session_mock.run.call_args[0][0]
     # Assert that session.run was called with the expected query
     assert "MATCH (u:User {email: $email})-[:HAS_ACCESS_TO]->(p:Customer)" in session_query_string
 
-  def test_portfolios_no_records(self):
+  async def test_portfolios_no_records(self):
     session_mock = self.setup_session_mock()
     # Simulate a query result with no records
     session_mock.run.return_value.data.return_value = []
 
-    portfolios = self.portfolio_repository.list_portfolios_for_user(email=self.user_email)
+    portfolios = await self.portfolio_repository.list_portfolios_for_user(email=self.user_email)
 
     # Verify the returned data
     assert portfolios == []
 
-    # Assert that create_session was called once
-    self.portfolio_repository.kg.create_session.assert_called_once()
+    # Assert that create_async_session was called once
+    self.portfolio_repository.kg.create_async_session.assert_called_once()
 
     session_query_string = session_mock.run.call_args[0][0]
     # Assert that session.run was called with the expected query
     assert "MATCH (u:User {email: $email})-[:HAS_ACCESS_TO]->(p:Customer)" in session_query_string
 
-  def test_portfolios_exception(self):
+  async def test_portfolios_exception(self):
     session_mock = self.setup_session_mock()
     # Simulate raising a Neo4jError on query execution
     session_mock.run.side_effect = Neo4jError("Simulated database error")
 
     with self.assertRaises(Exception) as context:
-      self.portfolio_repository.list_portfolios_for_user(email=self.user_email)
+      await self.portfolio_repository.list_portfolios_for_user(email=self.user_email)
 
     self.assertTrue("Simulated database error" in str(context.exception))
 
@@ -0,0 +1,53 @@
+from openoperator.domain.service import UserService
+from openoperator.domain.service.user_service import UserCache
+from openoperator.domain.model import User
+import unittest
+from unittest.mock import AsyncMock, patch
+
+class TestUserService(unittest.IsolatedAsyncioTestCase):
+  def setUp(self):
+    self.user_repository = AsyncMock()
+    self.user = User(email="example@example.com", hashed_password="hash", full_name="Example User")
+    self.user_repository.get_user.return_value = self.user
+    self.user_service = UserService(user_repository=self.user_repository)
+
+  async def test_get_user_cached(self):
+    for _ in range(3):
+      self.assertIs(await self.user_service.get_user("example@example.com"), self.user)
+    self.user_repository.get_user.assert_awaited_once_with("example@example.com")
+    stats = self.user_service.stats()
+    self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+    self.assertAlmostEqual(stats["hit_rate"], 2 / 3)
+
+  async def test_unknown_email_cached_until_signup(self):
+    self.user_repository.get_user.return_value = None
+    self.assertIsNone(await self.user_service.get_user("new@example.com"))
+    self.assertIsNone(await self.user_service.get_user("new@example.com"))
+    self.assertEqual(self.user_repository.get_user.await_count, 1)
+    self.assertEqual(self.user_service.stats()["negative_hits"], 1)
+
+    with patch.object(UserService, 'hash_password', return_value="hash"):
+      await self.user_service.create_user("new@example.com", "New User", "password")
+    self.user_repository.get_user.return_value = self.user
+    self.assertIs(await self.user_service.get_user("new@example.com"), self.user)
+    self.assertEqual(self.user_repository.get_user.await_count, 2)
+
+  async def test_entries_expire(self):
+    self.user_service.cache.ttl = 0
+    await self.user_service.get_user("example@example.com")
+    await self.user_service.get_user("example@example.com")
+    self.assertEqual(self.user_repository.get_user.await_count, 2)
+
+class TestUserCache(unittest.TestCase):
+  def test_least_recently_used_dropped(self):
+    cache = UserCache(capacity=2)
+    users = {email: User(email=email, hashed_password="") for email in ["a", "b", "c"]}
+    cache.put("a", users["a"])
+    cache.put("b", users["b"])
+    cache.get("a")
+    cache.put("c", users["c"])
+    self.assertEqual(list(cache.entries), ["a", "c"])
+    cache.invalidate("a")
+    self.assertEqual(cache.get("a"), (False, None))
+    cache.invalidate()
+    self.assertEqual(cache.stats()["entries"], 0)
@@ -0,0 +1,41 @@
+import unittest
+from unittest.mock import MagicMock
+from hashlib import sha256
+import numpy as np
+from openai.types import Embedding
+from openoperator.infrastructure import CachedEmbeddings
+
+def embed(texts):
+  return [Embedding(embedding=[float(len(text)), 1.0], index=i, object='embedding') for i, text in enumerate(texts)]
+
+class TestCachedEmbeddings(unittest.TestCase):
+  def setUp(self) -> None:
+    self.postgres = MagicMock()
+    self.cur = self.postgres.cursor().__enter__()
+    self.cur.fetchall.return_value = []
+    self.provider = MagicMock(model='test-model')
+    self.provider.create_embeddings.side_effect = embed
+    self.cache = CachedEmbeddings(self.provider, self.postgres, capacity=2)
+
+  def test_migrate(self):
+    self.assertIn('CREATE TABLE IF NOT EXISTS embedding_cache', self.cur.execute.call_args_list[0][0][0])
+
+  def test_only_misses_reach_the_provider(self):
+    # "bb" is in the store, "a" is new and repeated
+    self.cur.fetchall.return_value = [(sha256(b"bb").digest(), np.array([2.0, 1.0], dtype=np.float32).tobytes())]
+    embeddings = self.cache.create_embeddings(["a", "bb", "a"])
+    self.assertEqual([embedding.embedding for embedding in embeddings], [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]])
+    self.assertEqual([embedding.index for embedding in embeddings], [0, 1, 2])
+    self.provider.create_embeddings.assert_called_once_with(["a"])
+    # One batched lookup and the new vector stored
+    self.assertEqual(self.cur.execute.call_args[0][1], ('test-model', [sha256(b"a").digest(), sha256(b"bb").digest()]))
+    self.assertEqual(self.cur.executemany.call_args[0][1], [('test-model', sha256(b"a").digest(), np.array([1.0, 1.0], dtype=np.float32).tobytes())])
+
+    self.cur.reset_mock()
+    self.cache.create_embeddings(["bb", "a"])
+    self.cur.execute.assert_not_called() # Served from memory
+    self.assertEqual(self.cache.stats(), {"entries": 2, "memory_hits": 2, "store_hits": 1, "misses": 2, "hit_rate": 0.6})
+
+  def test_least_recently_used_dropped(self):
+    self.cache.create_embeddings(["a", "bb", "ccc"])
+    self.assertEqual(list(self.cache.memory), [sha256(b"bb").digest(), sha256(b"ccc").digest()])
@@ -1,6 +1,21 @@
 import unittest
 from unittest.mock import patch, MagicMock
+import time
+import httpx
+import openai
+from openai.types import Embedding
 from openoperator.infrastructure.embeddings import OpenAIEmbeddings 
+from openoperator.infrastructure.embeddings.openai_embeddings import TokenBudget
+
+class WordEncoding:
+  """
+  Stands in for the tiktoken encoding, one token per word.
+  """
+  def encode_ordinary_batch(self, texts):
+    return [text.split() for text in texts]
+
+  def decode(self, tokens):
+    return ' '.join(tokens)
 
 class TestOpenAIEmbeddings(unittest.TestCase):
   @patch('openoperator.infrastructure.embeddings.openai_embeddings.os.environ')
@@ -27,27 +42,50 @@ class TestOpenAIEmbeddings(unittest.TestCase):
     mock_client.embeddings.create.assert_called_once_with(model="text-embedding-3-small", input=texts, encoding_format="float")
 
 
-  @patch('openoperator.infrastructure.embeddings.openai_embeddings.os.environ')
   @patch('openoperator.infrastructure.embeddings.openai_embeddings.OpenAI')
-  def test_chunk_text(self, mock_OpenAI, mock_environ):
-    mock_environ.get.side_effect = lambda k, d=None: 'test_api_key' if k == 'OPENAI_API_KEY' else d
+  def test_batches(self, mock_OpenAI):
+    embeddings_instance = OpenAIEmbeddings(openai_api_key='test_api_key', encoding=WordEncoding(), max_input_tokens=3, max_batch_inputs=3, max_batch_tokens=5)
 
-    # Initialize OpenAIEmbeddings instance
-    embeddings_instance = OpenAIEmbeddings()
-    
-    texts = ["Hello world", "This is a test", "Another test", "Yet another test"]
-    max_tokens = 5 
-    expected_chunks = [
-      ['Hello world'], 
-      ['This is a test'], 
-      ['Another test', 'Yet another test']
-    ]
+    inputs, counts = embeddings_instance.prepare(["Hello world", "This is a test", "Another test", "Yet", "another", "test"])
+    self.assertEqual(inputs, ["Hello world", "This is a", "Another test", "Yet", "another", "test"]) # Truncated to the input limit
+    self.assertEqual(counts, [2, 3, 2, 1, 1, 1])
+    # At most 5 tokens and 3 inputs per request
+    self.assertEqual(embeddings_instance.batches(counts), [(0, 2), (2, 5), (5, 6)])
 
-    chunks = embeddings_instance.chunk_text(texts, max_tokens)
+  @patch('openoperator.infrastructure.embeddings.openai_embeddings.OpenAI')
+  def test_create_embeddings_order_and_retries(self, mock_OpenAI):
+    calls = []
+    def create(model, input, encoding_format):
+      calls.append(list(input))
+      if len(calls) == 1: # The first request is rate limited
+        raise openai.RateLimitError("rate limited", response=httpx.Response(429, headers={'retry-after': '0'}, request=httpx.Request('POST', 'http://test')), body=None)
+      return MagicMock(data=[Embedding(embedding=[float(text[1:])], index=i, object='embedding') for i, text in enumerate(input)])
+    mock_OpenAI.return_value.embeddings.create.side_effect = create
 
-    # Assertions to verify behavior
-    self.assertEqual(chunks, expected_chunks)
+    embeddings_instance = OpenAIEmbeddings(openai_api_key='test_api_key', encoding=WordEncoding(), max_batch_inputs=2, concurrency=4)
+    texts = [f"t{i}" for i in range(7)]
+    embeddings = embeddings_instance.create_embeddings(texts)
+
+    self.assertEqual([embedding.embedding[0] for embedding in embeddings], list(range(7)))
+    self.assertEqual([embedding.index for embedding in embeddings], list(range(7)))
+    self.assertEqual(len(calls), 5) # Four batches and one retry
+    self.assertEqual(embeddings_instance.create_embeddings([]), [])
+
+  @patch('openoperator.infrastructure.embeddings.openai_embeddings.OpenAI')
+  def test_client_errors_not_retried(self, mock_OpenAI):
+    error = openai.BadRequestError("bad request", response=httpx.Response(400, request=httpx.Request('POST', 'http://test')), body=None)
+    mock_OpenAI.return_value.embeddings.create.side_effect = error
+    embeddings_instance = OpenAIEmbeddings(openai_api_key='test_api_key', encoding=WordEncoding())
+    with self.assertRaises(openai.BadRequestError):
+      embeddings_instance.create_embeddings(["text"])
+    mock_OpenAI.return_value.embeddings.create.assert_called_once()
 
+  def test_token_budget(self):
+    budget = TokenBudget(tokens_per_minute=6000) # 100 tokens per second
+    budget.acquire(6000)
+    start = time.monotonic()
+    budget.acquire(10)
+    self.assertGreaterEqual(time.monotonic() - start, 0.09)
 
 if __name__ == '__main__':
   unittest.main()
\ No newline at end of file
@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import MagicMock
+import json
+import time
+from openoperator.infrastructure.latest_values import LatestValueCache
+from openoperator.domain.model import PointReading, PointReadingBatch
+
+def iso(epoch: float) -> str:
+  return PointReadingBatch.from_columns([epoch], [0.0], ['x']).to_readings()[0].ts
+
+class TestLatestValueCache(unittest.TestCase):
+  def setUp(self) -> None:
+    self.timescale = MagicMock()
+    self.cache = LatestValueCache(self.timescale, ttl=60, max_age=1800, capacity=2)
+    self.now = time.time()
+
+  def test_miss_falls_back_to_database(self):
+    self.timescale.get_latest_values.return_value = [PointReading(ts=iso(self.now - 10), value=1.5, timeseriesid='a')]
+    readings = self.cache.get_latest_values(['a', 'b'])
+    self.timescale.get_latest_values.assert_called_once_with(['a', 'b'])
+    self.assertEqual([(r.timeseriesid, r.value) for r in readings], [('a', 1.5)])
+
+    # Both ids, including the one without a recent reading, are served from memory now
+    readings = self.cache.get_latest_values(['b', 'a'])
+    self.assertEqual(self.timescale.get_latest_values.call_count, 1)
+    self.assertEqual([(r.timeseriesid, r.value) for r in readings], [('a', 1.5)])
+    self.assertEqual(self.cache.stats()['hits'], 2)
+
+  def test_entries_expire_after_ttl(self):
+    self.timescale.get_latest_values.return_value = []
+    self.cache.get_latest_values(['a'])
+    self.cache.checked[self.cache.slots['a']] -= 61
+    self.cache.get_latest_values(['a'])
+    self.assertEqual(self.timescale.get_latest_values.call_count, 2)
+
+  def test_listener_keeps_entries_current(self):
+    self.cache.listening_since = time.monotonic() - 120
+    self.cache.apply_notification(json.dumps([['a', self.now - 5, 2.0]]))
+    self.cache.checked[self.cache.slots['a']] -= 61 # Older than the ttl but loaded while listening
+    readings = self.cache.get_latest_values(['a'])
+    self.timescale.get_latest_values.assert_not_called()
+    self.assertEqual(readings[0].value, 2.0)
+
+  def test_newest_reading_wins(self):
+    batch = PointReadingBatch()
+    batch.append(self.now - 3, 3.0, 'a')
+    batch.append(self.now - 1, 1.0, 'a')
+    batch.append(self.now - 2, 2.0, 'b')
+    batch.append(self.now - 4, 4.0, 'c') # Grows the arrays past their capacity
+    self.cache.update_batch(batch)
+    self.cache.apply_notification(json.dumps([['a', self.now - 100, 100.0]])) # Late, older reading
+    readings = self.cache.get_latest_values(['a', 'b', 'c'])
+    self.assertEqual([(r.timeseriesid, r.value) for r in readings], [('a', 1.0), ('b', 2.0), ('c', 4.0)])
+
+  def test_old_readings_are_missing(self):
+    self.cache.update(['a'], [self.now - 3600], [1.0])
+    self.assertEqual(self.cache.get_latest_values(['a']), [])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import MagicMock
+import threading
+from openoperator.infrastructure.mqtt_session import MQTTSession
+
+def message(topic: str, payload: bytes):
+  return MagicMock(topic=topic, payload=payload)
+
+class TestMQTTSession(unittest.TestCase):
+  def setUp(self) -> None:
+    self.mqtt_client = MagicMock()
+    self.client = self.mqtt_client.client
+    self.session = MQTTSession(self.mqtt_client)
+    self.session.on_connect(self.client, None, None, MagicMock(is_failure=False))
+
+  def test_fan_out_shares_one_broker_subscription(self):
+    received = []
+    first = self.session.subscribe('site/temp', lambda topic, payload: received.append(('first', payload)))
+    second = self.session.subscribe('site/temp', lambda topic, payload: received.append(('second', payload)))
+    wildcard = self.session.subscribe('site/#', lambda topic, payload: received.append(('wildcard', payload)))
+    self.assertEqual([call[0][0] for call in self.client.subscribe.call_args_list], ['site/temp', 'site/#'])
+
+    self.session.on_message(self.client, None, message('site/temp', b'1'))
+    self.assertEqual(sorted(received), [('first', b'1'), ('second', b'1'), ('wildcard', b'1')])
+
+    first.close()
+    self.client.unsubscribe.assert_not_called()
+    second.close()
+    wildcard.close()
+    self.assertEqual([call[0][0] for call in self.client.unsubscribe.call_args_list], ['site/temp', 'site/#'])
+
+  def test_resubscribes_after_reconnect(self):
+    self.session.subscribe('site/temp', lambda topic, payload: None)
+    self.session.on_disconnect(self.client, None, None, MagicMock())
+    self.client.subscribe.reset_mock()
+    self.session.on_connect(self.client, None, None, MagicMock(is_failure=False))
+    self.client.subscribe.assert_called_once_with('site/temp', qos=1)
+
+  def test_failing_subscriber_does_not_stop_others(self):
+    received = []
+    def fail(topic, payload):
+      raise ValueError("bad payload")
+    self.session.subscribe('site/temp', fail)
+    self.session.subscribe('site/temp', lambda topic, payload: received.append(payload))
+    self.session.on_message(self.client, None, message('site/temp', b'1'))
+    self.assertEqual(received, [b'1'])
+
+  def test_read(self):
+    threading.Timer(0.05, lambda: self.session.on_message(self.client, None, message('site/temp', b'{"output": 1}'))).start()
+    self.assertEqual(self.session.read('site/temp', timeout=5), b'{"output": 1}')
+    self.assertEqual(self.session.subscribers, {})
+    with self.assertRaises(TimeoutError):
+      self.session.read('site/temp', timeout=0.05)
+
+  def test_publish_waits_for_ack(self):
+    info = self.client.publish.return_value
+    info.rc = 0
+    info.is_published.return_value = True
+    self.session.publish('site/cmd', 'on')
+    self.client.publish.assert_called_once_with('site/cmd', 'on', qos=1)
+    info.wait_for_publish.assert_called_once()
+
+    info.is_published.return_value = False
+    with self.assertRaises(TimeoutError):
+      self.session.publish('site/cmd', 'on', timeout=0.1)
+
+  def test_publish_when_disconnected(self):
+    self.session.on_disconnect(self.client, None, None, MagicMock())
+    with self.assertRaises(TimeoutError):
+      self.session.publish('site/cmd', 'on', timeout=0.05)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from openoperator.infrastructure.postgres import Postgres
+
+class TestPostgres(unittest.TestCase):
+  @patch('openoperator.infrastructure.postgres.ConnectionPool')
+  def setUp(self, mock_pool) -> None:
+    self.pool = mock_pool.return_value
+    self.conn = MagicMock()
+    self.pool.connection.return_value.__enter__.return_value = self.conn
+    self.postgres = Postgres("postgresql://localhost/test", min_size=2, max_size=5)
+    mock_pool.assert_called_once_with("postgresql://localhost/test", min_size=2, max_size=5, timeout=30, check=mock_pool.check_connection, open=True)
+
+  def test_cursor_checks_out_a_connection(self):
+    with self.postgres.cursor() as cur:
+      cur.execute("SELECT 1")
+    self.pool.connection.assert_called_once()
+    self.conn.cursor().__enter__().execute.assert_called_once_with("SELECT 1")
+    self.assertEqual(self.postgres.wait_metrics.count, 1)
+
+  def test_configure_runs_once_per_connection(self):
+    callback = MagicMock()
+    self.postgres.configure(callback)
+    with self.postgres.connection():
+      pass
+    with self.postgres.connection():
+      pass
+    callback.assert_called_once_with(self.conn)
+
+    other_conn = MagicMock()
+    self.pool.connection.return_value.__enter__.return_value = other_conn
+    with self.postgres.connection():
+      pass
+    callback.assert_called_with(other_conn)
+    self.assertEqual(callback.call_count, 2)
+
+  def test_stats(self):
+    self.pool.get_stats.return_value = {"pool_size": 2, "requests_waiting": 0}
+    with self.postgres.connection():
+      pass
+    stats = self.postgres.stats()
+    self.assertEqual(stats["pool_size"], 2)
+    self.assertEqual(stats["checkouts"], 1)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,7 +1,11 @@
 import unittest
 from unittest.mock import MagicMock, patch 
-from openoperator.infrastructure.timescale import Timescale
+from openoperator.infrastructure.timescale import Timescale, encode_copy_binary, bucket_width, parse_interval, format_timestamps, latest_payloads, ids_condition
+from openoperator.domain.model import PointReading, PointReadingBatch
+import struct
+import json
 import datetime
+import numpy as np
 
 class TestTimescale(unittest.TestCase):
   def setUp(self) -> None:
@@ -11,29 +15,277 @@ class TestTimescale(unittest.TestCase):
 
   def test_init(self):
     with patch.object(self.postgres, 'cursor', return_value=MagicMock()) as mock_cursor:
-      # Mock the fetchone() calls to return False, simulating that the table, hypertable, and index do not exist
-      mock_cursor().__enter__().fetchone.side_effect = [[False], None, None]
+      cur = mock_cursor().__enter__()
+      # Simulate an empty database: no table, hypertable, index, compression, policies or rollups
+      cur.fetchone.side_effect = [[False], None, None, [False], None, None] + [[False], None, None] * 4
       self.timescale.__init__(self.postgres)
-      # Assert that execute was called 7 times (for all the possible execute calls)
-      self.assertEqual(mock_cursor().__enter__().execute.call_count, 7)
+      statements = [call[0][0] for call in cur.execute.call_args_list]
+      self.assertTrue(any('create_hypertable' in statement for statement in statements))
+      self.assertTrue(any("timescaledb.compress_segmentby = 'timeseriesid'" in statement for statement in statements))
+      self.assertTrue(any('add_compression_policy' in statement for statement in statements))
+      self.assertFalse(any('add_retention_policy' in statement for statement in statements))
+      for name in ['timeseries_1m', 'timeseries_15m', 'timeseries_1h', 'timeseries_1d']:
+        self.assertTrue(any(f'CREATE MATERIALIZED VIEW {name} ' in statement for statement in statements))
+      cur.execute.assert_any_call('SELECT add_continuous_aggregate_policy(%s::regclass, %s::interval, end_offset => %s::interval, schedule_interval => %s::interval)',
+                                  ('timeseries_1h', datetime.timedelta(days=30), datetime.timedelta(hours=1), datetime.timedelta(hours=1)))
+      # New rollups are backfilled outside of a transaction
+      conn = self.postgres.connection().__enter__()
+      self.assertEqual(conn.execute.call_count, 4)
+      self.assertIn("refresh_continuous_aggregate('timeseries_1m'", conn.execute.call_args_list[0][0][0])
+
+  def test_init_without_migrate(self):
+    postgres = MagicMock()
+    Timescale(postgres, migrate=False)
+    postgres.cursor.assert_not_called()
+    postgres.connection.assert_not_called()
+
+  def test_policy_replaced_when_changed(self):
+    cur = MagicMock()
+    cur.fetchone.return_value = [False] # A retention policy exists with another interval
+    self.timescale.ensure_policy(cur, 'timeseries', 'retention', datetime.timedelta(days=90))
+    cur.execute.assert_any_call('SELECT remove_retention_policy(%s::regclass, if_exists => true)', ('timeseries',))
+    cur.execute.assert_called_with('SELECT add_retention_policy(%s::regclass, %s::interval)', ('timeseries', datetime.timedelta(days=90)))
+    cur.reset_mock()
+    cur.fetchone.return_value = [True] # Already up to date
+    self.timescale.ensure_policy(cur, 'timeseries', 'retention', datetime.timedelta(days=90))
+    self.assertEqual(cur.execute.call_count, 1)
+
+  def test_refresh_policy_compares_every_option(self):
+    cur = MagicMock()
+    cur.fetchone.return_value = [False] # The start offset matches but the schedule changed
+    options = dict(end_offset=datetime.timedelta(hours=1), schedule_interval=datetime.timedelta(minutes=30))
+    self.timescale.ensure_policy(cur, 'timeseries_1h', 'refresh', datetime.timedelta(days=30), **options)
+    query, params = cur.execute.call_args_list[0][0]
+    self.assertIn("(j.config->>%s)::interval = %s::interval AND (j.config->>%s)::interval = %s::interval AND j.schedule_interval = %s::interval", query)
+    self.assertEqual(params[:5], ('start_offset', datetime.timedelta(days=30), 'end_offset', datetime.timedelta(hours=1), datetime.timedelta(minutes=30)))
+    cur.execute.assert_any_call('SELECT remove_continuous_aggregate_policy(%s::regclass, if_exists => true)', ('timeseries_1h',))
+    cur.execute.assert_called_with('SELECT add_continuous_aggregate_policy(%s::regclass, %s::interval, end_offset => %s::interval, schedule_interval => %s::interval)',
+                                   ('timeseries_1h', datetime.timedelta(days=30), datetime.timedelta(hours=1), datetime.timedelta(minutes=30)))
+
+  def test_retention_shorter_than_refresh_window(self):
+    with self.assertRaises(ValueError):
+      Timescale(self.postgres, retention=datetime.timedelta(days=30))
+
+  def test_align_bucket(self):
+    self.assertEqual(self.timescale.align_bucket(datetime.timedelta(seconds=2592)), datetime.timedelta(minutes=45))
+    self.assertEqual(self.timescale.align_bucket(datetime.timedelta(seconds=7201)), datetime.timedelta(hours=3))
+    self.assertEqual(self.timescale.align_bucket(datetime.timedelta(seconds=30)), datetime.timedelta(seconds=30)) # Narrower than every rollup
+
+  def test_rollup_for(self):
+    self.assertEqual(self.timescale.rollup_for(datetime.timedelta(hours=6)).name, 'timeseries_1h')
+    self.assertEqual(self.timescale.rollup_for(datetime.timedelta(minutes=45)).name, 'timeseries_15m')
+    self.assertEqual(self.timescale.rollup_for(datetime.timedelta(days=2)).name, 'timeseries_1d')
+    self.assertIsNone(self.timescale.rollup_for(datetime.timedelta(seconds=30)))
+    self.assertIsNone(self.timescale.rollup_for(datetime.timedelta(seconds=90)))
+    self.assertEqual(parse_interval('15 minutes'), datetime.timedelta(minutes=15))
+    self.assertIsNone(parse_interval('1 month'))
 
   def test_get_timeseries(self):
-    timeseriesIds = ['id1', 'id2']
+    timeseriesIds = ['id1', 'id2', 'id3']
     start_time = '2022-01-01 00:00:00'
     end_time = '2022-12-31 23:59:59'
+    rows = [ # (timeseriesid, epoch seconds, value) ordered by timeseriesid, ts
+      ('id1', datetime.datetime(2022, 1, 1, 0, 0, tzinfo=datetime.timezone.utc).timestamp(), 1.0),
+      ('id1', datetime.datetime(2022, 1, 1, 0, 1, tzinfo=datetime.timezone.utc).timestamp(), 3.0),
+      ('id2', datetime.datetime(2022, 12, 31, 23, 59, 59, tzinfo=datetime.timezone.utc).timestamp(), 2.0)
+    ]
     with patch.object(self.postgres, 'cursor', return_value=MagicMock()) as mock_cursor:
-      mock_cursor().__enter__().fetchall.return_value = [
-        (datetime.datetime(2022, 1, 1, 0, 0, tzinfo=datetime.timezone.utc), 1.0, 'id1'),
-        (datetime.datetime(2022, 12, 31, 23, 59, 59, tzinfo=datetime.timezone.utc), 2.0, 'id2')
-      ]
+      mock_cursor().__enter__().fetchall.return_value = rows
       result = self.timescale.get_timeseries(timeseriesIds, start_time, end_time)
       expected_result = [
-        {'data': [{'timeseriesid': 'id1', 'ts': '2022-01-01T00:00:00+00:00', 'value': 1.0}], 'timeseriesid': 'id1'},
-        {'data': [{'timeseriesid': 'id2', 'ts': '2022-12-31T23:59:59+00:00', 'value': 2.0}], 'timeseriesid': 'id2'}
+        {'data': [{'timeseriesid': 'id1', 'ts': '2022-01-01T00:00:00+00:00', 'value': 1.0}, {'timeseriesid': 'id1', 'ts': '2022-01-01T00:01:00+00:00', 'value': 3.0}], 'timeseriesid': 'id1'},
+        {'data': [{'timeseriesid': 'id2', 'ts': '2022-12-31T23:59:59+00:00', 'value': 2.0}], 'timeseriesid': 'id2'},
+        {'data': [], 'timeseriesid': 'id3'}
       ] 
       self.assertEqual(result, expected_result)
-      ids = ', '.join([f'\'{id}\'' for id in timeseriesIds])
-      mock_cursor().__enter__().execute.assert_called_with(f"SELECT * FROM timeseries WHERE timeseriesid IN ({ids}) AND ts >= %s AND ts <= %s ORDER BY ts ASC", (start_time, end_time))
+      mock_cursor().__enter__().execute.assert_called_with("SELECT timeseriesid, extract(epoch FROM ts)::float8, value FROM timeseries WHERE timeseriesid = ANY(%s) AND ts >= %s AND ts <= %s ORDER BY timeseriesid, ts", (timeseriesIds, start_time, end_time), prepare=True)
+
+      result = self.timescale.get_timeseries(timeseriesIds, start_time, end_time, columnar=True)
+      self.assertEqual(result, [
+        {'data': {'ts': ['2022-01-01T00:00:00+00:00', '2022-01-01T00:01:00+00:00'], 'value': [1.0, 3.0]}, 'timeseriesid': 'id1'},
+        {'data': {'ts': ['2022-12-31T23:59:59+00:00'], 'value': [2.0]}, 'timeseriesid': 'id2'},
+        {'data': {'ts': [], 'value': []}, 'timeseriesid': 'id3'}
+      ])
+
+  def test_stream_timeseries(self):
+    conn = self.postgres.connection().__enter__()
+    cur = conn.cursor().__enter__()
+    cur.fetchmany.side_effect = [[('id1', 1700000000.0, 1.0), ('id1', 1700000001.0, 2.0)], [('id2', 1700000000.0, 3.0)], []]
+    chunks = list(self.timescale.stream_timeseries(['id1', 'id2'], '2023-11-14 00:00:00', '2023-11-15 00:00:00', itersize=2))
+    conn.cursor.assert_called_with(name='timeseries_stream')
+    self.assertEqual(cur.itersize, 2)
+    self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+    self.assertEqual(chunks[1]['timeseriesid'][0], 'id2')
+
+  def test_large_id_sets_use_unnest(self):
+    self.assertEqual(ids_condition(['id1', 'id2']), 'timeseriesid = ANY(%s)')
+    ids = [f'id{i}' for i in range(5000)]
+    with patch.object(self.postgres, 'cursor', return_value=MagicMock()) as mock_cursor:
+      cur = mock_cursor().__enter__()
+      cur.fetchall.return_value = []
+      self.timescale.get_timeseries(ids, '2022-01-01 00:00:00', '2022-01-02 00:00:00')
+      query, params = cur.execute.call_args[0]
+      self.assertIn('timeseriesid IN (SELECT unnest(%s::text[]))', query)
+      self.assertEqual(params[0], ids) # Bound as one array parameter, never spliced into the query text
+
+  def test_get_latest_values(self):
+    with patch.object(self.postgres, 'cursor', return_value=MagicMock()) as mock_cursor:
+      cur = mock_cursor().__enter__()
+      cur.fetchall.return_value = [(datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc), 1.0, "o'brien")]
+      readings = self.timescale.get_latest_values(["o'brien", 'id2'])
+      query, params = cur.execute.call_args[0]
+      self.assertIn('unnest(%s::text[])', query)
+      self.assertEqual(params, (["o'brien", 'id2'],))
+      self.assertTrue(cur.execute.call_args[1]['prepare'])
+      self.assertEqual(readings, [PointReading(ts='2022-01-01T00:00:00+00:00', value=1.0, timeseriesid="o'brien")])
+
+  def test_get_timeseries_buckets(self):
+    start_time = '2022-01-01 00:00:00'
+    end_time = '2022-01-02 00:00:00'
+    with patch.object(self.postgres, 'cursor', return_value=MagicMock()) as mock_cursor:
+      cur = mock_cursor().__enter__()
+      cur.fetchall.return_value = [
+        ('id1', datetime.datetime(2022, 1, 1, 0, 0, tzinfo=datetime.timezone.utc), 1.5, 1.0, 2.0, 2.0)
+      ]
+      result = self.timescale.get_timeseries_buckets(['id1', 'id2'], start_time, end_time, max_points=24)
+      self.assertEqual(result, [
+        {'data': [{'ts': '2022-01-01T00:00:00+00:00', 'value': 1.5, 'min': 1.0, 'max': 2.0, 'last': 2.0}], 'timeseriesid': 'id1'},
+        {'data': [], 'timeseriesid': 'id2'}
+      ])
+      query, params = cur.execute.call_args[0]
+      self.assertIn('FROM timeseries_1h ', query) # Served from the hourly rollup
+      self.assertIn('sum(avg * count) / sum(count)', query)
+      hour = datetime.timedelta(hours=1)
+      self.assertEqual(params, (hour, ['id1', 'id2'], hour, start_time, hour, end_time, hour))
+      # A max_points width that no rollup divides is rounded up to one that the 15 minute rollup does
+      self.timescale.get_timeseries_buckets(['id1'], '2022-01-01 00:00:00', '2022-01-31 00:00:00', max_points=1000)
+      query, params = cur.execute.call_args[0]
+      self.assertIn('FROM timeseries_15m ', query)
+      self.assertEqual(params[0], datetime.timedelta(minutes=45))
+      self.timescale.get_timeseries_buckets(['id1'], start_time, end_time, bucket='90 seconds')
+      raw_query = cur.execute.call_args[0][0]
+      self.assertIn('time_bucket(%s::interval, ts)', raw_query) # No rollup lines up, raw readings
+      # Both paths read the same whole buckets
+      self.assertIn('ts >= time_bucket(%s::interval, %s::timestamptz) AND ts < time_bucket(%s::interval, %s::timestamptz) + %s::interval', raw_query)
+      self.assertIn('bucket >= time_bucket(%s::interval, %s::timestamptz) AND bucket < time_bucket(%s::interval, %s::timestamptz) + %s::interval', query)
+    with self.assertRaises(ValueError):
+      self.timescale.get_timeseries_buckets(['id1'], start_time, end_time)
+    # Rejected before anything reaches the database
+    for kwargs in [{'bucket': '15 fortnights'}, {'bucket': '1 month'}, {'bucket': '0 minutes'}, {'max_points': 0}]:
+      with self.assertRaises(ValueError):
+        self.timescale.get_timeseries_buckets(['id1'], start_time, end_time, **kwargs)
+
+  def test_get_timeseries_lttb(self):
+    start = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+    rows = [('id1', start.timestamp() + i, 100.0 if i == 50 else 0.0) for i in range(100)]
+    with patch.object(self.postgres, 'cursor', return_value=MagicMock()) as mock_cursor:
+      mock_cursor().__enter__().fetchall.return_value = rows
+      result = self.timescale.get_timeseries_lttb(['id1'], '2022-01-01 00:00:00', '2022-01-02 00:00:00', max_points=10)
+      data = result[0]['data']
+      self.assertEqual(len(data), 10)
+      self.assertEqual(data[0]['ts'], start.isoformat())
+      self.assertEqual(data[-1]['ts'], (start + datetime.timedelta(seconds=99)).isoformat())
+      self.assertIn(100.0, [reading['value'] for reading in data]) # The spike survives downsampling
+    with self.assertRaises(ValueError):
+      self.timescale.get_timeseries_lttb(['id1'], '2022-01-01 00:00:00', '2022-01-02 00:00:00', max_points=2)
+
+  def test_latest_payloads(self):
+    batch = PointReadingBatch()
+    for i in range(1000):
+      batch.append(1700000000 + i, float(i), f'id{i % 400}')
+    payloads = list(latest_payloads(batch))
+    self.assertGreater(len(payloads), 1)
+    rows = [row for payload in payloads for row in json.loads(payload)]
+    self.assertTrue(all(len(payload) < 8000 for payload in payloads))
+    self.assertEqual(len(rows), 400)
+    self.assertEqual(rows[0], ['id0', 1700000800.0, 800.0]) # The newest reading of each series
+
+  def test_format_timestamps(self):
+    self.assertEqual(format_timestamps(np.array([1700000000.0, 1700000001.0])), ['2023-11-14T22:13:20+00:00', '2023-11-14T22:13:21+00:00'])
+    self.assertEqual(format_timestamps(np.array([1700000000.0, 1700000000.25])), ['2023-11-14T22:13:20.000000+00:00', '2023-11-14T22:13:20.250000+00:00'])
+
+  def test_bucket_width(self):
+    self.assertEqual(bucket_width('2022-01-01 00:00:00', '2022-01-31 00:00:00', 720), datetime.timedelta(hours=1))
+    self.assertEqual(bucket_width('2022-01-01 00:00:00', '2022-01-01 00:00:10', 1000), datetime.timedelta(seconds=1))
+    # Z suffixes and a mix of naive and aware bounds, naive is UTC
+    self.assertEqual(bucket_width('2022-01-01T00:00:00Z', '2022-01-31T00:00:00+00:00', 720), datetime.timedelta(hours=1))
+    self.assertEqual(bucket_width('2022-01-01 00:00:00', datetime.datetime(2022, 1, 31, tzinfo=datetime.timezone.utc), 720), datetime.timedelta(hours=1))
+    with self.assertRaises(ValueError):
+      bucket_width('last week', '2022-01-31T00:00:00Z', 720)
+
+  def test_insert_timeseries(self):
+    data = [
+      PointReading(ts='2022-01-01T00:00:00+00:00', value=1.0, timeseriesid='id1'),
+      PointReading(ts='2022-01-01T00:01:00+00:00', value=2.0, timeseriesid='id2')
+    ]
+    with patch.object(self.postgres, 'cursor', return_value=MagicMock()) as mock_cursor:
+      cur = mock_cursor().__enter__()
+      stats = self.timescale.insert_timeseries(data)
+      cur.copy.assert_called_once_with('COPY timeseries (ts, value, timeseriesid) FROM STDIN (FORMAT BINARY)')
+      copy = cur.copy().__enter__()
+      rows = parse_copy_binary(copy.write.call_args[0][0])
+      self.assertEqual(sorted(rows), [
+        (datetime.datetime(2022, 1, 1, 0, 0, tzinfo=datetime.timezone.utc), 1.0, 'id1'),
+        (datetime.datetime(2022, 1, 1, 0, 1, tzinfo=datetime.timezone.utc), 2.0, 'id2')
+      ])
+      self.assertEqual(stats.rows, 2)
+      # The newest readings are announced to latest value caches
+      query, (channel, payload) = cur.execute.call_args[0]
+      self.assertEqual((query, channel), ('SELECT pg_notify(%s, %s)', 'timeseries_latest'))
+      self.assertEqual(json.loads(payload), [['id1', 1640995200.0, 1.0], ['id2', 1640995260.0, 2.0]])
+
+  def test_insert_timeseries_dedup(self):
+    data = [PointReading(ts='2022-01-01T00:00:00+00:00', value=1.0, timeseriesid='id1')]
+    with patch.object(self.postgres, 'cursor', return_value=MagicMock()) as mock_cursor:
+      cur = mock_cursor().__enter__()
+      cur.fetchall.return_value = []
+      stats = self.timescale.insert_timeseries(data, dedup=True)
+      cur.copy.assert_called_once_with('COPY timeseries_staging (ts, value, timeseriesid) FROM STDIN (FORMAT BINARY)')
+      self.assertIn('INSERT INTO timeseries', cur.execute.call_args[0][0])
+      self.assertEqual(stats.rows, 0) # Nothing new was stored, so nothing is announced either
+      # The announcement is built from the rows the insert returned, after it ran
+      cur.execute.reset_mock()
+      cur.fetchall.return_value = [(1640995200.0, 1.0, 'id1')]
+      stats = self.timescale.insert_timeseries(data, dedup=True)
+      self.assertEqual(stats.rows, 1)
+      _, insert, notify = cur.execute.call_args_list
+      self.assertIn('RETURNING', insert.args[0])
+      query, (channel, payload) = notify.args
+      self.assertEqual((query, json.loads(payload)), ('SELECT pg_notify(%s, %s)', [['id1', 1640995200.0, 1.0]]))
+
+  def test_encode_copy_binary(self):
+    batch = PointReadingBatch()
+    batch.append(1700000000.25, 1.5, 'a')
+    batch.append(1700000001, 2.0, 'ünïcode')
+    batch.append(1700000002, 3.0, 'a')
+    rows = parse_copy_binary(encode_copy_binary(batch))
+    # Rows come out grouped by timeseries id
+    self.assertEqual(rows, [
+      (datetime.datetime.fromtimestamp(1700000000.25, tz=datetime.timezone.utc), 1.5, 'a'),
+      (datetime.datetime.fromtimestamp(1700000002, tz=datetime.timezone.utc), 3.0, 'a'),
+      (datetime.datetime.fromtimestamp(1700000001, tz=datetime.timezone.utc), 2.0, 'ünïcode')
+    ])
+
+def parse_copy_binary(data: bytes) -> list:
+  """
+  Decode a binary COPY stream of (timestamptz, float8, text) tuples.
+  """
+  assert data[:11] == b'PGCOPY\n\xff\r\n\x00'
+  offset = 19
+  rows = []
+  pg_epoch = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+  while True:
+    (count,) = struct.unpack_from('>h', data, offset)
+    offset += 2
+    if count == -1:
+      break
+    _, micros, _, value, id_len = struct.unpack_from('>iqidi', data, offset)
+    offset += 28
+    timeseriesid = data[offset:offset + id_len].decode()
+    offset += id_len
+    rows.append((pg_epoch + datetime.timedelta(microseconds=micros), value, timeseriesid))
+  assert offset == len(data)
+  return rows
 
 if __name__ == '__main__':
   unittest.main()
\ No newline at end of file
@@ -1,6 +1,11 @@
 from unittest.mock import MagicMock, patch
 from openoperator.infrastructure import PGVectorStore, Postgres, Embeddings
+from openoperator.infrastructure.vector_store.pg_vector_store import encode_vector_copy
+from openoperator.infrastructure.copy_binary import COPY_HEADER, COPY_TRAILER
+import json
 import os
+import struct
+import numpy as np
 from openoperator.domain.model import DocumentMetadataChunk, DocumentMetadata
 from openai.types import Embedding
 
@@ -14,10 +19,6 @@ def test_add_documents(mock_postgres, mock_register_vector):
   mock_postgres_instance = MagicMock(spec=Postgres)
   mock_postgres.return_value = mock_postgres_instance
 
-  # Mock the conn attribute
-  mock_conn = MagicMock()
-  mock_postgres_instance.conn = mock_conn
-
   # Create a mock cursor instance
   mock_cursor = MagicMock()
   mock_postgres_instance.cursor.return_value.__enter__.return_value = mock_cursor
@@ -28,7 +29,7 @@ def test_add_documents(mock_postgres, mock_register_vector):
   # Initialize PGVectorStore, this should use the mocked Postgres
   store = PGVectorStore(mock_postgres_instance, mock_embeddings)
 
-  mock_register_vector.assert_called_once_with(mock_postgres_instance.conn)
+  mock_postgres_instance.configure.assert_called_once_with(mock_register_vector)
 
   # Perform the add_documents
   documents = [
@@ -39,10 +40,165 @@ def test_add_documents(mock_postgres, mock_register_vector):
     Embedding(embedding=[1, 2, 3], index=0, object='embedding'),
     Embedding(embedding=[4, 5, 6], index=1, object='embedding')
   ]
-  store.add_documents(documents)
+  stats = store.add_documents(documents)
+  assert stats.rows == 2
 
   # Verify cursor was called correctly
   assert mock_postgres_instance.cursor.call_count == 2
 
   # Verify execute was called correctly
-  mock_cursor.execute.assert_called()
\ No newline at end of file
+  mock_cursor.execute.assert_called()
+
+  # The chunks are written with one binary COPY
+  mock_cursor.copy.assert_called_once_with('COPY table_name (content, metadata, embedding) FROM STDIN (FORMAT BINARY)')
+  data = mock_cursor.copy.return_value.__enter__.return_value.write.call_args[0][0]
+  assert [row[0] for row in decode_vector_copy(data)] == ['doc1', 'doc2']
+
+def decode_vector_copy(data: bytes) -> list:
+  assert data.startswith(COPY_HEADER) and data.endswith(COPY_TRAILER)
+  rows = []
+  pos = len(COPY_HEADER)
+  while pos < len(data) - len(COPY_TRAILER):
+    fields, = struct.unpack_from('>h', data, pos)
+    assert fields == 3
+    pos += 2
+    values = []
+    for _ in range(fields):
+      length, = struct.unpack_from('>i', data, pos)
+      values.append(data[pos + 4:pos + 4 + length])
+      pos += 4 + length
+    content, metadata, vector = values
+    assert metadata[0] == 1
+    dim, unused = struct.unpack_from('>hh', vector)
+    assert unused == 0 and len(vector) == 4 + 4 * dim
+    rows.append((content.decode(), json.loads(metadata[1:]), np.frombuffer(vector[4:], dtype='>f4').tolist()))
+  return rows
+
+def test_encode_vector_copy():
+  matrix = np.array([[0.5, -1.0, 2.25], [3.0, 0.0, -0.125]], dtype=np.float32)
+  data = encode_vector_copy(['first', 'zweite über'], [{'page_number': 1}, {'filename': 'a.pdf'}], matrix)
+  assert decode_vector_copy(data) == [
+    ('first', {'page_number': 1}, [0.5, -1.0, 2.25]),
+    ('zweite über', {'filename': 'a.pdf'}, [3.0, 0.0, -0.125]),
+  ]
+def test_migrate_creates_hnsw_index():
+  postgres = MagicMock(spec=Postgres)
+  cursor = postgres.cursor.return_value.__enter__.return_value
+  PGVectorStore(postgres, MagicMock(spec=Embeddings), collection_name='chunks', m=24, ef_construction=100)
+
+  statements = [call.args[0] for call in cursor.execute.call_args_list]
+  assert 'CREATE INDEX IF NOT EXISTS chunks_embedding_idx ON chunks USING hnsw (embedding vector_cosine_ops) WITH (m = 24, ef_construction = 100)' in statements
+
+def test_create_index_replaces_index():
+  postgres = MagicMock(spec=Postgres)
+  conn = postgres.connection.return_value.__enter__.return_value
+  store = PGVectorStore(postgres, MagicMock(spec=Embeddings), collection_name='chunks', migrate=False)
+
+  store.create_index('ivfflat', lists=50)
+
+  assert [call.args[0] for call in conn.execute.call_args_list] == [
+    'DROP INDEX IF EXISTS chunks_embedding_idx',
+    'CREATE INDEX chunks_embedding_idx ON chunks USING ivfflat (embedding vector_cosine_ops) WITH (lists = 50)',
+  ]
+  assert store.index == 'ivfflat'
+
+def test_search_settings():
+  store = PGVectorStore(MagicMock(spec=Postgres), MagicMock(spec=Embeddings), collection_name='chunks', migrate=False, ef_search=80)
+  assert store.search_settings(limit=10) == {'hnsw.ef_search': 80}
+  assert store.search_settings(limit=10, ef_search=200) == {'hnsw.ef_search': 200}
+  assert store.search_settings(limit=500) == {'hnsw.ef_search': 500} # HNSW returns at most ef_search rows
+
+  store = PGVectorStore(MagicMock(spec=Postgres), MagicMock(spec=Embeddings), collection_name='chunks', migrate=False, index=None)
+  assert store.search_settings(limit=500, ef_search=100) == {}
+
+def test_similarity_search_sets_ef_search_for_the_query():
+  postgres = MagicMock(spec=Postgres)
+  cursor = postgres.cursor.return_value.__enter__.return_value
+  cursor.execute.return_value.fetchall.return_value = []
+  embeddings = MagicMock(spec=Embeddings)
+  embeddings.create_embeddings.return_value = [Embedding(embedding=[1, 2, 3], index=0, object='embedding')]
+  store = PGVectorStore(postgres, embeddings, collection_name='chunks', migrate=False)
+
+  store.similarity_search('chiller', limit=5, ef_search=100)
+
+  first, second = cursor.execute.call_args_list
+  assert first.args == ('SELECT set_config(%s, %s, true)', ('hnsw.ef_search', '100'))
+  assert second.args[0] == 'SELECT content, metadata, embedding <=> %s AS distance FROM chunks ORDER BY distance LIMIT %s'
+
+def test_migrate_adds_indexed_filter_columns():
+  postgres = MagicMock(spec=Postgres)
+  cursor = postgres.cursor.return_value.__enter__.return_value
+  PGVectorStore(postgres, MagicMock(spec=Embeddings), collection_name='chunks')
+
+  statements = [call.args[0] for call in cursor.execute.call_args_list]
+  for column in ('portfolio_uri', 'facility_uri', 'document_uri'):
+    assert f"ALTER TABLE chunks ADD COLUMN IF NOT EXISTS {column} text GENERATED ALWAYS AS (metadata->>'{column}') STORED" in statements
+    assert f'CREATE INDEX IF NOT EXISTS chunks_{column}_idx ON chunks ({column})' in statements
+
+def test_filtered_search_uses_columns_and_iterative_scan():
+  postgres = MagicMock(spec=Postgres)
+  cursor = postgres.cursor.return_value.__enter__.return_value
+  cursor.execute.return_value.fetchall.return_value = []
+  embeddings = MagicMock(spec=Embeddings)
+  embeddings.create_embeddings.return_value = [Embedding(embedding=[1, 2, 3], index=0, object='embedding')]
+  store = PGVectorStore(postgres, embeddings, collection_name='chunks', migrate=False)
+
+  store.similarity_search('chiller', limit=5, filter={'facility_uri': 'https://example.com/facility', 'filetype': 'pdf'})
+
+  setting, search = cursor.execute.call_args_list
+  assert setting.args == ('SELECT set_config(%s, %s, true)', ('hnsw.iterative_scan', 'relaxed_order'))
+  query, params = search.args
+  assert query == ('WITH results AS MATERIALIZED (SELECT content, metadata, embedding <=> %s AS distance FROM chunks '
+                   'WHERE facility_uri = %s AND metadata->>%s = %s ORDER BY distance LIMIT %s) '
+                   'SELECT content, metadata, distance FROM results ORDER BY distance')
+  assert params[1:] == ['https://example.com/facility', 'filetype', 'pdf', 5]
+
+def test_delete_documents_uses_indexed_column():
+  postgres = MagicMock(spec=Postgres)
+  cursor = postgres.cursor.return_value.__enter__.return_value
+  store = PGVectorStore(postgres, MagicMock(spec=Embeddings), collection_name='chunks', migrate=False)
+
+  store.delete_documents({'document_uri': 'https://example.com/document/1'})
+
+  cursor.execute.assert_called_once_with('DELETE FROM chunks WHERE document_uri = %s', ['https://example.com/document/1'])
+
+def test_migrate_adds_full_text_column():
+  postgres = MagicMock(spec=Postgres)
+  cursor = postgres.cursor.return_value.__enter__.return_value
+  PGVectorStore(postgres, MagicMock(spec=Embeddings), collection_name='chunks', text_search_config='simple')
+
+  statements = [call.args[0] for call in cursor.execute.call_args_list]
+  assert "ALTER TABLE chunks ADD COLUMN IF NOT EXISTS content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED" in statements
+  assert 'CREATE INDEX IF NOT EXISTS chunks_content_tsv_idx ON chunks USING gin (content_tsv)' in statements
+
+def test_hybrid_search_fuses_in_one_query():
+  postgres = MagicMock(spec=Postgres)
+  cursor = postgres.cursor.return_value.__enter__.return_value
+  cursor.execute.return_value.fetchall.return_value = [('AHU-3 supply fan', {'filename': 'a.pdf', 'portfolio_uri': 'p', 'facility_uri': 'f'}, 0.03)]
+  embeddings = MagicMock(spec=Embeddings)
+  embeddings.create_embeddings.return_value = [Embedding(embedding=[1, 2, 3], index=0, object='embedding')]
+  store = PGVectorStore(postgres, embeddings, collection_name='chunks', migrate=False)
+
+  chunks = store.hybrid_search('AHU-3', limit=5, filter={'facility_uri': 'f'}, lexical_weight=2.0)
+
+  assert [chunk.content for chunk in chunks] == ['AHU-3 supply fan']
+  settings = [call for call in cursor.execute.call_args_list if 'set_config' in call.args[0]]
+  assert [call.args[1][0] for call in settings] == ['hnsw.iterative_scan']
+  (sql, params), = [call.args for call in cursor.execute.call_args_list if 'set_config' not in call.args[0]]
+  assert 'vector_candidates' in sql and 'lexical_candidates' in sql
+  assert sql.count('facility_uri = %s') == 2
+  assert params[1:] == ['f', 20, 'english', 'AHU-3', 'f', 20, 1.0, 60, 2.0, 60, 5]
+
+def test_lexical_only_search_does_not_embed():
+  postgres = MagicMock(spec=Postgres)
+  cursor = postgres.cursor.return_value.__enter__.return_value
+  cursor.execute.return_value.fetchall.return_value = []
+  embeddings = MagicMock(spec=Embeddings)
+  store = PGVectorStore(postgres, embeddings, collection_name='chunks', migrate=False)
+
+  store.hybrid_search('VAV 2-14', limit=5, vector_weight=0)
+
+  embeddings.create_embeddings.assert_not_called()
+  (sql, params), = [call.args for call in cursor.execute.call_args_list]
+  assert 'vector_candidates' not in sql
+  assert params == ['english', 'VAV 2-14', 20, 1.0, 60, 5]
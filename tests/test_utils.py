@@ -1,7 +1,10 @@
 import pytest
 from urllib.parse import quote
+import asyncio
+import threading
+import time
 import numpy as np
-from openoperator.utils import split_string_with_limit, create_uri, dbscan_cluster
+from openoperator.utils import split_string_with_limit, create_uri, dbscan_cluster, lttb, run_blocking, iterate_blocking
 
 # Mock encoder for testing split_string_with_limit
 class MockEncoder:
@@ -36,3 +39,49 @@ def test_dbscan_cluster():
   assert len(set(labels)) > 1, "DBSCAN should find at least 2 clusters."
   assert -1 in labels, "DBSCAN should identify outliers with label -1."
 
+def test_lttb():
+  x = np.arange(1000, dtype=float)
+  y = np.sin(x / 50)
+  y[500] = 10
+  kept = lttb(x, y, 50)
+  assert len(kept) == 50
+  assert kept[0] == 0 and kept[-1] == 999
+  assert np.all(np.diff(kept) > 0), "Indices should be strictly increasing."
+  assert 500 in kept, "The spike should be kept."
+  assert np.array_equal(lttb(x[:10], y[:10], 50), np.arange(10)), "Short series are returned whole."
+
+def test_run_blocking():
+  async def main():
+    ticks = 0
+    async def ticker():
+      nonlocal ticks
+      while True:
+        await asyncio.sleep(0.01)
+        ticks += 1
+    task = asyncio.create_task(ticker())
+    thread = await run_blocking(lambda delay: time.sleep(delay) or threading.current_thread().name, 0.1)
+    items = [item async for item in iterate_blocking(iter([1, 2, 3]))]
+    task.cancel()
+    return thread, items, ticks
+
+  thread, items, ticks = asyncio.run(main())
+  assert thread.startswith('blocking')
+  assert items == [1, 2, 3]
+  assert ticks >= 5, "The event loop should keep running while the call blocks."
+
+def test_iterate_blocking_closes_source_early():
+  closed_on = []
+  def source():
+    try:
+      yield from range(100)
+    finally:
+      closed_on.append(threading.current_thread().name)
+
+  async def main():
+    stream = iterate_blocking(source())
+    assert await stream.__anext__() == 0
+    await stream.aclose() # The client went away
+
+  asyncio.run(main())
+  assert len(closed_on) == 1
+  assert closed_on[0].startswith('blocking'), "The source should be closed off the event loop."